@@ -1,17 +1,219 @@
-from django.contrib import admin
-from .models import Task
+"""
+Admin for the task table at any size.
+
+The Task changelist is built so that no page costs more as the table grows:
+* users are joined into the page query (list_select_related), not fetched per row
+* counts are exact only up to TASK_ADMIN_EXACT_COUNT_LIMIT rows. Past that,
+  EstimatedCountPaginator estimates them: from the query plan on PostgreSQL,
+  and from the per-user TaskCounter totals for the unfiltered list elsewhere
+* search goes through the full-text index (base/search.py)
+* CreatedFilter drills down year > month > day with at most two indexed
+  queries, where date_hierarchy reads the distinct dates of every row
+* users are picked with an autocomplete box instead of a list of every user
+* status, priority and completion are changed with actions built on
+  apply_bulk_action instead of list_editable formsets
+"""
+import json
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.formats import date_format
+from django.utils.functional import cached_property
+
+from .bulk import MAX_BULK_IDS, BulkActionError, apply_bulk_action
+from .models import Job, NotificationPreference, Task, TaskCounter
+from .search import search_tasks
+
+
+def exact_count_limit():
+    return getattr(settings, 'TASK_ADMIN_EXACT_COUNT_LIMIT', 10000)
+
+
+def estimate_count(queryset):
+    """A cheap estimate of queryset.count(), or None when there is none"""
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return plan[0]['Plan']['Plan Rows']
+    if queryset.model is Task and not queryset.query.has_filters():
+        return TaskCounter.objects.aggregate(total=Sum('total'))['total']
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts at most limit + 1 rows, and estimates beyond that. Without an
+    estimate the count stays at limit + 1, so the pages past it are still
+    reachable by number.
+    """
+
+    @cached_property
+    def count(self):
+        limit = exact_count_limit()
+        queryset = self.object_list.order_by()
+        counted = queryset[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        return max(estimate_count(queryset) or 0, counted)
+
+
+def created_period(value):
+    """'2024', '2024-03' or '2024-03-15' -> (start date, end date, depth), else None"""
+    try:
+        parts = [int(part) for part in value.split('-')]
+        if not 1 <= len(parts) <= 3:
+            return None
+        start = date(*parts, *[1] * (3 - len(parts)))
+        if len(parts) == 1:
+            end = date(start.year + 1, 1, 1)
+        elif len(parts) == 2:
+            end = start + timedelta(days=monthrange(start.year, start.month)[1])
+        else:
+            end = start + timedelta(days=1)
+    except (AttributeError, TypeError, ValueError, OverflowError):
+        return None
+    return start, end, len(parts)
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class CreatedFilter(admin.SimpleListFilter):
+    """
+    Year > month > day drill-down on created_at. The years come from the first
+    and last created_at, two reads of task_created_idx; months and days need
+    no query. Picking one filters on a [start, end) range in the current time
+    zone, which the same index serves.
+    """
+    title = 'created'
+    parameter_name = 'created'
+
+    def lookups(self, request, model_admin):
+        period = created_period(self.value())
+        if period is None:
+            dates = model_admin.get_queryset(request).values_list('created_at', flat=True)
+            first = dates.order_by('created_at').first()
+            if first is None:
+                return []
+            last = dates.order_by('-created_at').first()
+            years = range(timezone.localtime(last).year, timezone.localtime(first).year - 1, -1)
+            return [(str(year), str(year)) for year in years]
+
+        start, _, depth = period
+        choices = [(str(start.year), f'‹ {start.year}' if depth > 1 else str(start.year))]
+        if depth == 1:
+            for month in range(1, 13):
+                choices.append((f'{start.year}-{month:02}', date_format(date(start.year, month, 1), 'YEAR_MONTH_FORMAT')))
+        else:
+            month = f'{start.year}-{start.month:02}'
+            choices.append((month, date_format(start, 'YEAR_MONTH_FORMAT')))
+            for day in range(1, monthrange(start.year, start.month)[1] + 1):
+                choices.append((f'{month}-{day:02}', date_format(start.replace(day=day), 'MONTH_DAY_FORMAT')))
+        return choices
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        period = created_period(self.value())
+        if period is None:
+            raise IncorrectLookupParameters(f'Invalid date: {self.value()}')
+        start, end, _ = period
+        return queryset.filter(created_at__gte=_local_midnight(start), created_at__lt=_local_midnight(end))
+
+
+class UserFilter(admin.SimpleListFilter):
+    """
+    Filter by user through the admin's autocomplete endpoint. Only the chosen
+    user is read, where RelatedFieldListFilter lists every user on each page.
+    """
+    title = 'user'
+    parameter_name = 'user'
+    template = 'admin/base/task/user_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        self.admin_site = model_admin.admin_site
+        self.query_string = ''
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        # The choices are searched for as you type
+        return []
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        self.query_string = changelist.get_query_string(remove=[self.parameter_name, PAGE_VAR])
+        yield {
+            'selected': self.value() is None,
+            'query_string': self.query_string,
+            'display': 'All',
+        }
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        if not self.value().isdigit():
+            raise IncorrectLookupParameters(f'Invalid user: {self.value()}')
+        return queryset.filter(user_id=self.value())
+
+    def widget(self):
+        field = Task._meta.get_field('user')
+        choice = forms.ModelChoiceField(
+            User.objects.all(), required=False, widget=AutocompleteSelect(field, self.admin_site),
+        )
+        return choice.widget.render(
+            self.parameter_name, self.value(), attrs={'id': 'user-filter', 'data-filter-url': self.query_string},
+        )
+
+
+def _bulk_admin_action(action, value=None, description=''):
+    def run(modeladmin, request, queryset):
+        modeladmin.apply_bulk_action(request, queryset, action, value)
+    run.__name__ = f'{action}_{value}' if value else action
+    return admin.action(description=description)(run)
 
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'status', 'priority', 'categories', 'due_date', 'complete', 'created_at')
-    list_filter = ('status', 'priority', 'categories', 'complete', 'created_at', 'due_date')
+    list_filter = ('status', 'priority', 'categories', 'complete', CreatedFilter, 'due_date')
+    list_select_related = ('user',)
     search_fields = ('title', 'description', 'tags')
-    list_editable = ('status', 'priority', 'complete')
+    search_help_text = 'Full-text search of titles, descriptions and tags'
+    autocomplete_fields = ('user',)
     readonly_fields = ('created_at', 'updated_at')
-    date_hierarchy = 'created_at'
     ordering = ('-created_at',)
-    
+    # Only created_at has an index over all users (task_created_idx)
+    sortable_by = ('created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    actions = [
+        _bulk_admin_action('complete', description='Mark selected tasks complete'),
+        _bulk_admin_action('uncomplete', description='Mark selected tasks not complete'),
+        *[
+            _bulk_admin_action('set_status', value, f'Set status of selected tasks to {label}')
+            for value, label in Task.STATUS_CHOICES
+        ],
+        *[
+            _bulk_admin_action('set_priority', value, f'Set priority of selected tasks to {label}')
+            for value, label in Task.PRIORITY_CHOICES
+        ],
+    ]
+
     fieldsets = (
         ('Basic Information', {
             'fields': ('user', 'title', 'description')
@@ -26,9 +228,62 @@ class TaskAdmin(admin.ModelAdmin):
             'fields': ('due_date', 'created_at', 'updated_at')
         }),
     )
-    
+
+    @property
+    def media(self):
+        user_field = Task._meta.get_field('user')
+        return (
+            super().media
+            + AutocompleteSelect(user_field, self.admin_site).media
+            + forms.Media(js=['base/admin_user_filter.js'])
+        )
+
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
-        return qs.filter(user=request.user)
\ No newline at end of file
+        return qs.filter(user=request.user)
+
+    def get_list_filter(self, request):
+        # Everyone else only sees their own tasks
+        if request.user.is_superuser:
+            return (UserFilter, *self.list_filter)
+        return self.list_filter
+
+    def get_search_results(self, request, queryset, search_term):
+        # Go through the full-text index instead of icontains on every column
+        if not search_term:
+            return queryset, False
+        return search_tasks(queryset, search_term), False
+
+    def apply_bulk_action(self, request, queryset, action, value=None):
+        """Run a bulk action on the selected tasks, one set-based update per owner"""
+        ids_by_user = defaultdict(list)
+        for user_id, pk in queryset.order_by().values_list('user_id', 'pk')[:MAX_BULK_IDS + 1]:
+            ids_by_user[user_id].append(pk)
+        if sum(map(len, ids_by_user.values())) > MAX_BULK_IDS:
+            self.message_user(request, f'At most {MAX_BULK_IDS} tasks can be changed at once.', messages.ERROR)
+            return
+        users = User.objects.in_bulk(ids_by_user)
+        try:
+            changed = sum(
+                apply_bulk_action(users[user_id], ids, action, value) for user_id, ids in ids_by_user.items()
+            )
+        except BulkActionError as exc:
+            self.message_user(request, str(exc), messages.ERROR)
+            return
+        self.message_user(request, f'{changed} task{"" if changed == 1 else "s"} updated.', messages.SUCCESS)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'status', 'attempts', 'max_attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'finished_at', 'locked_by', 'locked_at', 'attempts')
+    ordering = ('-created_at',)
+
+
+@admin.register(NotificationPreference)
+class NotificationPreferenceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'timezone', 'reminders_enabled')
+    list_filter = ('reminders_enabled',)
+    search_fields = ('user__username',)
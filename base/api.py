@@ -0,0 +1,211 @@
+"""
+JSON REST API for tasks (/api/v1/tasks/).
+
+Lists take the same search/status/priority/category/tag filters and sorts as
+the userpage and page with the same keyset cursors. ``?fields=`` limits the
+serialized fields, and reads load only the columns those fields need.
+/api/v1/tasks/changes/ is the delta sync feed (see base.sync).
+"""
+from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.routers import SimpleRouter
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.urls import replace_query_param
+
+from . import ratelimit, recurrence, sync
+from .filters import filter_tasks
+from .models import Task
+from .pagination import DEFAULT_PAGE_SIZE, DEFAULT_SORT, SORT_FIELDS, KeysetPaginator, InvalidCursor
+
+
+MAX_PAGE_SIZE = 100
+
+# Model columns each serializer field reads, for only()
+FIELD_COLUMNS = {
+    'is_overdue': ('due_date', 'complete', 'recurrence'),
+    'series': ('series_id',),
+}
+
+
+class TaskSerializer(serializers.ModelSerializer):
+    is_overdue = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Task
+        fields = [
+            'id', 'title', 'description', 'status', 'priority', 'categories', 'complete',
+            'due_date', 'tags', 'recurrence', 'series', 'is_overdue', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['id', 'series', 'created_at', 'updated_at']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def validate_title(self, value):
+        # Same rule as TaskForm.clean_title
+        if value and len(value) < 3:
+            raise serializers.ValidationError('Title must be at least 3 characters long.')
+        return value
+
+    def validate_recurrence(self, value):
+        if value and self.instance is not None and self.instance.series_id:
+            raise serializers.ValidationError('An occurrence of a repeating task cannot repeat itself.')
+        try:
+            return recurrence.normalize(value)
+        except recurrence.InvalidRule as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, attrs):
+        # Same rule as TaskForm.clean
+        rule = attrs.get('recurrence', getattr(self.instance, 'recurrence', ''))
+        due_date = attrs.get('due_date', getattr(self.instance, 'due_date', None))
+        if rule and not due_date:
+            raise serializers.ValidationError({'due_date': ['A repeating task needs a due date for its first occurrence.']})
+        return attrs
+
+
+def requested_fields(request):
+    """Serializer field names from ``?fields=``, or None for all of them"""
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = set(fields) - set(TaskSerializer.Meta.fields)
+    if unknown:
+        raise ValidationError({'fields': [f'Unknown field: {name}' for name in sorted(unknown)]})
+    return fields
+
+
+def columns_for(fields, sort=None):
+    """Task columns to load for the given serializer fields and list sort"""
+    columns = {'id'}
+    for name in fields:
+        columns.update(FIELD_COLUMNS.get(name, (name,)))
+    if sort is not None:
+        # The cursor reads the sort key; created_at covers the fallback sort
+        field, _ = SORT_FIELDS.get(sort, SORT_FIELDS[DEFAULT_SORT])
+        columns.update({field, 'created_at'} - {'search_rank'})
+    return columns
+
+
+class TaskCursorPagination(BasePagination):
+    """DRF adapter for KeysetPaginator, using the userpage sorts and cursors"""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return DEFAULT_PAGE_SIZE
+        return min(max(size, 1), MAX_PAGE_SIZE)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        default_sort = 'relevance' if request.query_params.get('search') else '-created_at'
+        paginator = KeysetPaginator(queryset, request.query_params.get('sort', default_sort), self.get_page_size(request))
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        self.sort = paginator.sort
+        self.base_url = request.build_absolute_uri()
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'sort': self.sort,
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'sort': {'type': 'string'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class WriteRateThrottle(BaseThrottle):
+    """Unsafe methods take from the TASK_RATE_LIMITS['api_write'] buckets"""
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        if request.method not in SAFE_METHODS:
+            self.wait_seconds = ratelimit.check('api_write', request, request.user)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class TaskViewSet(viewsets.ModelViewSet):
+    """List, retrieve, create, update and delete the current user's tasks"""
+
+    serializer_class = TaskSerializer
+    pagination_class = TaskCursorPagination
+    throttle_classes = [WriteRateThrottle]
+
+    def get_queryset(self):
+        tasks = Task.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            tasks, _ = filter_tasks(tasks, self.request.query_params, ranked=True)
+        fields = requested_fields(self.request)
+        if fields is not None and self.request.method in ('GET', 'HEAD'):
+            # Writes keep full rows so the counter and tag signals see every field
+            sort = self.request.query_params.get('sort', DEFAULT_SORT) if self.action == 'list' else None
+            columns = columns_for(fields, sort)
+            if self.action == 'changes':
+                columns.add('sync_seq')
+            tasks = tasks.only(*columns)
+        return tasks
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method in ('GET', 'HEAD'):
+            kwargs['fields'] = requested_fields(self.request)
+        return super().get_serializer(*args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False)
+    def changes(self, request):
+        """Tasks created, updated or deleted since ``?cursor=``, oldest change first"""
+        try:
+            limit = min(max(int(request.query_params.get('limit', sync.DEFAULT_LIMIT)), 1), sync.MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': ['Must be an integer.']})
+        try:
+            page = sync.changes_since(request.user, self.get_queryset(), request.query_params.get('cursor'), limit)
+        except InvalidCursor:
+            raise ValidationError({'cursor': ['Invalid cursor.']})
+        return Response({
+            'changed': self.get_serializer(page.changed, many=True).data,
+            'deleted': page.deleted,
+            'cursor': page.cursor,
+            'has_more': page.has_more,
+            'reset': page.reset,
+        })
+
+
+router = SimpleRouter()
+router.register('tasks', TaskViewSet, basename='api-task')
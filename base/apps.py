@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
+
+    def ready(self):
+        from . import instrumentation, signals  # noqa: F401
+        from .search import repair_search_index
+
+        post_migrate.connect(repair_search_index, sender=self)
@@ -0,0 +1,63 @@
+"""
+Static files for the ASGI application.
+
+WhiteNoiseMiddleware is sync-only, and Django runs every middleware above a
+sync-only one in sync mode, so under ASGI each request would hop threads
+before reaching the async views. StaticFilesASGI serves the same files in
+front of Django instead. It reuses the middleware's file table, headers and
+WHITENOISE_* settings, and passes every other request on untouched.
+"""
+from asgiref.sync import sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+BLOCK_SIZE = 64 * 1024
+
+
+def path_info(scope):
+    path, root = scope['path'], scope.get('root_path', '')
+    return path[len(root):] if root and path.startswith(root) else path
+
+
+def request_headers(scope):
+    """The scope's headers as the WSGI-style keys WhiteNoise reads (HTTP_ACCEPT_ENCODING, ...)"""
+    return {
+        'HTTP_' + name.decode('latin-1').upper().replace('-', '_'): value.decode('latin-1')
+        for name, value in scope['headers']
+    }
+
+
+class StaticFilesASGI:
+    """Serve static files ahead of ``application`` the way WhiteNoiseMiddleware would"""
+
+    def __init__(self, application):
+        self.application = application
+        self.whitenoise = WhiteNoiseMiddleware()
+
+    def find(self, path):
+        if self.whitenoise.autorefresh:
+            # DEBUG: look on disk, so new and changed files are picked up
+            return self.whitenoise.find_file(path)
+        return self.whitenoise.files.get(path)
+
+    async def __call__(self, scope, receive, send):
+        static_file = self.find(path_info(scope)) if scope['type'] == 'http' else None
+        if static_file is None:
+            return await self.application(scope, receive, send)
+
+        response = static_file.get_response(scope['method'], request_headers(scope))
+        await send({
+            'type': 'http.response.start',
+            'status': int(response.status),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers],
+        })
+        if response.file is None:
+            await send({'type': 'http.response.body'})
+            return
+        read = sync_to_async(response.file.read, thread_sensitive=False)
+        try:
+            while chunk := await read(BLOCK_SIZE):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            response.file.close()
@@ -0,0 +1,101 @@
+"""
+The authentication hot path.
+
+Every authenticated request reads its session and then its user. Sessions
+use the cached_db engine (see SESSION_ENGINE), and CachedModelBackend keeps
+users in the cache for TASK_AUTH_USER_CACHE_TIMEOUT seconds. A request whose
+session and user are both cached makes no query for authentication.
+
+A cached user is deleted whenever that user is saved or deleted, so
+password changes and deactivation apply at once in processes sharing the
+cache. With the per-process locmem cache, other workers can keep the old copy
+until it expires. That is why the timeout stays short.
+
+API clients may send HTTP Basic credentials instead, which costs a password
+hash per request; RateLimitedBasicAuthentication keeps guessing in check.
+"""
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import Throttled
+
+from . import ratelimit
+
+
+SESSION_BATCH_SIZE = 1000
+
+
+def _user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'TASK_AUTH_USER_CACHE_TIMEOUT', 60)
+
+
+def forget_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() is served from the cache"""
+
+    def get_user(self, user_id):
+        user = cache.get(_user_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(_user_key(user_id), user, _timeout())
+        return user
+
+    async def aget_user(self, user_id):
+        user = await cache.aget(_user_key(user_id))
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(_user_key(user_id), user, _timeout())
+        return user
+
+
+class RateLimitedBasicAuthentication(BasicAuthentication):
+    """
+    HTTP Basic auth behind the TASK_RATE_LIMITS['api_auth'] buckets. A token is
+    taken before the password is hashed and given back when it was right, so
+    only wrong guesses use the buckets up; once they are empty the request
+    gets a 429 without reaching the hasher.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        anonymous = AnonymousUser()
+        wait = ratelimit.check('api_auth', request, anonymous, username=userid)
+        if wait:
+            raise Throttled(wait)
+        credentials = super().authenticate_credentials(userid, password, request)
+        ratelimit.refund('api_auth', request, anonymous, username=userid)
+        return credentials
+
+
+def clear_expired_sessions(batch_size=SESSION_BATCH_SIZE):
+    """
+    Delete expired sessions in batches; returns how many were deleted.
+
+    clearsessions deletes them in one statement, which holds SQLite's write
+    lock for as long as that takes. Batches let requests write in between.
+    """
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store, 'get_model_class'):
+        # The cache expires its own sessions, and signed cookies are not stored
+        return 0
+    Session = store.get_model_class()
+    now = timezone.now()
+    deleted = 0
+    while True:
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
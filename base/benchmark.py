@@ -0,0 +1,525 @@
+"""
+Reproducible benchmark harness (python manage.py benchmark).
+
+generate() seeds N users with M tasks each. The same seed always gives the
+same data, with weighted status, priority and category mixes, due dates
+around today and Zipf-distributed tags. run() drives scripted scenarios
+against the views, either in-process through the test client or over HTTP
+against a running server. It reports latency percentiles, throughput, and
+query counts read from the Server-Timing header that RequestMetricsMiddleware
+adds. Reports are JSON, so runs on two commits can be diffed with compare().
+
+write_benchmark() (python manage.py benchmark_writes) measures something
+else: several processes, like gunicorn workers, toggling tasks at once under
+each database connection profile in WRITE_PROFILES.
+"""
+import http.client
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import random
+import re
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from importlib import import_module
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connection
+from django.middleware.csrf import CSRF_ALLOWED_CHARS
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from . import counters
+from .instrumentation import percentile
+from .models import Task
+from .signals import bulk_operation
+from .tags import get_or_create_tags, parse_tags
+
+
+STATUS_WEIGHTS = {'todo': 45, 'in_progress': 20, 'completed': 35}
+PRIORITY_WEIGHTS = {'high': 20, 'medium': 50, 'low': 30}
+CATEGORY_WEIGHTS = {'work': 35, 'personal': 25, 'shopping': 10, 'health': 10, 'education': 10, 'other': 10}
+# How many tags a task has
+TAG_COUNT_WEIGHTS = [40, 35, 18, 7]
+TAGS = [
+    'urgent', 'meeting', 'email', 'review', 'home', 'errand', 'call', 'report', 'budget', 'family',
+    'gym', 'reading', 'travel', 'client', 'bug', 'planning', 'health', 'garden', 'car', 'study',
+]
+VERBS = ['Review', 'Write', 'Call', 'Plan', 'Buy', 'Fix', 'Prepare', 'Send', 'Clean', 'Book', 'Read', 'Update']
+NOUNS = [
+    'quarterly report', 'groceries', 'dentist appointment', 'project proposal', 'team meeting notes',
+    'car insurance', 'birthday present', 'budget spreadsheet', 'flight tickets', 'kitchen sink',
+    'course notes', 'client invoice', 'blog post', 'running shoes', 'tax return',
+]
+DUE_DATE_SHARE = 0.65
+BATCH_SIZE = 5000
+USERNAME_PREFIX = 'bench'
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def usernames(users, seed):
+    return [f'{USERNAME_PREFIX}-{seed}-{i}' for i in range(users)]
+
+
+def generate(users, tasks_per_user, seed=42, batch_size=BATCH_SIZE, progress=None):
+    """Create ``users`` users with ``tasks_per_user`` tasks each; returns the users"""
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    tag_weights = [1 / rank for rank in range(1, len(TAGS) + 1)]
+    tags = {tag.name: tag for tag in get_or_create_tags(sorted(TAGS))}
+    Through = Task.tag_objects.through
+
+    created_users = User.objects.bulk_create(User(username=name) for name in usernames(users, seed))
+    for user in created_users:
+        made = 0
+        while made < tasks_per_user:
+            batch = []
+            for _ in range(min(batch_size, tasks_per_user - made)):
+                status = _weighted(rng, STATUS_WEIGHTS)
+                due_date = None
+                if rng.random() < DUE_DATE_SHARE:
+                    # Mostly the coming weeks; finished work skews to the past
+                    mode = -14 if status == 'completed' else 7
+                    due_date = today + timedelta(days=round(rng.triangular(-90, 60, mode)))
+                count = rng.choices(range(len(TAG_COUNT_WEIGHTS)), weights=TAG_COUNT_WEIGHTS)[0]
+                names = sorted(set(rng.choices(TAGS, weights=tag_weights, k=count)))
+                batch.append(Task(
+                    user=user,
+                    title=f'{rng.choice(VERBS)} {rng.choice(NOUNS)}',
+                    description=f'Notes about {rng.choice(NOUNS)}' if rng.random() < 0.4 else '',
+                    status=status,
+                    complete=status == 'completed',
+                    priority=_weighted(rng, PRIORITY_WEIGHTS),
+                    categories=_weighted(rng, CATEGORY_WEIGHTS),
+                    due_date=due_date,
+                    tags=', '.join(names),
+                ))
+            with bulk_operation():
+                Task.objects.bulk_create(batch)
+                Through.objects.bulk_create(
+                    Through(task_id=task.pk, tag_id=tags[name].pk) for task in batch for name in parse_tags(task.tags)
+                )
+            made += len(batch)
+            if progress:
+                progress(user, made)
+        counters.rebuild(user.pk)
+    return created_users
+
+
+def existing_users(users, seed):
+    """The users a previous generate() call made with the same arguments, or None"""
+    found = list(User.objects.filter(username__in=usernames(users, seed)).order_by('pk'))
+    return found if len(found) == users else None
+
+
+def delete_users(users, seed):
+    return User.objects.filter(username__in=usernames(users, seed)).delete()[0]
+
+
+class Context:
+    """Per-user state the scenarios draw from, advanced on every request"""
+
+    def __init__(self, user, seed):
+        self.user = user
+        self.rng = random.Random(f'{seed}-{user.pk}')
+        self.task_ids = list(Task.objects.filter(user=user).order_by('pk').values_list('pk', flat=True)[:500])
+        self.counter = 0
+
+    def next(self, values):
+        self.counter += 1
+        return values[self.counter % len(values)]
+
+
+def _list(ctx):
+    return 'GET', reverse('userpage'), None
+
+
+def _list_filtered(ctx):
+    params = {'status': 'todo', 'priority': ctx.next(list(PRIORITY_WEIGHTS)), 'sort': 'due_date'}
+    return 'GET', f"{reverse('userpage')}?{urlencode(params)}", None
+
+
+def _search(ctx):
+    word = ctx.next([noun.split()[-1] for noun in NOUNS])
+    return 'GET', f"{reverse('userpage')}?{urlencode({'search': word})}", None
+
+
+def _dashboard(ctx):
+    return 'GET', reverse('dashboard'), None
+
+
+def _toggle(ctx):
+    return 'POST', reverse('toggle_complete', args=[ctx.next(ctx.task_ids)]), None
+
+
+def _create(ctx):
+    data = {
+        'title': f'{ctx.rng.choice(VERBS)} {ctx.rng.choice(NOUNS)}',
+        'status': 'todo',
+        'priority': _weighted(ctx.rng, PRIORITY_WEIGHTS),
+        'categories': _weighted(ctx.rng, CATEGORY_WEIGHTS),
+        'due_date': (timezone.localdate() + timedelta(days=ctx.rng.randint(0, 30))).isoformat(),
+        'tags': ctx.rng.choice(TAGS),
+    }
+    return 'POST', reverse('create_task'), data
+
+
+def _api_list(ctx):
+    return 'GET', f"{reverse('api-task-list')}?{urlencode({'page_size': 50, 'status': 'todo'})}", None
+
+
+SCENARIOS = {
+    'list': _list,
+    'list_filtered': _list_filtered,
+    'search': _search,
+    'dashboard': _dashboard,
+    'toggle': _toggle,
+    'create': _create,
+    'api_list': _api_list,
+}
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def parse_server_timing(header):
+    """(SQL ms, query count) from a RequestMetricsMiddleware Server-Timing header, or (None, None)"""
+    match = SERVER_TIMING_DB.search(header or '')
+    if match is None:
+        return None, None
+    return float(match.group(1)), int(match.group(2))
+
+
+class ClientDriver:
+    """In-process requests through django.test.Client; one request at a time"""
+
+    name = 'client'
+    concurrency = 1
+
+    def __init__(self):
+        self.clients = {}
+
+    def request(self, user, method, path, data):
+        client = self.clients.get(user.pk)
+        if client is None:
+            client = self.clients[user.pk] = Client()
+            client.force_login(user)
+        started = time.perf_counter()
+        if method == 'POST':
+            response = client.post(path, data or {})
+        else:
+            response = client.get(path)
+        elapsed = time.perf_counter() - started
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code, elapsed, response.get('Server-Timing')
+
+
+def create_session(user):
+    """Create a session for ``user`` directly, as django.contrib.auth.login() would; returns its key"""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key
+
+
+class HTTPDriver:
+    """Requests over keep-alive HTTP connections to a running server"""
+
+    name = 'http'
+
+    def __init__(self, url, concurrency=8):
+        self.url = urlsplit(url)
+        self.concurrency = concurrency
+        self.cookies = {}
+        self.local = threading.local()
+        # Any well-formed secret passes the CSRF check when sent as both cookie and header
+        self.csrf = get_random_string(32, CSRF_ALLOWED_CHARS)
+
+    def cookie(self, user):
+        if user.pk not in self.cookies:
+            self.cookies[user.pk] = f'{settings.SESSION_COOKIE_NAME}={create_session(user)}; {settings.CSRF_COOKIE_NAME}={self.csrf}'
+        return self.cookies[user.pk]
+
+    def request(self, user, method, path, data):
+        if not hasattr(self.local, 'conn'):
+            self.local.conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=30)
+        headers = {'Cookie': self.cookie(user), 'X-CSRFToken': self.csrf}
+        body = None
+        if method == 'POST':
+            body = urlencode(data or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        started = time.perf_counter()
+        try:
+            self.local.conn.request(method, path, body=body, headers=headers)
+            response = self.local.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            del self.local.conn
+            return 599, time.perf_counter() - started, None
+        return response.status, time.perf_counter() - started, response.getheader('Server-Timing')
+
+
+def _summary(values, digits=2):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        'p50': round(percentile(values, 50), digits),
+        'p95': round(percentile(values, 95), digits),
+        'p99': round(percentile(values, 99), digits),
+        'mean': round(statistics.fmean(values), digits),
+        'max': round(values[-1], digits),
+    }
+
+
+def run_scenario(driver, contexts, scenario, requests, warmup=5):
+    """Run one scenario ``requests`` times, spread over the users' contexts"""
+    build = SCENARIOS[scenario]
+
+    def one(i):
+        ctx = contexts[i % len(contexts)]
+        method, path, data = build(ctx)
+        return driver.request(ctx.user, method, path, data)
+
+    for i in range(warmup):
+        one(i)
+    started = time.perf_counter()
+    if driver.concurrency > 1:
+        with ThreadPoolExecutor(driver.concurrency) as pool:
+            results = list(pool.map(one, range(requests)))
+    else:
+        results = [one(i) for i in range(requests)]
+    elapsed = time.perf_counter() - started
+
+    timings = [parse_server_timing(header) for _, _, header in results]
+    queries = [count for _, count in timings if count is not None]
+    sql_ms = [ms for ms, _ in timings if ms is not None]
+    return {
+        'requests': len(results),
+        'errors': sum(1 for status, _, _ in results if status >= 400),
+        'requests_per_second': round(len(results) / elapsed, 1),
+        'latency_ms': _summary([seconds * 1000 for _, seconds, _ in results]),
+        'queries': _summary(queries, 1),
+        'sql_ms': _summary(sql_ms),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(driver, users, scenarios, requests, seed=42, warmup=5):
+    """Run every scenario and return the JSON-ready report"""
+    contexts = [Context(user, seed) for user in users]
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'driver': driver.name,
+            'concurrency': driver.concurrency,
+            'users': len(users),
+            'tasks': Task.objects.filter(user__in=users).count(),
+            'seed': seed,
+            'requests_per_scenario': requests,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'started_at': timezone.now().isoformat(),
+        },
+        'scenarios': {},
+    }
+    for scenario in scenarios:
+        report['scenarios'][scenario] = run_scenario(driver, contexts, scenario, requests, warmup)
+    return report
+
+
+COMPARED = [('latency_ms', 'p50'), ('latency_ms', 'p95'), ('queries', 'mean')]
+
+
+def compare(baseline, current):
+    """
+    Per-scenario changes between two reports, as rows of
+    (scenario, metric, before, after, percent change).
+    """
+    rows = []
+    for scenario, result in current['scenarios'].items():
+        before = baseline['scenarios'].get(scenario)
+        if before is None:
+            continue
+        for group, stat in COMPARED:
+            old = (before.get(group) or {}).get(stat)
+            new = (result.get(group) or {}).get(stat)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else (0.0 if new == old else float('inf'))
+            rows.append((scenario, f'{group}.{stat}', old, new, round(change, 1)))
+        rows.append((
+            scenario, 'requests_per_second', before['requests_per_second'], result['requests_per_second'],
+            round((result['requests_per_second'] - before['requests_per_second']) / before['requests_per_second'] * 100, 1),
+        ))
+    return rows
+
+
+def regressions(rows, threshold):
+    """Rows that got worse by more than ``threshold`` percent"""
+    return [
+        row for row in rows
+        if (row[1] == 'requests_per_second' and row[4] < -threshold)
+        or (row[1] != 'requests_per_second' and row[4] > threshold)
+    ]
+
+
+# Connection settings write_benchmark() compares, applied over
+# DATABASES['default']; 'configured' is the profile from settings unchanged
+WRITE_PROFILES = {
+    'sqlite': {
+        # Django's defaults: rollback journal, synchronous=FULL, a 5 second
+        # busy timeout, deferred transactions, a new connection per request
+        'stock': {'CONN_MAX_AGE': 0, 'OPTIONS': {'init_command': 'PRAGMA journal_mode=delete'}},
+        'configured': {},
+    },
+    'postgresql': {
+        'reconnect': {'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+        'configured': {},
+    },
+}
+
+
+@contextmanager
+def database_settings(overrides):
+    """Apply ``overrides`` to the default connection's settings inside the block"""
+    saved = dict(connection.settings_dict)
+    connection.close()
+    connection.settings_dict.update(overrides)
+    try:
+        yield
+    finally:
+        connection.close()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(saved)
+
+
+@contextmanager
+def scratch_database():
+    """
+    With SQLite, run the block against a new, migrated database file.
+
+    Other databases are used as configured; the caller deletes what it made.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    directory = tempfile.mkdtemp(prefix='bench-writes-')
+    try:
+        with database_settings({'NAME': os.path.join(directory, 'db.sqlite3')}):
+            call_command('migrate', verbosity=0)
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _toggle_writer(overrides, task_ids, seconds, barrier, results):
+    # Runs in a forked process of its own, like a gunicorn worker
+    connection.settings_dict.update(overrides)
+    rng = random.Random(os.getpid())
+    latencies = []
+    errors = 0
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            # The same writes as the toggle_complete view
+            task = Task.objects.get(pk=rng.choice(task_ids))
+            task.complete = not task.complete
+            task.status = 'completed' if task.complete else 'todo'
+            task.save()
+        except OperationalError:
+            # "database is locked"
+            errors += 1
+        else:
+            latencies.append((time.perf_counter() - started) * 1000)
+        # End of the "request": closes the connection unless CONN_MAX_AGE keeps it
+        close_old_connections()
+    connection.close()
+    results.put((latencies, errors))
+
+
+def write_benchmark(workers=4, seconds=5.0, tasks_per_worker=200, profiles=None, seed=42):
+    """
+    Toggle tasks from ``workers`` processes for ``seconds`` under each
+    connection profile and return the JSON-ready report.
+
+    Every worker has a user of its own, so the writes only contend on the
+    database, as with separate users on separate gunicorn workers.
+    """
+    available = WRITE_PROFILES.get(connection.vendor, {'configured': {}})
+    profiles = profiles or list(available)
+    context = multiprocessing.get_context('fork')
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'database': connection.vendor,
+            'workers': workers,
+            'seconds': seconds,
+            'tasks': workers * tasks_per_worker,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'started_at': timezone.now().isoformat(),
+        },
+        'profiles': {},
+    }
+    with scratch_database():
+        users = generate(workers, tasks_per_worker, seed)
+        try:
+            task_ids = [list(Task.objects.filter(user=user).values_list('pk', flat=True)) for user in users]
+            for name in profiles:
+                overrides = available[name]
+                with database_settings(overrides):
+                    # Connect once first, so a journal mode change is not raced by the workers
+                    connection.ensure_connection()
+                    connection.close()
+                    barrier = context.Barrier(workers)
+                    results = context.Queue()
+                    processes = [
+                        context.Process(target=_toggle_writer, args=(overrides, ids, seconds, barrier, results))
+                        for ids in task_ids
+                    ]
+                    for process in processes:
+                        process.start()
+                    outcomes = [results.get() for _ in processes]
+                    for process in processes:
+                        process.join()
+                latencies = [ms for worker_latencies, _ in outcomes for ms in worker_latencies]
+                report['profiles'][name] = {
+                    'writes': len(latencies),
+                    'errors': sum(errors for _, errors in outcomes),
+                    'writes_per_second': round(len(latencies) / seconds, 1),
+                    'latency_ms': _summary(latencies),
+                }
+        finally:
+            delete_users(workers, seed)
+    return report
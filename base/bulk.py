@@ -0,0 +1,130 @@
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, fragments, sync
+from .models import Task
+from .signals import bulk_operation
+from .tags import get_or_create_tags, parse_tags
+
+
+MAX_BULK_IDS = 5000
+
+ACTIONS = {
+    'complete': None,
+    'uncomplete': None,
+    'delete': None,
+    'set_priority': dict(Task.PRIORITY_CHOICES),
+    'set_status': dict(Task.STATUS_CHOICES),
+    'set_category': dict(Task.Categories),
+    'add_tag': None,
+    'remove_tag': None,
+}
+
+
+class BulkActionError(ValueError):
+    pass
+
+
+def clean_ids(ids):
+    try:
+        ids = {int(pk) for pk in ids}
+    except (TypeError, ValueError):
+        raise BulkActionError('Task ids must be integers.')
+    if not ids:
+        raise BulkActionError('Select at least one task.')
+    if len(ids) > MAX_BULK_IDS:
+        raise BulkActionError(f'At most {MAX_BULK_IDS} tasks can be changed at once.')
+    return ids
+
+
+def _tag_name(value):
+    names = parse_tags(value or '')
+    if len(names) != 1:
+        raise BulkActionError('Give exactly one tag.')
+    return names[0]
+
+
+def _add_tag(tasks, name, now, seq):
+    tag, = get_or_create_tags([name])
+    max_length = Task._meta.get_field('tags').max_length
+    changed = []
+    too_long = 0
+    for pk, text in tasks.values_list('pk', 'tags'):
+        if name in parse_tags(text):
+            continue
+        text = f'{text}, {name}' if text.strip() else name
+        if len(text) > max_length:
+            too_long += 1
+        else:
+            changed.append(Task(pk=pk, tags=text, updated_at=now, sync_seq=seq))
+    if too_long:
+        # Tag all of the selection or none of it
+        raise BulkActionError(f'The tag does not fit on {too_long} of the selected tasks.')
+    Task.objects.bulk_update(changed, ['tags', 'updated_at', 'sync_seq'])
+    Through = Task.tag_objects.through
+    Through.objects.bulk_create([Through(task_id=task.pk, tag_id=tag.pk) for task in changed], ignore_conflicts=True)
+    return len(changed)
+
+
+def _remove_tag(tasks, name, now, seq):
+    changed = []
+    for pk, text in tasks.filter(tag_objects__name=name).values_list('pk', 'tags'):
+        kept = [part.strip() for part in text.split(',') if part.strip() and part.strip().lower() != name]
+        changed.append(Task(pk=pk, tags=', '.join(kept), updated_at=now, sync_seq=seq))
+    Task.objects.bulk_update(changed, ['tags', 'updated_at', 'sync_seq'])
+    Task.tag_objects.through.objects.filter(task_id__in=[task.pk for task in changed], tag__name=name).delete()
+    return len(changed)
+
+
+def apply_bulk_action(user, ids, action, value=None):
+    """
+    Apply one action to the given tasks of ``user`` and return how many changed.
+
+    Each action is a set-based UPDATE or DELETE inside a single transaction.
+    Per-row signal handlers are silenced. Instead, the user's counters get one
+    delta, computed by aggregating the affected rows before and after the
+    change, every affected row (or tombstone) shares one sync sequence number,
+    and the fragment cache is invalidated once.
+    """
+    if action not in ACTIONS:
+        raise BulkActionError('Unknown action.')
+    choices = ACTIONS[action]
+    if choices is not None and value not in choices:
+        raise BulkActionError('Invalid value for this action.')
+    ids = clean_ids(ids)
+
+    now = timezone.now()
+    with transaction.atomic(), bulk_operation():
+        tasks = Task.objects.filter(user=user, pk__in=ids).order_by()
+        before = Counter(tasks.aggregate(**counters.counter_aggregates()))
+        seq = sync.next_sequence(user.pk)
+
+        if action == 'delete':
+            deleted_ids = list(tasks.values_list('pk', flat=True))
+            affected = len(deleted_ids)
+            tasks.delete()
+            sync.record_tombstones(user.pk, deleted_ids, seq)
+        elif action == 'complete':
+            affected = tasks.update(complete=True, status='completed', updated_at=now, sync_seq=seq)
+        elif action == 'uncomplete':
+            affected = tasks.update(complete=False, status='todo', updated_at=now, sync_seq=seq)
+        elif action == 'set_priority':
+            affected = tasks.update(priority=value, updated_at=now, sync_seq=seq)
+        elif action == 'set_status':
+            # Keep complete in step with status, as toggle_complete does
+            affected = tasks.update(status=value, complete=value == 'completed', updated_at=now, sync_seq=seq)
+        elif action == 'set_category':
+            affected = tasks.update(categories=value, updated_at=now, sync_seq=seq)
+        elif action == 'add_tag':
+            affected = _add_tag(tasks, _tag_name(value), now, seq)
+        else:
+            affected = _remove_tag(tasks, _tag_name(value), now, seq)
+
+        after = Counter() if action == 'delete' else Counter(tasks.aggregate(**counters.counter_aggregates()))
+        after.subtract(before)
+        counters.apply_delta(user.pk, after)
+        if affected:
+            fragments.invalidate(user.pk)
+    return affected
@@ -0,0 +1,127 @@
+"""
+ETag / Last-Modified validators for the task views.
+
+Used with django.views.decorators.http.condition so a matching
+If-None-Match or If-Modified-Since gets a 304 before the view runs. Each
+validator costs one indexed query, which is memoized on the request because
+condition() asks for the ETag and the Last-Modified separately.
+
+condition() calls the validators synchronously even around async views, so
+async views are wrapped in preload(), which runs the query with the async ORM
+and leaves the memoized result for the validators to read.
+"""
+import hashlib
+from datetime import datetime, time
+from functools import wraps
+
+from django.db.models import Max, OuterRef, Subquery
+from django.middleware.csrf import get_token
+from django.utils import timezone
+
+from .models import Task, TaskCounter
+
+
+def _local_midnight():
+    return timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+
+
+def _etag(request, *parts):
+    # The CSRF secret is part of the tag: a page revalidated after a new login
+    # must not keep serving a form token from the old session. get_token()
+    # makes sure the secret exists before the first render, so the tag does
+    # not change between the first and second visit.
+    get_token(request)
+    parts = (*parts, request.META['CSRF_COOKIE'], timezone.localdate().isoformat())
+    return hashlib.md5('|'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+
+
+def _task_list_query(user):
+    last_updated = (
+        Task.objects.filter(user=OuterRef('user'))
+        .order_by()
+        .values('user')
+        .annotate(last=Max('updated_at'))
+        .values('last')
+    )
+    return (
+        TaskCounter.objects.filter(user=user)
+        .annotate(last_updated=Subquery(last_updated))
+        .values_list('total', 'changed_at', 'last_updated')
+    )
+
+
+def _task_list_result(row):
+    if row is None:
+        return None
+    total, changed_at, last_updated = row
+    # Deletes only move changed_at, edits only move updated_at, and
+    # overdue badges change at midnight without any write at all.
+    return total, max(filter(None, [changed_at, last_updated, _local_midnight()]))
+
+
+def task_list_state(request):
+    """(task count, last change) for the user's task list, in one query"""
+    if not hasattr(request, '_task_list_state'):
+        request._task_list_state = _task_list_result(_task_list_query(request.user).first())
+    return request._task_list_state
+
+
+async def atask_list_state(request, *args, **kwargs):
+    if not hasattr(request, '_task_list_state'):
+        request._task_list_state = _task_list_result(await _task_list_query(request.user).afirst())
+    return request._task_list_state
+
+
+def task_list_etag(request, *args, **kwargs):
+    state = task_list_state(request)
+    if state is None:
+        return None
+    return _etag(request, request.resolver_match.view_name, request.user.pk, *state)
+
+
+def task_list_last_modified(request, *args, **kwargs):
+    state = task_list_state(request)
+    return state[1] if state else None
+
+
+def task_updated_at(request, pk):
+    if not hasattr(request, '_task_updated_at'):
+        request._task_updated_at = Task.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    return request._task_updated_at
+
+
+async def atask_updated_at(request, pk):
+    if not hasattr(request, '_task_updated_at'):
+        request._task_updated_at = await Task.objects.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+    return request._task_updated_at
+
+
+def task_etag(request, pk):
+    updated_at = task_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return _etag(request, 'task', pk, updated_at.isoformat())
+
+
+def task_last_modified(request, pk):
+    updated_at = task_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return max(updated_at, _local_midnight())
+
+
+def preload(loader):
+    """
+    Decorate an async view so ``loader`` memoizes validator state first.
+
+    Also resolves request.user with the async auth API, so the validators and
+    templates can read it without a synchronous session lookup.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            request.user = await request.auser()
+            await loader(request, *args, **kwargs)
+            return await view(request, *args, **kwargs)
+        return inner
+    return decorator
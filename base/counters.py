@@ -0,0 +1,114 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Task, TaskCounter
+
+
+def counter_field(prefix, value):
+    return f'{prefix}_{value}'
+
+
+COUNTER_FIELDS = (
+    ['total', 'completed', 'overdue_eligible']
+    + [counter_field('priority', value) for value, _ in Task.PRIORITY_CHOICES]
+    + [counter_field('status', value) for value, _ in Task.STATUS_CHOICES]
+    + [counter_field('category', value) for value, _ in Task.Categories]
+)
+
+
+def contribution(values):
+    """Counter increments one task adds, given its Task.counted_values()"""
+    if values is None:
+        return Counter()
+    counts = Counter({
+        'total': 1,
+        counter_field('priority', values['priority']): 1,
+        counter_field('status', values['status']): 1,
+        counter_field('category', values['categories']): 1,
+    })
+    if values['complete']:
+        counts['completed'] += 1
+    elif values['due_date'] is not None:
+        counts['overdue_eligible'] += 1
+    return counts
+
+
+def counter_aggregates():
+    """Conditional aggregates producing every TaskCounter column in one query"""
+    aggregates = {
+        'total': Count('id'),
+        'completed': Count('id', filter=Q(complete=True)),
+        'overdue_eligible': Count('id', filter=Q(complete=False, due_date__isnull=False)),
+    }
+    for value, _ in Task.PRIORITY_CHOICES:
+        aggregates[counter_field('priority', value)] = Count('id', filter=Q(priority=value))
+    for value, _ in Task.STATUS_CHOICES:
+        aggregates[counter_field('status', value)] = Count('id', filter=Q(status=value))
+    for value, _ in Task.Categories:
+        aggregates[counter_field('category', value)] = Count('id', filter=Q(categories=value))
+    return aggregates
+
+
+def count_tasks(user_id):
+    """Recount a user's tasks from scratch"""
+    return Task.objects.filter(user_id=user_id).aggregate(**counter_aggregates())
+
+
+def rebuild(user_id):
+    """Replace the stored counters for one user with a fresh count"""
+    counts = count_tasks(user_id)
+    counts['changed_at'] = timezone.now()
+    try:
+        with transaction.atomic():
+            counter, created = TaskCounter.objects.update_or_create(user_id=user_id, defaults=counts)
+    except IntegrityError:
+        # Another worker created the row first; ours is just as fresh.
+        counter = TaskCounter.objects.get(user_id=user_id)
+    return counter
+
+
+def get_counter(user_id):
+    counter = TaskCounter.objects.filter(user_id=user_id).first()
+    if counter is None:
+        counter = rebuild(user_id)
+    return counter
+
+
+def apply_delta(user_id, delta):
+    """Add a Counter of increments to a user's stored counters"""
+    delta = {name: amount for name, amount in delta.items() if amount}
+    if not delta:
+        return
+    updated = TaskCounter.objects.filter(user_id=user_id).update(
+        changed_at=timezone.now(),
+        **{name: F(name) + amount for name, amount in delta.items()}
+    )
+    if not updated:
+        # No counters yet: count once, which already includes this change.
+        rebuild(user_id)
+
+
+def record_change(old_values, new_values):
+    """Apply the difference between a task's old and new counted values"""
+    old_user = old_values['user_id'] if old_values else None
+    new_user = new_values['user_id'] if new_values else None
+    if old_user == new_user:
+        delta = contribution(new_values)
+        delta.subtract(contribution(old_values))
+        apply_delta(new_user, delta)
+        return
+    if old_user is not None:
+        apply_delta(old_user, {name: -amount for name, amount in contribution(old_values).items()})
+    if new_user is not None:
+        apply_delta(new_user, contribution(new_values))
+
+
+def drift(user_id):
+    """Columns whose stored value differs from a fresh count, as {name: (stored, actual)}"""
+    actual = count_tasks(user_id)
+    counter = TaskCounter.objects.filter(user_id=user_id).first()
+    stored = {name: getattr(counter, name) if counter else 0 for name in COUNTER_FIELDS}
+    return {name: (stored[name], actual[name]) for name in COUNTER_FIELDS if stored[name] != actual[name]}
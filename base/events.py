@@ -0,0 +1,136 @@
+"""
+Pub/sub that wakes a user's live event streams when their tasks change.
+
+Brokers only carry "something changed for user N"; the stream itself reads
+what changed from the delta sync feed (base.sync), so a missed or duplicated
+notification never loses or repeats data. Pick one with the
+TASK_EVENTS_BROKER setting (a dotted class path):
+
+* LocalBroker (default) notifies streams in the same process instantly.
+* DatabaseBroker polls each user's TaskSyncState row, so it also sees writes
+  made by other worker processes, at the cost of one small query per stream
+  per poll interval.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from functools import cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import TaskSyncState
+
+
+class LocalSubscription:
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        # publish() runs on whichever thread committed the write
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    async def start(self):
+        pass
+
+    async def wait(self, timeout):
+        """Wait for a change; False if ``timeout`` seconds pass without one"""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except TimeoutError:
+            return False
+        finally:
+            self.event.clear()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process notifications; only reaches streams served by the same worker"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = LocalSubscription(self, user_id)
+        with self.lock:
+            self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions[subscription.user_id]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[subscription.user_id]
+
+    def publish(self, user_id):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.notify()
+
+
+class PollingSubscription:
+
+    def __init__(self, user_id, interval):
+        self.user_id = user_id
+        self.interval = interval
+        self.seq = None
+
+    async def current_seq(self):
+        return await TaskSyncState.objects.filter(user_id=self.user_id).values_list('change_seq', flat=True).afirst()
+
+    async def start(self):
+        self.seq = await self.current_seq()
+
+    async def wait(self, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            await asyncio.sleep(min(self.interval, deadline - loop.time()))
+            seq = await self.current_seq()
+            if seq != self.seq:
+                self.seq = seq
+                return True
+        return False
+
+    def close(self):
+        pass
+
+
+class DatabaseBroker:
+    """Polls the user's change sequence, so streams see writes from every worker process"""
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'TASK_EVENTS_POLL_INTERVAL', 1.0)
+
+    def subscribe(self, user_id):
+        return PollingSubscription(user_id, self.interval)
+
+    def publish(self, user_id):
+        pass
+
+
+@cache
+def get_broker():
+    return import_string(getattr(settings, 'TASK_EVENTS_BROKER', 'base.events.LocalBroker'))()
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    if setting in ('TASK_EVENTS_BROKER', 'TASK_EVENTS_POLL_INTERVAL'):
+        get_broker.cache_clear()
+
+
+def publish(user_id):
+    get_broker().publish(user_id)
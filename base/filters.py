@@ -0,0 +1,32 @@
+from .search import search_tasks
+
+
+def filter_tasks(tasks, params, ranked=False):
+    """
+    Apply the userpage search/status/priority/category/tag filters.
+
+    ``params`` is request.GET or any mapping with the same keys. Returns the
+    filtered queryset and the active filter values for the template.
+    """
+    filters = {
+        'search_query': params.get('search', ''),
+        'status_filter': params.get('status', ''),
+        'priority_filter': params.get('priority', ''),
+        'category_filter': params.get('category', ''),
+        'tag_filter': params.get('tag', '').strip().lower(),
+    }
+
+    # Search functionality
+    if filters['search_query']:
+        tasks = search_tasks(tasks, filters['search_query'], ranked=ranked)
+
+    # Filter functionality
+    if filters['status_filter']:
+        tasks = tasks.filter(status=filters['status_filter'])
+    if filters['priority_filter']:
+        tasks = tasks.filter(priority=filters['priority_filter'])
+    if filters['category_filter']:
+        tasks = tasks.filter(categories=filters['category_filter'])
+    if filters['tag_filter']:
+        tasks = tasks.filter(tag_objects__name=filters['tag_filter'])
+    return tasks, filters
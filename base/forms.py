@@ -1,5 +1,6 @@
 from django import forms
 from .models import Task
+from .recurrence import InvalidRule, normalize
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
@@ -7,7 +8,7 @@ from django.contrib.auth.models import User
 class TaskForm(forms.ModelForm):
     class Meta:
         model = Task
-        fields = ['title', 'description', 'status', 'priority', 'categories', 'due_date', 'tags']
+        fields = ['title', 'description', 'status', 'priority', 'categories', 'due_date', 'tags', 'recurrence']
         widgets = {
             'title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -36,7 +37,17 @@ class TaskForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Enter tags separated by commas (e.g., urgent, work, meeting)'
             }),
+            'recurrence': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'Leave empty for a one-off task (e.g., daily, weekly, FREQ=MONTHLY;BYMONTHDAY=1)'
+            }),
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # An occurrence follows its series' rule and does not repeat itself
+        if self.instance.series_id:
+            del self.fields['recurrence']
     
     def clean_title(self):
         title = self.cleaned_data.get('title')
@@ -44,6 +55,18 @@ class TaskForm(forms.ModelForm):
             raise forms.ValidationError('Title must be at least 3 characters long.')
         return title
 
+    def clean_recurrence(self):
+        try:
+            return normalize(self.cleaned_data.get('recurrence') or '')
+        except InvalidRule as e:
+            raise forms.ValidationError(str(e))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('recurrence') and not cleaned_data.get('due_date'):
+            self.add_error('due_date', 'A repeating task needs a due date for its first occurrence.')
+        return cleaned_data
+
 
 class customizedUserCreationForm(UserCreationForm):
     email = forms.EmailField(
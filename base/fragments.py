@@ -0,0 +1,91 @@
+"""
+Versioned per-user fragment cache for the userpage and dashboard.
+
+Every user has a version number in the cache. Task writes bump it, and
+rendered fragments are keyed on (user, version, day, params), so a bump makes
+every older fragment unreachable and nothing has to be deleted.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+
+def get_cache():
+    return caches[getattr(settings, 'TASK_FRAGMENT_CACHE', 'default')]
+
+
+def _version_key(user_id):
+    return f'tasks:version:{user_id}'
+
+
+def get_version(user_id):
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock rather than 1: if the counter is evicted, a
+        # fresh seed can never collide with fragments stored under an
+        # earlier version.
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(user_id):
+    """Async version of get_version()"""
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns() // 1000, timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        get_version(user_id)
+
+
+def invalidate(user_id):
+    """Make every cached fragment of this user stale"""
+    # Bump now so the current transaction never reads its own stale
+    # fragments, and again after commit in case another request cached
+    # pre-commit data in between.
+    bump_version(user_id)
+    transaction.on_commit(lambda: bump_version(user_id))
+
+
+def fragment_key(name, user_id, version, params=None):
+    """Cache key for one rendered fragment; params is a QueryDict or dict of filters"""
+    parts = [name, str(user_id), str(version), timezone.localdate().isoformat()]
+    if params:
+        items = params.lists() if hasattr(params, 'lists') else ((k, [v]) for k, v in params.items())
+        parts.extend(f'{k}={",".join(v)}' for k, v in sorted(items))
+    digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'tasks:fragment:{name}:{user_id}:{digest}'
+
+
+def get_or_render(fragments, key, render):
+    """Return the cached fragment at ``key`` (from a get_many result) or render and store it"""
+    html = fragments.get(key)
+    if html is None:
+        html = render()
+        get_cache().set(key, html, getattr(settings, 'TASK_FRAGMENT_TIMEOUT', 300))
+    return html
+
+
+async def aget_or_render(fragments, key, render):
+    """Async version of get_or_render(); ``render`` is a coroutine function"""
+    html = fragments.get(key)
+    if html is None:
+        html = await render()
+        await get_cache().aset(key, html, getattr(settings, 'TASK_FRAGMENT_TIMEOUT', 300))
+    return html
@@ -0,0 +1,169 @@
+import csv
+import json
+import time
+from collections import Counter
+
+from django.db import transaction
+
+from . import counters, fragments, sync
+from .forms import TaskForm
+from .models import Task, TaskImport
+from .tags import get_or_create_tags, parse_tags
+
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 1000
+MAX_STORED_ERRORS = 1000
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be read, as opposed to one bad record"""
+
+
+def guess_format(filename):
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def iter_records(stream, import_format):
+    """
+    Yield one dict per record (or None for an unparseable NDJSON line) from a
+    text stream. Raises ImportFileError when the file itself is unreadable.
+    """
+    reader = csv.DictReader(stream) if import_format == 'csv' else stream
+    try:
+        for record in reader:
+            if import_format == 'csv':
+                yield record
+                continue
+            line = record.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    except UnicodeDecodeError as exc:
+        raise ImportFileError('The file is not UTF-8 text.') from exc
+    except csv.Error as exc:
+        raise ImportFileError(f'The file is not valid CSV (line {reader.line_num + 1}): {exc}.') from exc
+
+
+def build_task(user, record):
+    """Validate one record with TaskForm; return (unsaved Task, None) or (None, errors)"""
+    if not isinstance(record, dict):
+        return None, {'__all__': ['Not a valid record.']}
+    if any('\x00' in str(value) for value in record.values() if value is not None):
+        # PostgreSQL cannot store NUL characters in text
+        return None, {'__all__': ['Contains a NUL character.']}
+    data = {name: '' if record.get(name) is None else str(record[name]) for name in TaskForm._meta.fields}
+    # Missing choice columns fall back to the model defaults, as on the create form
+    for name in ('status', 'priority', 'categories'):
+        if not data[name]:
+            data[name] = Task._meta.get_field(name).default
+    form = TaskForm(data=data)
+    if not form.is_valid():
+        return None, {field: [str(message) for message in messages] for field, messages in form.errors.items()}
+    task = form.save(commit=False)
+    task.user = user
+    # bulk_create skips Task.save()
+    task.set_recurrence_end()
+    if record.get('complete') not in (None, ''):
+        task.complete = str(record['complete']).strip().lower() in TRUE_VALUES
+    else:
+        task.complete = task.status == 'completed'
+    return task, None
+
+
+class TaskImporter:
+    """
+    Stream records from a file into Task rows in bulk_create batches.
+
+    Every batch is committed in its own transaction together with the
+    TaskImport checkpoint, so a run that dies part way can be resumed with the
+    same TaskImport and skips exactly the records that were already written.
+    """
+
+    def __init__(self, job, batch_size=BATCH_SIZE, on_batch=None):
+        self.job = job
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+
+    def run(self, stream):
+        job = self.job
+        started = time.monotonic()
+        processed = 0
+        tasks, errors = [], []
+        number = job.committed_records
+        job.status = 'running'
+        job.save(update_fields=['status', 'updated_at'])
+        try:
+            for number, record in enumerate(iter_records(stream, job.format), start=1):
+                if number <= job.committed_records:
+                    continue
+                processed += 1
+                task, row_errors = build_task(job.user, record)
+                if row_errors:
+                    errors.append({'record': number, 'errors': row_errors})
+                else:
+                    tasks.append(task)
+                if len(tasks) + len(errors) >= self.batch_size:
+                    self.commit(tasks, errors, number)
+                    tasks, errors = [], []
+            self.commit(tasks, errors, number)
+        except Exception:
+            job.status = 'failed'
+            job.save(update_fields=['status', 'updated_at'])
+            raise
+        finally:
+            if job.imported:
+                fragments.invalidate(job.user_id)
+
+        elapsed = time.monotonic() - started
+        job.status = 'completed'
+        job.rows_per_second = round(processed / elapsed, 1) if elapsed > 0 else None
+        job.save(update_fields=['status', 'rows_per_second', 'updated_at'])
+        return job
+
+    def commit(self, tasks, errors, last_number):
+        job = self.job
+        with transaction.atomic():
+            seq = sync.next_sequence(job.user_id)
+            for task in tasks:
+                task.sync_seq = seq
+            created = Task.objects.bulk_create(tasks)
+            self.link_tags(created)
+            # bulk_create sends no signals, so the counters get one delta per batch
+            delta = Counter()
+            for task in created:
+                delta.update(counters.contribution(task.counted_values()))
+            counters.apply_delta(job.user_id, delta)
+
+            job.committed_records = last_number
+            job.imported += len(created)
+            job.failed += len(errors)
+            job.errors = (job.errors + errors)[:MAX_STORED_ERRORS]
+            job.save()
+        if self.on_batch is not None:
+            self.on_batch(job)
+
+    def link_tags(self, tasks):
+        names = {task.pk: parse_tags(task.tags) for task in tasks}
+        tags = {tag.name: tag for tag in get_or_create_tags(sorted({n for task_names in names.values() for n in task_names}))}
+        Through = Task.tag_objects.through
+        Through.objects.bulk_create(
+            [Through(task_id=pk, tag_id=tags[name].pk) for pk, task_names in names.items() for name in task_names],
+            ignore_conflicts=True,
+        )
+
+
+def import_tasks(user, stream, source_name, import_format, batch_size=BATCH_SIZE, job=None, on_batch=None):
+    """
+    Import a text stream for ``user``; pass an unfinished TaskImport as ``job``
+    to resume it. ``on_batch(job)`` is called after each committed batch.
+    """
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f'Unsupported import format: {import_format}')
+    if job is None:
+        job = TaskImport.objects.create(user=user, source_name=source_name, format=import_format)
+    return TaskImporter(job, batch_size, on_batch).run(stream)
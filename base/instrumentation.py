@@ -0,0 +1,310 @@
+"""
+Per-request cost instrumentation.
+
+RequestMetricsMiddleware measures every request: the number of SQL queries
+and their total time, repeated statements (N+1 patterns and exact
+duplicates), template render time and total latency. Each request gets a
+``Server-Timing`` header and one JSON log line on the ``base.requests``
+logger.
+
+Queries are seen through a database execute wrapper that every new
+connection gets. The wrapper adds to the collector of the current request,
+which lives in a ContextVar, so it also sees queries that async views run in
+sync_to_async threads. Template time comes from TimedDjangoTemplates, which
+is set as the template backend.
+
+Each process keeps the last TASK_METRICS_SAMPLE_SIZE requests per endpoint
+and copies them to the cache every TASK_METRICS_FLUSH_INTERVAL seconds
+(through the async cache API when the middleware runs on the event loop).
+endpoint_summary() merges the copies of all processes. With a shared cache
+(file or db) the staff page at /metrics/ covers every worker. With locmem it
+only covers the worker that serves the page.
+"""
+import json
+import logging
+import os
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+from .fragments import get_cache
+
+
+logger = logging.getLogger('base.requests')
+
+_current = ContextVar('request_metrics', default=None)
+
+WORKERS_KEY = 'metrics:workers'
+SNAPSHOT_TIMEOUT = 600
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestMetrics:
+    """Costs collected while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def add_query(self, sql, params, duration):
+        self.queries += 1
+        self.sql_time += duration
+        self.statements[sql] += 1
+        try:
+            self.executions[sql, tuple(params or ())] += 1
+        except TypeError:
+            # Unhashable parameters (lists from bulk statements); not a repeat
+            pass
+
+    def repeated(self, threshold=None):
+        """{sql: count} of statements run at least ``threshold`` times, e.g. one per row of a list"""
+        threshold = threshold or _setting('TASK_METRICS_REPEAT_THRESHOLD', 5)
+        return {sql: count for sql, count in self.statements.most_common() if count >= threshold}
+
+    def duplicates(self):
+        """Number of executions that repeated an earlier statement with the same parameters"""
+        return sum(count - 1 for count in self.executions.values())
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def collect():
+    """Collect RequestMetrics for everything run inside the block"""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper feeding the current collector"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, params, time.perf_counter() - start)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created hook adding record_query to every new connection"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_wrapper, dispatch_uid='base.instrumentation')
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every top-level render for the current request"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+# Rolling samples of this process, keyed by endpoint:
+# (total ms, SQL ms, queries, render ms, had repeated statements)
+_samples = {}
+_last_flush = [0.0]
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return f'{request.method} {match.view_name if match else "<unresolved>"}'
+
+
+def _add_sample(endpoint, metrics, total):
+    """Keep one request's sample; returns whether this process is due to flush"""
+    sample = (
+        round(total * 1000, 2),
+        round(metrics.sql_time * 1000, 2),
+        metrics.queries,
+        round(metrics.render_time * 1000, 2),
+        bool(metrics.repeated()),
+    )
+    samples = _samples.get(endpoint)
+    if samples is None:
+        samples = _samples.setdefault(endpoint, deque(maxlen=_setting('TASK_METRICS_SAMPLE_SIZE', 500)))
+    samples.append(sample)
+    now = time.monotonic()
+    if now - _last_flush[0] < _setting('TASK_METRICS_FLUSH_INTERVAL', 10):
+        return False
+    _last_flush[0] = now
+    return True
+
+
+def record_sample(endpoint, metrics, total):
+    if _add_sample(endpoint, metrics, total):
+        flush()
+
+
+async def arecord_sample(endpoint, metrics, total):
+    if _add_sample(endpoint, metrics, total):
+        await aflush()
+
+
+def _snapshot():
+    return {name: list(samples) for name, samples in _samples.items()}
+
+
+def flush():
+    """Copy this process's samples to the cache for endpoint_summary()"""
+    cache = get_cache()
+    pid = os.getpid()
+    workers = cache.get(WORKERS_KEY) or set()
+    if pid not in workers:
+        cache.set(WORKERS_KEY, workers | {pid}, SNAPSHOT_TIMEOUT)
+    cache.set(f'metrics:samples:{pid}', _snapshot(), SNAPSHOT_TIMEOUT)
+
+
+async def aflush():
+    """flush() through the async cache API, for the event loop where the db cache cannot run sync"""
+    cache = get_cache()
+    pid = os.getpid()
+    workers = await cache.aget(WORKERS_KEY) or set()
+    if pid not in workers:
+        await cache.aset(WORKERS_KEY, workers | {pid}, SNAPSHOT_TIMEOUT)
+    await cache.aset(f'metrics:samples:{pid}', _snapshot(), SNAPSHOT_TIMEOUT)
+
+
+def reset():
+    """Forget every sample (tests)"""
+    _samples.clear()
+    cache = get_cache()
+    for pid in cache.get(WORKERS_KEY) or ():
+        cache.delete(f'metrics:samples:{pid}')
+    cache.delete(WORKERS_KEY)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def endpoint_summary():
+    """Per-endpoint request count and latency percentiles over every process's recent samples"""
+    cache = get_cache()
+    pids = cache.get(WORKERS_KEY) or set()
+    snapshots = cache.get_many([f'metrics:samples:{pid}' for pid in pids if pid != os.getpid()])
+    merged = {}
+    for snapshot in [*snapshots.values(), _snapshot()]:
+        for name, samples in snapshot.items():
+            merged.setdefault(name, []).extend(samples)
+
+    rows = []
+    for name, samples in merged.items():
+        latencies = sorted(sample[0] for sample in samples)
+        count = len(samples)
+        rows.append({
+            'endpoint': name,
+            'count': count,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'avg_sql_ms': round(sum(sample[1] for sample in samples) / count, 2),
+            'avg_queries': round(sum(sample[2] for sample in samples) / count, 1),
+            'avg_render_ms': round(sum(sample[3] for sample in samples) / count, 2),
+            'repeated': sum(1 for sample in samples if sample[4]),
+        })
+    rows.sort(key=lambda row: -row['p95'])
+    return rows
+
+
+def server_timing(metrics, total):
+    return ', '.join([
+        f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'tpl;dur={metrics.render_time * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    """Measure each request; put it first in MIDDLEWARE so the total covers the rest"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with collect() as metrics:
+            response = self.get_response(request)
+        total = metrics.elapsed()
+        record_sample(endpoint_name(request), metrics, total)
+        return self.finish(request, response, metrics, total)
+
+    async def __acall__(self, request):
+        with collect() as metrics:
+            response = await self.get_response(request)
+        total = metrics.elapsed()
+        # On the event loop: the db cache only works through its async API here
+        await arecord_sample(endpoint_name(request), metrics, total)
+        return self.finish(request, response, metrics, total)
+
+    def finish(self, request, response, metrics, total):
+        endpoint = endpoint_name(request)
+        if _setting('TASK_METRICS_SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(metrics, total)
+
+        repeated = metrics.repeated()
+        entry = {
+            'endpoint': endpoint,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'sql_ms': round(metrics.sql_time * 1000, 2),
+            'queries': metrics.queries,
+            'duplicate_queries': metrics.duplicates(),
+            'render_ms': round(metrics.render_time * 1000, 2),
+        }
+        if repeated:
+            # Likely an N+1: the same statement once per row of some list
+            entry['repeated'] = [{'sql': sql[:300], 'count': count} for sql, count in repeated.items()]
+            logger.warning(json.dumps(entry))
+        else:
+            logger.info(json.dumps(entry))
+        return response
@@ -0,0 +1,253 @@
+"""
+A small database-backed job queue.
+
+Views enqueue slow work (large exports and imports, counter rebuilds,
+reminder passes) as Job rows and return at once; ``python manage.py
+run_jobs`` claims and runs them.
+It needs no broker, so it works on SQLite as well as PostgreSQL.
+
+* A job is claimed with one conditional UPDATE (status='queued' -> 'running'),
+  so two workers can never run the same job.
+* Each job function may set a concurrency limit. The claiming UPDATE only
+  matches while fewer than that many jobs of the same name are running.
+* A failed attempt is retried with exponential backoff until max_attempts.
+  A job function raises JobError for a failure that retrying cannot fix;
+  the job is then failed at once.
+* Long job functions call heartbeat() as they make progress, which keeps
+  their lock fresh. A job whose lock goes stale (its worker died or hung) is
+  requeued, or failed once it has used all its attempts.
+"""
+import os
+import traceback
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import counters
+from .export import export_queryset, iter_export
+from .importer import ImportFileError, import_tasks
+from .models import Job, TaskImport
+from .reminders import send_reminders
+
+
+MAX_BACKOFF = 3600
+# Seconds between lock refreshes; well below TASK_JOB_STALE_AFTER
+HEARTBEAT_INTERVAL = 30
+
+REGISTRY = {}
+
+
+class JobSpec:
+
+    def __init__(self, func, max_attempts, concurrency, backoff):
+        self.func = func
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+        self.backoff = backoff
+
+
+def register(name, max_attempts=3, concurrency=None, backoff=30):
+    """
+    Register ``func(job)`` as the job called ``name``.
+
+    ``concurrency`` caps how many jobs of this name run at once across all
+    workers, ``backoff`` is the first retry delay in seconds (doubled per
+    attempt). The function's return value is stored as the job result.
+    """
+    def decorator(func):
+        REGISTRY[name] = JobSpec(func, max_attempts, concurrency, backoff)
+        return func
+    return decorator
+
+
+class LockLost(Exception):
+    """The job was taken from this worker, e.g. requeued after a missed heartbeat"""
+
+
+class JobError(Exception):
+    """A failure that retrying the job cannot fix, e.g. an unreadable input file"""
+
+
+def enqueue(name, user=None, payload=None, delay=0):
+    if name not in REGISTRY:
+        raise LookupError(f'Unknown job: {name}')
+    return Job.objects.create(
+        name=name,
+        user=user,
+        payload=payload or {},
+        max_attempts=REGISTRY[name].max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def _running_count():
+    running = (
+        Job.objects.filter(name=OuterRef('name'), status='running')
+        .order_by()
+        .values('name')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(running, output_field=IntegerField()), 0)
+
+
+def claim(worker_id, names=None):
+    """Mark the oldest due job as running for ``worker_id`` and return it, or None"""
+    now = timezone.now()
+    candidates = Job.objects.filter(status='queued', run_at__lte=now)
+    if names:
+        candidates = candidates.filter(name__in=names)
+    for pk, name in candidates.order_by('run_at', 'id').values_list('pk', 'name')[:20]:
+        spec = REGISTRY.get(name)
+        job = Job.objects.filter(pk=pk, status='queued')
+        if spec is not None and spec.concurrency:
+            job = job.alias(running=_running_count()).filter(running__lt=spec.concurrency)
+        if job.update(status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def backoff_delay(spec, attempts):
+    return min(spec.backoff * 2 ** (attempts - 1), MAX_BACKOFF)
+
+
+def heartbeat(job):
+    """
+    Refresh the lock on a running job, at most every HEARTBEAT_INTERVAL
+    seconds, so requeue_stale() leaves it alone. Raises LockLost when this
+    worker no longer holds the job.
+    """
+    now = timezone.now()
+    if job.locked_at and (now - job.locked_at).total_seconds() < HEARTBEAT_INTERVAL:
+        return
+    if not Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(locked_at=now):
+        raise LockLost(f'{job} is no longer held by {job.locked_by}')
+    job.locked_at = now
+
+
+def run(job):
+    """Run a claimed job and record its outcome; returns the refreshed job"""
+    spec = REGISTRY.get(job.name)
+    now = timezone.now()
+    done = {'locked_by': '', 'locked_at': None}
+    # Only record an outcome while the job is still ours
+    held = Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by)
+    try:
+        if spec is None:
+            raise LookupError(f'Unknown job: {job.name}')
+        result = spec.func(job)
+    except LockLost:
+        pass
+    except JobError as exc:
+        held.update(status='failed', error=str(exc), finished_at=now, **done)
+    except Exception:
+        error = traceback.format_exc()
+        if spec is not None and job.attempts < job.max_attempts:
+            run_at = now + timedelta(seconds=backoff_delay(spec, job.attempts))
+            held.update(status='queued', run_at=run_at, error=error, **done)
+        else:
+            held.update(status='failed', error=error, finished_at=now, **done)
+    else:
+        held.update(status='succeeded', result=result, error='', finished_at=timezone.now(), **done)
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale(seconds):
+    """
+    Deal with running jobs whose lock is older than ``seconds`` (their worker
+    probably died): fail the ones out of attempts and requeue the rest.
+    Returns how many jobs were released.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=seconds))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', error='The worker stopped responding.', finished_at=now, locked_by='', locked_at=None,
+    )
+    return failed + stale.update(status='queued', locked_by='', locked_at=None)
+
+
+def prune(days):
+    """Delete finished jobs older than ``days``, with their files"""
+    old = Job.objects.filter(status__in=['succeeded', 'failed'], finished_at__lt=timezone.now() - timedelta(days=days))
+    for job in old.only('pk', 'result'):
+        path = result_path(job)
+        if path is not None:
+            path.unlink(missing_ok=True)
+    deleted, _ = old.delete()
+    return deleted
+
+
+def files_dir():
+    path = Path(getattr(settings, 'TASK_JOB_FILES_DIR', Path(settings.BASE_DIR) / 'job_files'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def result_path(job):
+    """Path of the file a job produced, if any"""
+    name = (job.result or {}).get('file')
+    return files_dir() / name if name else None
+
+
+# Job functions
+
+
+@register('export_tasks', concurrency=2)
+def export_tasks_job(job):
+    export_format = job.payload['format']
+    name = f'export-{job.pk}.{export_format}'
+    rows = export_queryset(job.user, job.payload.get('params', {}))
+    with open(files_dir() / name, 'w', encoding='utf-8', newline='') as fh:
+        for chunk in iter_export(rows, export_format):
+            fh.write(chunk)
+            heartbeat(job)
+    filename = f'tasks-{job.user.username}-{timezone.localdate().isoformat()}.{export_format}'
+    return {'file': name, 'filename': filename, 'format': export_format}
+
+
+@register('import_tasks', concurrency=2)
+def import_tasks_job(job):
+    # A retry resumes the same TaskImport after its last committed batch
+    task_import = TaskImport.objects.get(pk=job.payload['import_id'])
+    path = files_dir() / job.payload['file']
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as fh:
+            task_import = import_tasks(
+                job.user, fh, task_import.source_name, task_import.format, job=task_import,
+                on_batch=lambda _: heartbeat(job),
+            )
+    except ImportFileError as exc:
+        os.remove(path)
+        raise JobError(str(exc))
+    os.remove(path)
+    return {
+        'import_id': task_import.pk,
+        'imported': task_import.imported,
+        'failed': task_import.failed,
+        'errors': task_import.errors[:100],
+        'rows_per_second': task_import.rows_per_second,
+    }
+
+
+@register('rebuild_task_counters', concurrency=1)
+def rebuild_task_counters_job(job):
+    if 'user_id' in job.payload:
+        user_ids = [job.payload['user_id']]
+    else:
+        user_ids = list(User.objects.values_list('pk', flat=True))
+    for user_id in user_ids:
+        counters.rebuild(user_id)
+        heartbeat(job)
+    return {'users': len(user_ids)}
+
+
+@register('send_reminders', max_attempts=1, concurrency=1)
+def send_reminders_job(job):
+    # One pass at a time; a failed pass is simply picked up by the next one
+    return send_reminders(dry_run=job.payload.get('dry_run', False))
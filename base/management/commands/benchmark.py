@@ -0,0 +1,117 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from base import benchmark
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed reproducible benchmark data and time the list, search, dashboard, toggle and create scenarios, "
+        "in-process or against a running server; writes a JSON report that can be compared between commits"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--tasks', type=int, default=2000, help="Tasks per user")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(benchmark.SCENARIOS),
+                            help="Scenario to run (repeatable); all by default")
+        parser.add_argument('--requests', type=int, default=200, help="Timed requests per scenario")
+        parser.add_argument('--warmup', type=int, default=5, help="Untimed requests before each scenario")
+        parser.add_argument('--url', help="Benchmark a running server at this URL instead of the test client")
+        parser.add_argument('--concurrency', type=int, default=8, help="Parallel connections with --url")
+        parser.add_argument('--cleanup', action='store_true',
+                            help="With --url, delete the benchmark users afterwards (otherwise they are reused)")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+        parser.add_argument('--compare', help="Print changes against an earlier JSON report")
+        parser.add_argument('--fail-over', type=float,
+                            help="With --compare, exit 1 if a metric got worse by more than this many percent")
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'] or list(benchmark.SCENARIOS)
+        if options['url']:
+            report = self.run_http(scenarios, options)
+        else:
+            report = self.run_client(scenarios, options)
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+        if options['compare']:
+            self.print_comparison(report, options)
+
+    def run_client(self, scenarios, options):
+        # Everything happens in one transaction that is rolled back, so the
+        # database is left as it was. The scenarios write far faster than a
+        # person, so rate limits are off (start a server with TASK_RATE_LIMIT=0
+        # for --url).
+        try:
+            with transaction.atomic(), override_settings(TASK_RATE_LIMIT_ENABLED=False):
+                users = self.seed(options)
+                report = benchmark.run(
+                    benchmark.ClientDriver(), users, scenarios, options['requests'], options['seed'], options['warmup'],
+                )
+                raise Rollback
+        except Rollback:
+            pass
+        return report
+
+    def run_http(self, scenarios, options):
+        # The server only sees committed data, so it is kept for the next run
+        users = benchmark.existing_users(options['users'], options['seed'])
+        if users is None:
+            users = self.seed(options)
+        driver = benchmark.HTTPDriver(options['url'], options['concurrency'])
+        try:
+            return benchmark.run(driver, users, scenarios, options['requests'], options['seed'], options['warmup'])
+        finally:
+            if options['cleanup']:
+                benchmark.delete_users(options['users'], options['seed'])
+
+    def seed(self, options):
+        if benchmark.existing_users(options['users'], options['seed']) is not None:
+            raise CommandError('Benchmark users for this seed already exist; use another --seed or delete them.')
+
+        def progress(user, made):
+            self.stderr.write(f'\rseeding {user.username}: {made}/{options["tasks"]}', ending='')
+
+        users = benchmark.generate(options['users'], options['tasks'], options['seed'], progress=progress)
+        self.stderr.write('')
+        return users
+
+    def print_report(self, report):
+        meta = report['meta']
+        self.stdout.write(
+            f"{meta['driver']} @ {meta['revision'] or 'unknown revision'}: {meta['users']} users, "
+            f"{meta['tasks']} tasks, {meta['database']}, concurrency {meta['concurrency']}"
+        )
+        for name, result in report['scenarios'].items():
+            latency = result['latency_ms']
+            queries = result['queries']['mean'] if result['queries'] else '-'
+            self.stdout.write(
+                f"  {name:<14} p50 {latency['p50']:>8.2f} ms  p95 {latency['p95']:>8.2f} ms  "
+                f"p99 {latency['p99']:>8.2f} ms  {result['requests_per_second']:>7.1f} req/s  "
+                f"{queries:>5} queries  {result['errors']} errors"
+            )
+
+    def print_comparison(self, report, options):
+        with open(options['compare']) as fh:
+            baseline = json.load(fh)
+        rows = benchmark.compare(baseline, report)
+        self.stdout.write(f"\nAgainst {options['compare']} ({baseline['meta'].get('revision') or 'unknown revision'}):")
+        for scenario, metric, before, after, change in rows:
+            self.stdout.write(f'  {scenario:<14} {metric:<20} {before:>9} -> {after:>9}  {change:+.1f}%')
+        if options['fail_over'] is not None:
+            worse = benchmark.regressions(rows, options['fail_over'])
+            if worse:
+                for scenario, metric, _, _, change in worse:
+                    self.stderr.write(self.style.ERROR(f'Regression: {scenario} {metric} {change:+.1f}%'))
+                raise SystemExit(1)
@@ -0,0 +1,134 @@
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from base.models import Task
+
+
+class Rollback(Exception):
+    pass
+
+
+def access_patterns(user, today):
+    """The queries base/views.py and base/stats.py issue, keyed by name"""
+    tasks = Task.objects.filter(user=user)
+    return {
+        'userpage default listing': tasks.order_by('-created_at', '-pk')[:26],
+        'userpage due_date sort': tasks.order_by('due_date', 'pk')[:26],
+        'userpage status filter': tasks.filter(status='in_progress').order_by('-created_at')[:26],
+        'userpage category filter': tasks.filter(categories='work').order_by('-created_at')[:26],
+        'userpage priority sort': tasks.order_by('priority', 'pk')[:26],
+        'overdue count': tasks.filter(complete=False, due_date__lt=today).order_by(),
+        'dashboard upcoming': tasks.filter(
+            complete=False, due_date__gte=today, due_date__lte=today + timedelta(days=7)
+        ).order_by('due_date')[:5],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large number of tasks inside a transaction, then record EXPLAIN plans and timings "
+        "for the userpage/dashboard queries with and without the Task indexes. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        report = {}
+        try:
+            with transaction.atomic():
+                user = self.seed(options['tasks'], options['users'], options['batch_size'])
+                today = timezone.localdate()
+                indexes = Task._meta.indexes
+
+                # Index DDL is issued directly: SQLite refuses a schema_editor
+                # context inside an open transaction.
+                editor = connection.schema_editor()
+                with connection.cursor() as cursor:
+                    for index in indexes:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                report['before'] = self.measure(user, today, options['repeat'])
+
+                with connection.cursor() as cursor:
+                    for index in indexes:
+                        cursor.execute(str(index.create_sql(Task, editor)))
+                    cursor.execute('ANALYZE')
+                report['after'] = self.measure(user, today, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        for name in report['after']:
+            before = report['before'][name]['median_ms']
+            after = report['after'][name]['median_ms']
+            self.stdout.write(f'{name:28} {before:10.2f} ms -> {after:8.2f} ms')
+
+        payload = json.dumps({'tasks': options['tasks'], 'users': options['users'], **report}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload)
+        else:
+            self.stdout.write(payload)
+
+    def seed(self, total, user_count, batch_size):
+        rng = random.Random(42)
+        users = User.objects.bulk_create(
+            User(username=f'bench-{i}-{rng.random():.8f}') for i in range(user_count)
+        )
+        today = timezone.localdate()
+        priorities = [value for value, _ in Task.PRIORITY_CHOICES]
+        statuses = [value for value, _ in Task.STATUS_CHOICES]
+        categories = [value for value, _ in Task.Categories]
+
+        # bulk_create skips save signals, so the seed does not touch TaskCounter.
+        created = 0
+        while created < total:
+            size = min(batch_size, total - created)
+            batch = []
+            for i in range(size):
+                status = rng.choice(statuses)
+                batch.append(Task(
+                    user=users[(created + i) % user_count],
+                    title=f'Task {created + i}',
+                    status=status,
+                    complete=status == 'completed',
+                    priority=rng.choice(priorities),
+                    categories=rng.choice(categories),
+                    due_date=today + timedelta(days=rng.randint(-60, 60)) if rng.random() < 0.7 else None,
+                ))
+            Task.objects.bulk_create(batch)
+            created += size
+            self.stderr.write(f'\rseeded {created}/{total}', ending='')
+        self.stderr.write('')
+        return users[0]
+
+    def measure(self, user, today, repeat):
+        results = {}
+        for name, qs in access_patterns(user, today).items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                # .all() gives a fresh queryset so no result cache is reused
+                if name == 'overdue count':
+                    qs.all().count()
+                else:
+                    list(qs.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {
+                'plan': qs.explain(),
+                'median_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+            }
+        return results
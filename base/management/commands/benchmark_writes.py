@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from base import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Toggle tasks from several processes at once under each database connection profile "
+        "and report write throughput, latency and lock errors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent writer processes")
+        parser.add_argument('--seconds', type=float, default=5.0, help="How long each profile runs")
+        parser.add_argument('--tasks', type=int, default=200, help="Tasks per writer")
+        parser.add_argument('--profile', action='append', dest='profiles',
+                            help="Profile to run (repeatable); all for this database by default")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        available = benchmark.WRITE_PROFILES.get(connection.vendor, {'configured': {}})
+        unknown = set(options['profiles'] or ()) - set(available)
+        if unknown:
+            raise CommandError(
+                f"Unknown profile {', '.join(sorted(unknown))} for {connection.vendor}; "
+                f"choose from {', '.join(available)}."
+            )
+
+        report = benchmark.write_benchmark(
+            options['workers'], options['seconds'], options['tasks'], options['profiles'],
+        )
+        meta = report['meta']
+        self.stdout.write(f"{meta['database']}: {meta['workers']} writers for {meta['seconds']:g} s each")
+        for name, result in report['profiles'].items():
+            latency = result['latency_ms'] or {'p50': 0, 'p99': 0}
+            self.stdout.write(
+                f"  {name:<12} {result['writes_per_second']:>8.1f} writes/s  p50 {latency['p50']:>8.2f} ms  "
+                f"p99 {latency['p99']:>8.2f} ms  {result['errors']} lock errors"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
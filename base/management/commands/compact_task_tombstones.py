@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from base.sync import compact_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than TASK_SYNC_TOMBSTONE_DAYS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Override the retention period")
+
+    def handle(self, **options):
+        deleted = compact_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones'))
@@ -0,0 +1,50 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base.importer import BATCH_SIZE, IMPORT_FORMATS, ImportFileError, guess_format, import_tasks
+from base.models import TaskImport
+
+
+class Command(BaseCommand):
+    help = "Import tasks for one user from a CSV or NDJSON file in batched inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Default: guessed from the file extension")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--resume', action='store_true',
+            help="Continue the last unfinished import of this file after its last committed batch",
+        )
+
+    def handle(self, username, path, **options):
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'User "{username}" does not exist')
+
+        source_name = os.path.basename(path)
+        import_format = options['format'] or guess_format(path)
+        job = None
+        if options['resume']:
+            job = TaskImport.objects.filter(
+                user=user, source_name=source_name, format=import_format
+            ).exclude(status='completed').first()
+            if job is None:
+                raise CommandError(f'No unfinished import of "{source_name}" to resume')
+            self.stdout.write(f'Resuming import {job.pk} after record {job.committed_records}')
+
+        with open(path, encoding='utf-8-sig', newline='') as fh:
+            try:
+                job = import_tasks(user, fh, source_name, import_format, options['batch_size'], job=job)
+            except ImportFileError as e:
+                raise CommandError(str(e))
+
+        for error in job.errors:
+            self.stderr.write(f"record {error['record']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Import {job.pk}: {job.imported} imported, {job.failed} failed ({job.rows_per_second} rows/s)'
+        ))
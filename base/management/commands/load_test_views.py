@@ -0,0 +1,92 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base.benchmark import create_session
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Hit the task views of a running server (WSGI or ASGI) with concurrent logged-in requests "
+        "and report p50/p99 latency and requests per second"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="User whose session the requests use (must exist in this database)")
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the running server")
+        parser.add_argument('--path', action='append', dest='paths', help="Path to request (repeatable)")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=2000, help="Total requests, spread over the paths")
+        parser.add_argument('--label', default='', help="Name for this run in the report, e.g. wsgi or asgi")
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+
+    def handle(self, username, **options):
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'User "{username}" does not exist')
+
+        paths = options['paths'] or ['/userpage/', '/dashboard/']
+        url = urlsplit(options['url'])
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.login(user)}'
+        local = threading.local()
+
+        def fetch(path):
+            if not hasattr(local, 'conn'):
+                local.conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            started = time.perf_counter()
+            local.conn.request('GET', path, headers={'Cookie': cookie})
+            response = local.conn.getresponse()
+            response.read()
+            return path, response.status, time.perf_counter() - started
+
+        # One untimed pass so caches and connections are warm
+        for path in paths:
+            fetch(path)
+
+        jobs = [paths[i % len(paths)] for i in range(options['requests'])]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(fetch, jobs))
+        elapsed = time.perf_counter() - started
+
+        report = {
+            'label': options['label'],
+            'url': options['url'],
+            'concurrency': options['concurrency'],
+            'requests': len(results),
+            'errors': sum(1 for _, status, _ in results if status != 200),
+            'requests_per_second': round(len(results) / elapsed, 1),
+            'paths': {},
+        }
+        for path in paths:
+            timings = [seconds * 1000 for p, _, seconds in results if p == path]
+            report['paths'][path] = {
+                'p50_ms': round(statistics.median(timings), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2),
+                'mean_ms': round(statistics.fmean(timings), 2),
+            }
+
+        self.stdout.write(f"{report['label'] or options['url']}: {report['requests_per_second']} req/s, "
+                          f"{report['errors']} errors, concurrency {report['concurrency']}")
+        for path, numbers in report['paths'].items():
+            self.stdout.write(f"  {path:<20} p50 {numbers['p50_ms']:>8.2f} ms   p99 {numbers['p99_ms']:>8.2f} ms")
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+
+    def login(self, user):
+        return create_session(user)
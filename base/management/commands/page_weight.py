@@ -0,0 +1,77 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from base.models import Task
+from base.transfer import page_transfer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the bytes transferred for a cold and a warm load of a page and its static assets, "
+        "and list assets that are served uncompressed or without long-lived caching"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user',
+                            help="Load the page as this user (default: a throwaway user with a few tasks, rolled back)")
+        parser.add_argument('--path', help="Page to load (default: the userpage)")
+        parser.add_argument('--json', action='store_true', help="Print the full report as JSON")
+        parser.add_argument('--max-cold', type=int, help="Exit 1 if the cold load transfers more bytes than this")
+        parser.add_argument('--max-warm', type=int, help="Exit 1 if the warm load transfers more bytes than this")
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('userpage')
+        try:
+            with transaction.atomic():
+                if options['user']:
+                    user = User.objects.filter(username=options['user']).first()
+                    if user is None:
+                        raise CommandError(f"No user named {options['user']}.")
+                else:
+                    user = User.objects.create_user('page-weight')
+                    for title in ('Plan the week', 'Pay rent', 'Call the dentist'):
+                        Task.objects.create(user=user, title=title)
+                client = Client()
+                client.force_login(user)
+                report = page_transfer(client, path)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+        over = [
+            f"{name} load transferred {report[name]['bytes']} bytes, budget {options[f'max_{name}']}"
+            for name in ('cold', 'warm')
+            if options[f'max_{name}'] is not None and report[name]['bytes'] > options[f'max_{name}']
+        ]
+        for message in over:
+            self.stderr.write(self.style.ERROR(message))
+        if over:
+            raise SystemExit(1)
+
+    def print_report(self, report):
+        for name in ('cold', 'warm'):
+            load = report[name]
+            self.stdout.write(
+                f"{name} {report['path']}: {load['bytes']} bytes in {load['requests']} requests, "
+                f"{load['from_cache']} from cache"
+            )
+            for row in load['resources']:
+                detail = row['source'] if row['status'] is None else f"{row['status']} {row['source']}"
+                encoding = f" {row['encoding']}" if row['encoding'] else ''
+                self.stdout.write(f"  {row['bytes']:>9}  {detail:<16}{encoding:<6} {row['url']}")
+        for url, problem in report['problems']:
+            self.stdout.write(self.style.WARNING(f'{url}: {problem}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from base.auth import SESSION_BATCH_SIZE, clear_expired_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in small batches, so requests can keep writing meanwhile "
+        "(run_jobs also does this every minute)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SESSION_BATCH_SIZE, help="Sessions deleted per statement")
+
+    def handle(self, *args, batch_size, **options):
+        deleted = clear_expired_sessions(batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions'))
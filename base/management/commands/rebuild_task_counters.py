@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from base import counters
+
+
+class Command(BaseCommand):
+    help = "Recount every user's TaskCounter row from the Task table and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', help="Only rebuild these usernames")
+        parser.add_argument('--check', action='store_true', help="Report drift without fixing it")
+
+    def handle(self, *args, usernames=None, check=False, **options):
+        users = User.objects.order_by('pk')
+        if usernames:
+            users = users.filter(username__in=usernames)
+
+        checked = drifted = 0
+        for user_id, username in users.values_list('pk', 'username').iterator():
+            checked += 1
+            diff = counters.drift(user_id)
+            if diff:
+                drifted += 1
+                details = ', '.join(f'{name} {stored}->{actual}' for name, (stored, actual) in diff.items())
+                self.stdout.write(self.style.WARNING(f'{username}: {details}'))
+                if not check:
+                    counters.rebuild(user_id)
+
+        action = 'found' if check else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} users, {action} drift in {drifted}'))
+        if check and drifted:
+            raise SystemExit(1)
@@ -0,0 +1,57 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from base import jobs, ratelimit
+from base.auth import clear_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Claim and run queued background jobs until stopped (or until the queue is empty with --once)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when no job is due")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--name', action='append', dest='names', help="Only run jobs with this name (repeatable)")
+        parser.add_argument(
+            '--stale-after', type=int, default=getattr(settings, 'TASK_JOB_STALE_AFTER', 600),
+            help="Requeue running jobs whose worker has been silent this many seconds",
+        )
+
+    def handle(self, **options):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.stop)
+
+        last_maintenance = 0
+        while not self.stopping:
+            if time.monotonic() - last_maintenance > 60:
+                jobs.requeue_stale(options['stale_after'])
+                jobs.prune(getattr(settings, 'TASK_JOB_RETENTION_DAYS', 7))
+                clear_expired_sessions()
+                ratelimit.prune()
+                last_maintenance = time.monotonic()
+
+            close_old_connections()
+            job = jobs.claim(worker_id, options['names'])
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+                continue
+
+            started = time.monotonic()
+            job = jobs.run(job)
+            self.stdout.write(
+                f'{job} attempt {job.attempts}/{job.max_attempts} in {time.monotonic() - started:.2f}s'
+            )
+
+    def stop(self, signum, frame):
+        # Finish the current job, then exit
+        self.stopping = True
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from base.reminders import BATCH_SIZE, send_reminders
+
+
+class Command(BaseCommand):
+    help = "Send due-soon and overdue reminders that have not been sent yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Tasks read per query")
+        parser.add_argument('--dry-run', action='store_true', help="Count pending reminders without sending them")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        sent = send_reminders(batch_size=batch_size, dry_run=dry_run)
+        verb = 'Would send' if dry_run else 'Sent'
+        summary = ', '.join(f'{count} {kind}' for kind, count in sent.items())
+        self.stdout.write(self.style.SUCCESS(f'{verb} reminders: {summary}'))
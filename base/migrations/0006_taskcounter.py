@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_alter_task_options_task_priority_task_status_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('overdue_eligible', models.IntegerField(default=0, help_text='Incomplete tasks with a due date')),
+                ('priority_high', models.IntegerField(default=0)),
+                ('priority_medium', models.IntegerField(default=0)),
+                ('priority_low', models.IntegerField(default=0)),
+                ('status_todo', models.IntegerField(default=0)),
+                ('status_in_progress', models.IntegerField(default=0)),
+                ('status_completed', models.IntegerField(default=0)),
+                ('category_work', models.IntegerField(default=0)),
+                ('category_personal', models.IntegerField(default=0)),
+                ('category_shopping', models.IntegerField(default=0)),
+                ('category_health', models.IntegerField(default=0)),
+                ('category_education', models.IntegerField(default=0)),
+                ('category_other', models.IntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='task_counter', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
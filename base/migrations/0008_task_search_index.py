@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from base.search import get_backend
+
+    get_backend(schema_editor.connection.alias).install(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from base.search import get_backend
+
+    get_backend(schema_editor.connection.alias).uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_task_access_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+
+BATCH_SIZE = 2000
+
+
+def normalize(text, max_length):
+    names = []
+    for part in (text or '').split(','):
+        name = part.strip().lower()[:max_length]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def populate_tags(apps, schema_editor):
+    Task = apps.get_model('base', 'Task')
+    Tag = apps.get_model('base', 'Tag')
+    Through = Task.tag_objects.through
+    max_length = Tag._meta.get_field('name').max_length
+
+    rows = Task.objects.exclude(tags='').values_list('pk', 'tags').order_by('pk')
+    batch = []
+
+    def flush():
+        names = {name for _, task_names in batch for name in task_names}
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+        Through.objects.bulk_create(
+            [Through(task_id=task_id, tag_id=ids[name]) for task_id, task_names in batch for name in task_names],
+            ignore_conflicts=True,
+        )
+        batch.clear()
+
+    for task_id, text in rows.iterator(chunk_size=BATCH_SIZE):
+        names = normalize(text, max_length)
+        if names:
+            batch.append((task_id, names))
+        if len(batch) >= BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+
+def clear_tags(apps, schema_editor):
+    Task = apps.get_model('base', 'Task')
+    Task.tag_objects.through.objects.all().delete()
+    apps.get_model('base', 'Tag').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_tag'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_tags, clear_tags),
+    ]
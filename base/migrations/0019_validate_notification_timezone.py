@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 21:36
+
+import base.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_task_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationpreference',
+            name='timezone',
+            field=models.CharField(blank=True, help_text='IANA zone name; blank means settings.TIME_ZONE', max_length=64, validators=[base.models.validate_timezone]),
+        ),
+    ]
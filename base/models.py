@@ -1,7 +1,21 @@
-from django.db import models
+from zoneinfo import available_timezones
+
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+class Tag(models.Model):
+    """A normalized (lower-cased, trimmed) tag shared by every task that uses it"""
+    name = models.CharField(max_length=50, unique=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
 class Task(models.Model):
     PRIORITY_CHOICES = [
         ('high', 'High Priority'),
@@ -35,22 +49,298 @@ class Task(models.Model):
     due_date = models.DateField(help_text="Set the due date", blank=True, null=True)
     categories = models.CharField(max_length=20, choices=Categories, default='other')
     tags = models.CharField(max_length=200, blank=True, help_text="Comma-separated tags")
+    # Normalized copy of ``tags`` for exact, indexed tag filtering
+    tag_objects = models.ManyToManyField(Tag, related_name='tasks', blank=True)
+    # Per-user change sequence number of the last write, for delta sync
+    sync_seq = models.BigIntegerField(default=0, editable=False)
+    # Repeating tasks (see base/recurrence.py): a series has a rule and its
+    # due date is the first occurrence. Occurrences only get their own row,
+    # pointing back at the series, once they are completed or edited.
+    recurrence = models.CharField(max_length=200, blank=True, help_text="Repeat rule, e.g. weekly or FREQ=WEEKLY;BYDAY=MO,TH")
+    recurrence_end = models.DateField(blank=True, null=True, editable=False)
+    series = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='occurrences')
+    occurrence_date = models.DateField(blank=True, null=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Default userpage listing and keyset pages (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='task_user_created_idx'),
+            # Admin changelist over all users, and its date drill-down bounds
+            models.Index(fields=['-created_at', '-id'], name='task_created_idx'),
+            # Due-date sort over all of a user's tasks
+            models.Index(fields=['user', 'due_date', 'id'], name='task_user_due_idx'),
+            # Overdue and upcoming windows only ever look at open tasks
+            models.Index(
+                fields=['user', 'due_date'],
+                name='task_user_open_due_idx',
+                condition=models.Q(complete=False, due_date__isnull=False),
+            ),
+            models.Index(fields=['user', 'status', '-created_at'], name='task_user_status_idx'),
+            models.Index(fields=['user', 'priority', 'id'], name='task_user_priority_idx'),
+            models.Index(fields=['user', 'categories', '-created_at'], name='task_user_category_idx'),
+            models.Index(fields=['user', 'title', 'id'], name='task_user_title_idx'),
+            # Max(updated_at) for conditional GET validators
+            models.Index(fields=['user', 'updated_at'], name='task_user_updated_idx'),
+            # Delta sync feed, keyed on (sync_seq, id)
+            models.Index(fields=['user', 'sync_seq', 'id'], name='task_user_sync_idx'),
+            # Reminder scan: open tasks of every user by due date
+            models.Index(
+                fields=['due_date', 'id'],
+                name='task_open_due_date_idx',
+                condition=models.Q(complete=False, due_date__isnull=False),
+            ),
+            # Active repeating series, read for every upcoming window
+            models.Index(
+                fields=['user', 'due_date'],
+                name='task_user_series_idx',
+                condition=models.Q(complete=False) & ~models.Q(recurrence=''),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'occurrence_date'], name='unique_task_occurrence'),
+        ]
+
+    # Fields that feed the per-user TaskCounter row
+    COUNTED_FIELDS = ('user_id', 'complete', 'due_date', 'priority', 'status', 'categories')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was counted so saves and deletes can apply a delta
+        # instead of recounting the user's tasks.
+        instance._counted_values = instance.counted_values()
+        instance._synced_tags = None if 'tags' in instance.get_deferred_fields() else instance.tags
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .sync import next_sequence
+
+        # Taking the sequence number in the same transaction as the write
+        # keeps sequence order equal to commit order, so a sync client can
+        # never skip past a write that commits late.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        self.set_recurrence_end()
+        with transaction.atomic(using=using):
+            self.sync_seq = next_sequence(self.user_id, using=using)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'sync_seq', 'recurrence_end'}
+            super().save(*args, **kwargs)
+
+    def counted_values(self):
+        """Snapshot of the counted fields, or None if any of them is deferred"""
+        deferred = self.get_deferred_fields()
+        if deferred.intersection(self.COUNTED_FIELDS):
+            return None
+        return {name: getattr(self, name) for name in self.COUNTED_FIELDS}
         
     def __str__(self):
         return self.title if hasattr(self, 'title') and self.title else (self.description[:50] if self.description else "Unnamed Task")
     
+    @property
+    def rule(self):
+        """Parsed recurrence rule, or None for a one-off task"""
+        from .recurrence import Rule
+
+        if not self.recurrence:
+            return None
+        if getattr(self, '_rule_text', None) != self.recurrence:
+            self._rule, self._rule_text = Rule.parse(self.recurrence), self.recurrence
+        return self._rule
+
+    def set_recurrence_end(self):
+        """Store the last occurrence date so ended series can be skipped in SQL"""
+        self.recurrence_end = self.rule.last_date(self.due_date) if self.rule and self.due_date else None
+
+    @property
+    def recurrence_label(self):
+        return self.rule.describe(self.due_date) if self.rule and self.due_date else ''
+
+    def occurrence(self, day):
+        """Unsaved occurrence of this series due on ``day``"""
+        return Task(
+            user_id=self.user_id, title=self.title, description=self.description,
+            priority=self.priority, categories=self.categories, tags=self.tags,
+            due_date=day, series=self, occurrence_date=day,
+        )
+
     @property
     def is_overdue(self):
         """Check if task is overdue"""
-        if self.due_date and not self.complete:
+        # A series is never overdue itself, only its occurrences are
+        if self.due_date and not self.complete and not self.recurrence:
             return self.due_date < timezone.now().date()
         return False
     
     @property
     def tag_list(self):
-        """Return tags as a list"""
+        """Return tags as a list, using prefetched Tag rows when available"""
+        if 'tag_objects' in getattr(self, '_prefetched_objects_cache', {}):
+            return [tag.name for tag in self.tag_objects.all()]
         return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
 
+
+
+
+class TaskCounter(models.Model):
+    """Per-user task counters, kept up to date incrementally on every Task write"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='task_counter')
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    overdue_eligible = models.IntegerField(default=0, help_text="Incomplete tasks with a due date")
+    priority_high = models.IntegerField(default=0)
+    priority_medium = models.IntegerField(default=0)
+    priority_low = models.IntegerField(default=0)
+    status_todo = models.IntegerField(default=0)
+    status_in_progress = models.IntegerField(default=0)
+    status_completed = models.IntegerField(default=0)
+    category_work = models.IntegerField(default=0)
+    category_personal = models.IntegerField(default=0)
+    category_shopping = models.IntegerField(default=0)
+    category_health = models.IntegerField(default=0)
+    category_education = models.IntegerField(default=0)
+    category_other = models.IntegerField(default=0)
+    changed_at = models.DateTimeField(null=True, blank=True, help_text="Last time a counter moved")
+
+    def __str__(self):
+        return f"Task counters for {self.user}"
+
+
+class TaskSyncState(models.Model):
+    """Per-user change sequence for the delta sync feed"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='task_sync_state')
+    change_seq = models.BigIntegerField(default=0, help_text="Last sequence number handed out")
+    floor_seq = models.BigIntegerField(default=0, help_text="Tombstones up to here were compacted away")
+
+    def __str__(self):
+        return f"Sync state for {self.user}"
+
+
+class TaskTombstone(models.Model):
+    """Record of a deleted task, kept so sync clients learn about the delete"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_tombstones')
+    task_id = models.IntegerField()
+    sync_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'sync_seq', 'task_id'], name='tombstone_user_sync_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted task {self.task_id}"
+
+
+def validate_timezone(value):
+    if value not in available_timezones():
+        raise ValidationError(f'{value} is not a known time zone, e.g. Europe/Berlin.', code='invalid')
+
+
+class NotificationPreference(models.Model):
+    """Per-user reminder settings; users without a row get the defaults"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_preference')
+    timezone = models.CharField(
+        max_length=64, blank=True, validators=[validate_timezone],
+        help_text="IANA zone name; blank means settings.TIME_ZONE",
+    )
+    reminders_enabled = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"Notification preferences for {self.user}"
+
+
+class TaskReminder(models.Model):
+    """A reminder that was sent, so the scheduler never sends it twice"""
+    KIND_CHOICES = [
+        ('due_soon', 'Due soon'),
+        ('overdue', 'Overdue'),
+    ]
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='reminders')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Moving the due date makes the task eligible for a new reminder
+    due_date = models.DateField()
+    sent_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'kind', 'due_date'], name='unique_task_reminder'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} reminder for task {self.task_id}"
+
+
+class TaskImport(models.Model):
+    """Progress of one bulk import, so a failed run can resume after its last committed batch"""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+        ('completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='task_imports')
+    source_name = models.CharField(max_length=255)
+    format = models.CharField(max_length=10)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    committed_records = models.PositiveIntegerField(default=0, help_text="Number of source records already committed")
+    imported = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    rows_per_second = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.source_name} ({self.get_status_display()})"
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by the run_jobs worker"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100, help_text="Registered job function, see base.jobs")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time (retry backoff)")
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Claiming: the oldest due job that is still queued
+            models.Index(fields=['status', 'run_at', 'id'], name='job_status_run_at_idx'),
+            models.Index(fields=['name', 'status'], name='job_name_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket state for base.ratelimit.DatabaseStore, shared by every worker process"""
+    key = models.CharField(max_length=200, primary_key=True)
+    tokens = models.FloatField()
+    # Unix time of the last refill; a float keeps the refill arithmetic in SQL
+    stamp = models.FloatField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.2f} tokens"
@@ -0,0 +1,62 @@
+"""
+Pluggable delivery for task reminders.
+
+A backend has one method, ``send(notifications)``, taking a list of dicts
+with kind, task_id, title, due_date, user_id, username and email. Pick one
+with the TASK_NOTIFICATION_BACKEND setting (a dotted class path).
+"""
+import json
+import sys
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.utils.module_loading import import_string
+
+
+MESSAGES = {
+    'due_soon': 'Task "{title}" is due on {due_date}.',
+    'overdue': 'Task "{title}" was due on {due_date} and is now overdue.',
+}
+
+
+def message(notification):
+    return MESSAGES[notification['kind']].format(**notification)
+
+
+class ConsoleBackend:
+    """Print one line per reminder; the default for development"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, notifications):
+        for notification in notifications:
+            self.stream.write(f"[{notification['username']}] {message(notification)}\n")
+        self.stream.flush()
+
+
+class FileBackend:
+    """Append one JSON line per reminder to TASK_NOTIFICATION_FILE"""
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'TASK_NOTIFICATION_FILE', 'notifications.ndjson')
+
+    def send(self, notifications):
+        with open(self.path, 'a', encoding='utf-8') as fh:
+            for notification in notifications:
+                fh.write(json.dumps({**notification, 'message': message(notification)}, default=str) + '\n')
+
+
+class EmailBackend:
+    """Send through Django's EMAIL_BACKEND; users without an address are skipped"""
+
+    def send(self, notifications):
+        send_mass_mail([
+            ('Task reminder', message(notification), None, [notification['email']])
+            for notification in notifications
+            if notification['email']
+        ])
+
+
+def get_backend():
+    return import_string(getattr(settings, 'TASK_NOTIFICATION_BACKEND', 'base.notifications.ConsoleBackend'))()
@@ -0,0 +1,170 @@
+import base64
+import json
+
+from django.db.models import F, Q
+
+
+DEFAULT_PAGE_SIZE = 25
+
+# Sorts offered by the userpage. Each one is paired with the primary key as a
+# tiebreaker so that every row has a unique position in the ordering.
+SORT_FIELDS = {
+    '-created_at': ('created_at', False),
+    'created_at': ('created_at', True),
+    'due_date': ('due_date', True),
+    '-due_date': ('due_date', False),
+    'priority': ('priority', True),
+    '-priority': ('priority', False),
+    'title': ('title', True),
+    '-title': ('title', False),
+    # Only available when the queryset carries a search_rank annotation
+    'relevance': ('search_rank', False),
+}
+DEFAULT_SORT = '-created_at'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of results plus the cursors pointing at its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination keyed on (sort field, pk).
+
+    Each page is fetched with a WHERE clause that seeks past the last row of
+    the previous page instead of an OFFSET, so page 500 costs the same as
+    page 1. Nullable sort fields (due_date) always place NULLs last.
+    """
+
+    def __init__(self, queryset, sort=DEFAULT_SORT, per_page=DEFAULT_PAGE_SIZE):
+        if sort not in SORT_FIELDS:
+            sort = DEFAULT_SORT
+        if sort == 'relevance' and 'search_rank' not in queryset.query.annotations:
+            sort = DEFAULT_SORT
+        self.queryset = queryset
+        self.sort = sort
+        self.per_page = per_page
+        self.field, self.ascending = SORT_FIELDS[sort]
+        # Annotated sort keys (search_rank) have no model field and are never NULL
+        self.model_field = None if self.field in queryset.query.annotations else queryset.model._meta.get_field(self.field)
+
+    def encode_cursor(self, obj, direction):
+        value = getattr(obj, self.field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        payload = json.dumps({'s': self.sort, 'v': value, 'pk': obj.pk, 'd': direction}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if data['s'] != self.sort or data['d'] not in ('n', 'p'):
+                raise InvalidCursor('Cursor does not match the current sort')
+            value = data['v']
+            if value is not None and self.model_field is not None:
+                value = self.model_field.to_python(value)
+            return value, int(data['pk']), data['d']
+        except InvalidCursor:
+            raise
+        except Exception as exc:
+            raise InvalidCursor('Malformed cursor') from exc
+
+    def _ordering(self, ascending):
+        # NULLs go last in the forward direction, so walking backwards they
+        # come first.
+        nulls = {'nulls_last': True} if ascending == self.ascending else {'nulls_first': True}
+        field = F(self.field).asc(**nulls) if ascending else F(self.field).desc(**nulls)
+        return [field, 'pk' if ascending else '-pk']
+
+    def _seek(self, value, pk, ascending):
+        """
+        Filters for the rows strictly after (value, pk) in the given direction,
+        one per run of the ordering, so each can seek the (user, field, id)
+        index. A single OR across the NULL rows would leave the database only
+        the user_id part of the index.
+        """
+        nulls_last = ascending == self.ascending
+        cmp = 'gt' if ascending else 'lt'
+        if value is None:
+            seeks = [Q(**{f'{self.field}__isnull': True, f'pk__{cmp}': pk})]
+            if not nulls_last:
+                seeks.append(Q(**{f'{self.field}__isnull': False}))
+            return seeks
+        # The outer bound (field <= value, or >=) is the index range; the OR
+        # inside it only breaks ties on the same value
+        bound = Q(**{f'{self.field}__{cmp}e': value})
+        seeks = [bound & (Q(**{f'{self.field}__{cmp}': value}) | Q(**{self.field: value, f'pk__{cmp}': pk}))]
+        if nulls_last and self.model_field is not None and self.model_field.null:
+            seeks.append(Q(**{f'{self.field}__isnull': True}))
+        return seeks
+
+    def _page_queries(self, cursor):
+        """Ordered querysets that are read in turn until the page is full"""
+        direction = 'n'
+        ascending = self.ascending
+        seeks = [Q()]
+        if cursor:
+            value, pk, direction = self.decode_cursor(cursor)
+            ascending = self.ascending if direction == 'n' else not self.ascending
+            seeks = self._seek(value, pk, ascending)
+        ordering = self._ordering(ascending)
+        return [self.queryset.filter(seek).order_by(*ordering) for seek in seeks], direction
+
+    def _build_page(self, rows, direction, cursor):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'p':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+
+        next_cursor = self.encode_cursor(rows[-1], 'n') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'p') if rows and has_previous else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def page(self, cursor=None):
+        """Return the page after (or before) the given cursor; no cursor means the first page"""
+        querysets, direction = self._page_queries(cursor)
+        rows = []
+        for qs in querysets:
+            # The next run is only read when this one does not fill the page
+            rows += qs[:self.per_page + 1 - len(rows)]
+            if len(rows) > self.per_page:
+                break
+        return self._build_page(rows, direction, cursor)
+
+    async def apage(self, cursor=None):
+        """Async version of page()"""
+        querysets, direction = self._page_queries(cursor)
+        rows = []
+        for qs in querysets:
+            rows += [row async for row in qs[:self.per_page + 1 - len(rows)]]
+            if len(rows) > self.per_page:
+                break
+        return self._build_page(rows, direction, cursor)
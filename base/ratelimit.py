@@ -0,0 +1,256 @@
+"""
+Token-bucket rate limits for expensive or abusable views.
+
+@rate_limit(name) reads TASK_RATE_LIMITS[name], a mapping of scope to rate
+such as {'ip': '20/m', 'username': '5/m'}. Each rate gives a bucket of that
+many tokens which refills at that many per period. A request takes one token
+from the bucket of each scope. When any bucket is empty, the request gets a
+429 with Retry-After before the view runs, so it never reaches the password
+hasher or the view's queries.
+
+Scopes:
+* ip: the client address (see client_ip())
+* user: the logged-in user; anonymous requests fall back to their address
+* username: the username posted to a login form (or sent with HTTP Basic
+  auth), so one account cannot be guessed at from many addresses
+
+refund() gives the tokens back, for limits that should only count failures:
+the API's Basic auth takes its tokens before hashing the password and returns
+them when the password was right.
+
+The buckets live in the store named by TASK_RATE_LIMIT_STORE:
+* DatabaseStore (default) takes a token with one conditional UPDATE. Every
+  worker sees the same buckets, and two requests can never take the last
+  token twice.
+* CacheStore makes no database writes. Buckets are only shared between
+  workers when the cache is (not locmem). Concurrent requests can read the
+  same count, so a few extra may get through.
+"""
+import hashlib
+import math
+import time
+from functools import cache, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from django.db.models.lookups import GreaterThanOrEqual
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils.module_loading import import_string
+
+from .models import RateLimitBucket
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+MAX_IDENT_LENGTH = 100
+
+
+def parse_rate(rate):
+    """'20/m' -> (capacity 20, refill 20/60 tokens per second)"""
+    count, _, period = rate.partition('/')
+    return int(count), int(count) / PERIODS[period[:1]]
+
+
+def client_ip(request):
+    """
+    The client's address. Behind a proxy, set TASK_RATE_LIMIT_IP_HEADER (e.g.
+    'HTTP_X_FORWARDED_FOR'). Its last entry is used, because that is the one
+    the proxy added itself.
+    """
+    header = getattr(settings, 'TASK_RATE_LIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        return request.META[header].split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class DatabaseStore:
+    """Buckets in RateLimitBucket rows, updated atomically"""
+
+    def take(self, key, capacity, rate, now):
+        """Take a token; returns 0 on success, else the seconds until one is available"""
+        available = Least(Value(float(capacity)), F('tokens') + (Value(now) - F('stamp')) * Value(rate))
+        taken = (
+            RateLimitBucket.objects.filter(GreaterThanOrEqual(available, 1), key=key)
+            .update(tokens=available - 1, stamp=now)
+        )
+        if taken:
+            return 0
+        bucket = RateLimitBucket.objects.filter(key=key).values_list('tokens', 'stamp').first()
+        if bucket is None:
+            try:
+                with transaction.atomic():
+                    RateLimitBucket.objects.create(key=key, tokens=capacity - 1, stamp=now)
+                return 0
+            except IntegrityError:
+                # Another worker created it first
+                return self.take(key, capacity, rate, now)
+        tokens, stamp = bucket
+        wait = (1 - min(capacity, tokens + (now - stamp) * rate)) / rate
+        # A positive wait is the normal refusal; otherwise another worker
+        # changed the bucket in between, so try again
+        return wait if wait > 0 else self.take(key, capacity, rate, now)
+
+    def give(self, key, capacity, rate):
+        """Return a token taken by take()"""
+        RateLimitBucket.objects.filter(key=key).update(tokens=Least(Value(float(capacity)), F('tokens') + 1))
+
+    def prune(self, now, seconds):
+        """Delete buckets untouched for ``seconds``; they would be full again anyway"""
+        return RateLimitBucket.objects.filter(stamp__lt=now - seconds).delete()[0]
+
+
+class CacheStore:
+    """Buckets in the TASK_RATE_LIMIT_CACHE cache; no database writes"""
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'TASK_RATE_LIMIT_CACHE', 'default')]
+
+    def take(self, key, capacity, rate, now):
+        key = f'ratelimit:{key}'
+        tokens, stamp = self.cache.get(key, (capacity, now))
+        available = min(capacity, tokens + (now - stamp) * rate)
+        if available < 1:
+            return (1 - available) / rate
+        # Expires once it would have refilled completely
+        self.cache.set(key, (available - 1, now), math.ceil(capacity / rate) + 1)
+        return 0
+
+    def give(self, key, capacity, rate):
+        key = f'ratelimit:{key}'
+        bucket = self.cache.get(key)
+        if bucket is not None:
+            tokens, stamp = bucket
+            self.cache.set(key, (min(capacity, tokens + 1), stamp), math.ceil(capacity / rate) + 1)
+
+    def prune(self, now, seconds):
+        return 0
+
+
+@cache
+def get_store():
+    return import_string(getattr(settings, 'TASK_RATE_LIMIT_STORE', 'base.ratelimit.DatabaseStore'))()
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    if setting in ('TASK_RATE_LIMIT_STORE', 'TASK_RATE_LIMIT_CACHE'):
+        get_store.cache_clear()
+
+
+def _ident(value):
+    value = str(value)
+    if len(value) > MAX_IDENT_LENGTH:
+        value = hashlib.md5(value.encode(), usedforsecurity=False).hexdigest()
+    return value
+
+
+def _identity(scope, request, user, username):
+    if scope == 'ip':
+        return client_ip(request)
+    if scope == 'user':
+        return f'u{user.pk}' if user.is_authenticated else f'ip{client_ip(request)}'
+    if scope == 'username':
+        if username is None:
+            username = request.POST.get('username', '')
+        return username.lower() or None
+    raise ValueError(f'Unknown rate limit scope: {scope}')
+
+
+def _buckets(name, request, user, username):
+    """(key, capacity, tokens per second) of each ``name`` bucket that applies to a request"""
+    if not getattr(settings, 'TASK_RATE_LIMIT_ENABLED', True):
+        return
+    for scope, rate in getattr(settings, 'TASK_RATE_LIMITS', {}).get(name, {}).items():
+        identity = _identity(scope, request, user, username)
+        if identity is not None:
+            yield (f'{name}:{scope}:{_ident(identity)}', *parse_rate(rate))
+
+
+def check(name, request, user, username=None):
+    """
+    Take a token from each of the ``name`` buckets; returns 0, or the seconds
+    to wait. ``username`` replaces the posted one for the username scope.
+    """
+    store = get_store()
+    now = time.time()
+    for key, capacity, per_second in _buckets(name, request, user, username):
+        wait = store.take(key, capacity, per_second, now)
+        if wait:
+            # Leave the remaining buckets alone; this request is refused anyway
+            return wait
+    return 0
+
+
+def refund(name, request, user, username=None):
+    """Give back the tokens a successful check() took"""
+    store = get_store()
+    for key, capacity, per_second in _buckets(name, request, user, username):
+        store.give(key, capacity, per_second)
+
+
+def wants_json(request):
+    return (
+        request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        or request.content_type == 'application/json'
+        or 'application/json' in request.headers.get('Accept', '')
+    )
+
+
+def too_many_requests(wait, request=None, template=None, context=None):
+    """
+    A 429 with Retry-After: JSON, or ``template`` rendered with an error
+    message when a browser posted a form
+    """
+    seconds = max(1, math.ceil(wait))
+    error = f'Too many requests. Try again in {seconds} seconds.'
+    if template is not None and not wants_json(request):
+        messages.error(request, error)
+        response = render(request, template, context(request) if context else None, status=429)
+    else:
+        response = JsonResponse({'success': False, 'error': error}, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def rate_limit(name, methods=('POST',), template=None, context=None):
+    """
+    Apply the TASK_RATE_LIMITS[name] buckets to ``methods`` requests of a view.
+    Form views pass their ``template`` (and a ``context(request)`` function) so
+    a refused browser gets the form back.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                if request.method in methods:
+                    wait = await sync_to_async(check)(name, request, await request.auser())
+                    if wait:
+                        return await sync_to_async(too_many_requests)(wait, request, template, context)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                if request.method in methods:
+                    wait = check(name, request, request.user)
+                    if wait:
+                        return too_many_requests(wait, request, template, context)
+                return view(request, *args, **kwargs)
+        return inner
+    return decorator
+
+
+def prune():
+    """Drop stored buckets that have been idle long enough to be full again"""
+    refill = [
+        capacity / per_second
+        for limits in getattr(settings, 'TASK_RATE_LIMITS', {}).values()
+        for capacity, per_second in map(parse_rate, limits.values())
+    ]
+    return get_store().prune(time.time(), max(refill, default=0))
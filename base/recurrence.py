@@ -0,0 +1,263 @@
+"""
+Repeating tasks.
+
+A repeating task is stored once, as a series: ``Task.recurrence`` holds a
+subset of an iCalendar RRULE and its due date is the first occurrence.
+Occurrences are computed for the date window being shown and only get a row
+of their own when they are completed or edited (materialize()), so storage
+grows with the number of rules, not the number of occurrences.
+
+Supported: FREQ=DAILY|WEEKLY|MONTHLY, INTERVAL, BYDAY (weekly), BYMONTHDAY
+(monthly, 1-31), COUNT and UNTIL. Expanding a rule jumps straight to the
+requested window, so the work is bounded by the window, not by the age of
+the series.
+"""
+import calendar
+from datetime import date, timedelta
+from itertools import islice, takewhile
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+WEEKDAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+SHORTCUTS = {
+    'daily': 'FREQ=DAILY',
+    'weekdays': 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+    'weekly': 'FREQ=WEEKLY',
+    'monthly': 'FREQ=MONTHLY',
+}
+MAX_COUNT = 1000
+MAX_INTERVAL = 366
+
+
+class InvalidRule(ValueError):
+    pass
+
+
+def _int(value, name, low, high):
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidRule(f'{name} must be a number.')
+    if not low <= number <= high:
+        raise InvalidRule(f'{name} must be between {low} and {high}.')
+    return number
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+class Rule:
+    """A parsed recurrence rule"""
+
+    def __init__(self, freq, interval=1, byday=(), bymonthday=(), count=None, until=None):
+        self.freq = freq
+        self.interval = interval
+        self.byday = tuple(sorted(byday))
+        self.bymonthday = tuple(sorted(bymonthday))
+        self.count = count
+        self.until = until
+
+    @classmethod
+    def parse(cls, text):
+        """Parse an RRULE subset, or one of the SHORTCUTS"""
+        text = text.strip()
+        text = SHORTCUTS.get(text.lower(), text)
+        if text.upper().startswith('RRULE:'):
+            text = text[6:]
+        parts = {}
+        for part in filter(None, text.upper().split(';')):
+            name, sep, value = part.partition('=')
+            if not sep or not value:
+                raise InvalidRule(f'Expected NAME=VALUE, got "{part}".')
+            if name in parts:
+                raise InvalidRule(f'{name} is given twice.')
+            parts[name] = value
+
+        freq = parts.pop('FREQ', None)
+        if freq not in FREQUENCIES:
+            raise InvalidRule('FREQ must be DAILY, WEEKLY or MONTHLY.')
+        options = {}
+        if 'INTERVAL' in parts:
+            options['interval'] = _int(parts.pop('INTERVAL'), 'INTERVAL', 1, MAX_INTERVAL)
+        if 'BYDAY' in parts:
+            if freq != 'WEEKLY':
+                raise InvalidRule('BYDAY is only supported with FREQ=WEEKLY.')
+            days = parts.pop('BYDAY').split(',')
+            if not set(days) <= set(WEEKDAYS):
+                raise InvalidRule('BYDAY takes weekdays such as MO,WE,FR.')
+            options['byday'] = {WEEKDAYS.index(day) for day in days}
+        if 'BYMONTHDAY' in parts:
+            if freq != 'MONTHLY':
+                raise InvalidRule('BYMONTHDAY is only supported with FREQ=MONTHLY.')
+            options['bymonthday'] = {_int(day, 'BYMONTHDAY', 1, 31) for day in parts.pop('BYMONTHDAY').split(',')}
+        if 'COUNT' in parts and 'UNTIL' in parts:
+            raise InvalidRule('Give COUNT or UNTIL, not both.')
+        if 'COUNT' in parts:
+            options['count'] = _int(parts.pop('COUNT'), 'COUNT', 1, MAX_COUNT)
+        if 'UNTIL' in parts:
+            value = parts.pop('UNTIL')
+            try:
+                options['until'] = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+            except ValueError:
+                raise InvalidRule('UNTIL must be a date such as 20251231.')
+        if parts:
+            raise InvalidRule(f'Unsupported rule part: {", ".join(sorted(parts))}.')
+        return cls(freq, **options)
+
+    def __str__(self):
+        parts = [f'FREQ={self.freq}']
+        if self.interval != 1:
+            parts.append(f'INTERVAL={self.interval}')
+        if self.byday:
+            parts.append('BYDAY=' + ','.join(WEEKDAYS[day] for day in self.byday))
+        if self.bymonthday:
+            parts.append('BYMONTHDAY=' + ','.join(map(str, self.bymonthday)))
+        if self.count:
+            parts.append(f'COUNT={self.count}')
+        if self.until:
+            parts.append(f'UNTIL={self.until:%Y%m%d}')
+        return ';'.join(parts)
+
+    def describe(self, start):
+        """Short human-readable summary, e.g. "Every 2 weeks on Mon, Thu\""""
+        unit = {'DAILY': 'day', 'WEEKLY': 'week', 'MONTHLY': 'month'}[self.freq]
+        text = f'Every {unit}' if self.interval == 1 else f'Every {self.interval} {unit}s'
+        if self.freq == 'WEEKLY':
+            text += ' on ' + ', '.join(WEEKDAY_NAMES[day] for day in self.byday or [start.weekday()])
+        elif self.freq == 'MONTHLY':
+            text += ' on day ' + ', '.join(map(str, self.bymonthday or [start.day]))
+        if self.count:
+            text += f', {self.count} times'
+        elif self.until:
+            text += f' until {self.until:%b %d, %Y}'
+        return text
+
+    def _iter(self, start, first):
+        """Occurrences on or after ``first`` for a series starting at ``start``, ignoring COUNT/UNTIL"""
+        first = max(first, start)
+        try:
+            if self.freq == 'DAILY':
+                step = -(-(first - start).days // self.interval)
+                day = start + timedelta(days=step * self.interval)
+                while True:
+                    yield day
+                    day += timedelta(days=self.interval)
+            elif self.freq == 'WEEKLY':
+                weekdays = self.byday or (start.weekday(),)
+                week = start - timedelta(days=start.weekday())
+                period = ((first - week).days // 7) // self.interval
+                while True:
+                    monday = week + timedelta(weeks=period * self.interval)
+                    for weekday in weekdays:
+                        day = monday + timedelta(days=weekday)
+                        if day >= first:
+                            yield day
+                    period += 1
+            else:
+                monthdays = self.bymonthday or (start.day,)
+                months = (first.year - start.year) * 12 + first.month - start.month
+                period = months // self.interval
+                while True:
+                    year, month = _add_months(start, period * self.interval)
+                    if year > date.max.year:
+                        return
+                    length = calendar.monthrange(year, month)[1]
+                    for monthday in monthdays:
+                        # Months without that day are skipped, as in RFC 5545
+                        if monthday <= length and date(year, month, monthday) >= first:
+                            yield date(year, month, monthday)
+                    period += 1
+        except OverflowError:
+            return
+
+    def last_date(self, start):
+        """Date of the last occurrence, or None if the series never ends"""
+        if self.count:
+            return list(islice(self._iter(start, start), self.count))[-1]
+        return self.until
+
+    def between(self, start, first, last, end=None):
+        """
+        Occurrences in [first, last] for a series starting at ``start``.
+
+        ``end`` is last_date(start) if the caller already has it (it is
+        stored on the task as recurrence_end).
+        """
+        end = self.last_date(start) if end is None else end
+        if end is not None:
+            last = min(last, end)
+        return takewhile(lambda day: day <= last, self._iter(start, first))
+
+
+def normalize(text):
+    """Canonical form of a rule typed by a user; raises InvalidRule"""
+    return str(Rule.parse(text)) if text.strip() else ''
+
+
+def upcoming(user, first, last, limit=None):
+    """
+    Open tasks due in [first, last], with the occurrences of repeating tasks
+    in that window, ordered by due date.
+
+    Costs three queries: one-off tasks, the user's active series, and the
+    occurrences of those series already stored for the window. The rules are
+    then expanded in Python for the window only.
+    """
+    from .models import Task
+
+    tasks = list(
+        Task.objects.filter(user=user, complete=False, recurrence='', due_date__gte=first, due_date__lte=last)
+        .order_by('due_date', 'id')[:limit]
+    )
+    series = list(
+        Task.objects.filter(user=user, complete=False, due_date__lte=last)
+        .exclude(recurrence='')
+        .filter(Q(recurrence_end__isnull=True) | Q(recurrence_end__gte=first))
+    )
+    if series:
+        stored = set(
+            Task.objects.filter(series__in=series, occurrence_date__gte=first, occurrence_date__lte=last)
+            .values_list('series_id', 'occurrence_date')
+        )
+        for task in series:
+            days = task.rule.between(task.due_date, first, last, task.recurrence_end)
+            days = (day for day in days if (task.pk, day) not in stored)
+            tasks.extend(task.occurrence(day) for day in islice(days, limit))
+    tasks.sort(key=lambda task: (task.due_date, task.pk is None, task.pk or task.series_id))
+    return tasks[:limit]
+
+
+def is_occurrence(series, day):
+    """Whether ``series`` has an occurrence on ``day``"""
+    if not series.recurrence or series.due_date is None:
+        return False
+    return day in series.rule.between(series.due_date, day, day, series.recurrence_end)
+
+
+def materialize(series, day, **fields):
+    """
+    The stored occurrence of ``series`` on ``day``, created if needed.
+
+    ``fields`` only apply when the row is created. Returns (task, created).
+    """
+    from .models import Task
+
+    existing = Task.objects.filter(series=series, occurrence_date=day).first()
+    if existing is not None:
+        return existing, False
+    task = series.occurrence(day)
+    for name, value in fields.items():
+        setattr(task, name, value)
+    try:
+        with transaction.atomic():
+            task.save()
+    except IntegrityError:
+        # Completed or edited concurrently; keep the first one
+        return Task.objects.get(series=series, occurrence_date=day), False
+    return task, True
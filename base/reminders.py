@@ -0,0 +1,111 @@
+"""
+Due-date reminders.
+
+One pass finds every open task that has entered the "due soon" or the
+"overdue" window and has not been reminded for its current due date. The
+scan is a range query on the partial (due_date, id) index of open tasks,
+read in keyset batches. Each user's window is computed from their local date
+(NotificationPreference.timezone, falling back to settings.TIME_ZONE), so
+time and memory depend on the batch size and the number of reminders due,
+not on the total number of tasks.
+"""
+import logging
+from datetime import timedelta
+from zoneinfo import ZoneInfo, available_timezones
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import NotificationPreference, Task, TaskReminder
+from .notifications import get_backend
+
+
+BATCH_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+
+
+def reminder_windows(today):
+    """{kind: (first due date, last due date)} for a user whose local date is ``today``"""
+    lead = getattr(settings, 'TASK_REMINDER_LEAD_DAYS', 1)
+    lookback = getattr(settings, 'TASK_REMINDER_OVERDUE_DAYS', 7)
+    return {
+        'due_soon': (today, today + timedelta(days=lead)),
+        # Only recently overdue tasks; older ones have been reminded already
+        'overdue': (today - timedelta(days=lookback), today - timedelta(days=1)),
+    }
+
+
+def timezone_groups():
+    """(zone name, user filter) pairs covering every user with reminders enabled"""
+    default = settings.TIME_ZONE
+    preferences = NotificationPreference.objects.exclude(timezone__in=['', default])
+    zones = sorted(set(preferences.values_list('timezone', flat=True)))
+    known = available_timezones()
+    for zone in zones:
+        if zone not in known:
+            # Saved around the model validator; these users get TIME_ZONE days
+            logger.warning('Unknown reminder time zone %r; using %s', zone, default)
+    zones = [zone for zone in zones if zone in known]
+    disabled = Q(user__notification_preference__reminders_enabled=False)
+    groups = [(default, ~Q(user__notification_preference__timezone__in=zones) & ~disabled)]
+    groups += [(zone, Q(user__notification_preference__timezone=zone) & ~disabled) for zone in zones]
+    return groups
+
+
+def pending(kind, first, last, users):
+    """Open tasks due in [first, last] for ``users`` that have no ``kind`` reminder for that date"""
+    sent = TaskReminder.objects.filter(task=OuterRef('pk'), kind=kind, due_date=OuterRef('due_date'))
+    return (
+        Task.objects.filter(users, complete=False, recurrence='', due_date__gte=first, due_date__lte=last)
+        .exclude(Exists(sent))
+        .order_by('due_date', 'pk')
+        .values('pk', 'title', 'due_date', 'user_id', 'user__username', 'user__email')
+    )
+
+
+def iter_batches(queryset, batch_size):
+    """Keyset batches over a queryset ordered by (due_date, pk)"""
+    after = Q()
+    while True:
+        batch = list(queryset.filter(after)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+        after = Q(due_date__gt=last['due_date']) | Q(due_date=last['due_date'], pk__gt=last['pk'])
+
+
+def send_reminders(now=None, batch_size=BATCH_SIZE, dry_run=False, backend=None):
+    """Send every due reminder once; returns {kind: number sent}"""
+    now = now or timezone.now()
+    backend = backend or get_backend()
+    sent = {kind: 0 for kind, _ in TaskReminder.KIND_CHOICES}
+    for zone, users in timezone_groups():
+        today = now.astimezone(ZoneInfo(zone)).date()
+        for kind, (first, last) in reminder_windows(today).items():
+            for batch in iter_batches(pending(kind, first, last, users), batch_size):
+                notifications = [
+                    {
+                        'kind': kind,
+                        'task_id': row['pk'],
+                        'title': row['title'],
+                        'due_date': row['due_date'].isoformat(),
+                        'user_id': row['user_id'],
+                        'username': row['user__username'],
+                        'email': row['user__email'],
+                    }
+                    for row in batch
+                ]
+                if not dry_run:
+                    # Recorded and sent together: a failed send is retried next run
+                    with transaction.atomic():
+                        TaskReminder.objects.bulk_create(
+                            [TaskReminder(task_id=row['pk'], kind=kind, due_date=row['due_date']) for row in batch],
+                            ignore_conflicts=True,
+                        )
+                        backend.send(notifications)
+                sent[kind] += len(batch)
+    return sent
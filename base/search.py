@@ -0,0 +1,200 @@
+"""
+Pluggable full-text search over Task title, description and tags.
+
+The backend is picked from the database vendor (FTS5 on SQLite, a tsvector
+column with a GIN index on PostgreSQL, plain icontains anywhere else) and can
+be forced with the TASK_SEARCH_BACKEND setting (a dotted class path).
+"""
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+
+MAX_TERMS = 10
+
+
+def parse_terms(query):
+    """Split a user query into plain word terms; anything else is dropped"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+class IContainsBackend:
+    """Substring matching with LIKE; no index support, used as the fallback"""
+
+    def filter(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(tags__icontains=query)
+        )
+
+    def rank(self, query):
+        return Value(0.0, output_field=FloatField())
+
+    def install(self, connection):
+        pass
+
+    def uninstall(self, connection):
+        pass
+
+
+class SQLiteFTSBackend:
+    """FTS5 external-content table mirroring base_task, kept in sync by triggers"""
+
+    table = 'base_task_fts'
+    triggers = ('base_task_fts_ai', 'base_task_fts_ad', 'base_task_fts_au')
+
+    def match_expression(self, query):
+        # Every term is quoted (so FTS5 syntax in the input is inert) and
+        # prefix-matched.
+        return ' '.join(f'"{term}"*' for term in parse_terms(query))
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match]))
+
+    def rank(self, query):
+        # bm25() is smaller for better matches; negate so higher ranks first.
+        # Title hits weigh most, then tags, then description.
+        sql = (
+            f'(SELECT -bm25({self.table}, 10.0, 1.0, 5.0) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = "{Task._meta.db_table}"."id")'
+        )
+        return RawSQL(sql, [self.match_expression(query)], output_field=FloatField())
+
+    def is_installed(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table])
+            return cursor.fetchone() is not None
+
+    def install(self, connection):
+        task_table = Task._meta.db_table
+        columns = 'title, description, tags'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                f"{columns}, content='{task_table}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS base_task_fts_ai AFTER INSERT ON {task_table} BEGIN "
+                f"INSERT INTO {self.table}(rowid, {columns}) VALUES (new.id, new.title, new.description, new.tags); "
+                f"END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS base_task_fts_ad AFTER DELETE ON {task_table} BEGIN "
+                f"INSERT INTO {self.table}({self.table}, rowid, {columns}) "
+                f"VALUES ('delete', old.id, old.title, old.description, old.tags); "
+                f"END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS base_task_fts_au AFTER UPDATE OF {columns} ON {task_table} BEGIN "
+                f"INSERT INTO {self.table}({self.table}, rowid, {columns}) "
+                f"VALUES ('delete', old.id, old.title, old.description, old.tags); "
+                f"INSERT INTO {self.table}(rowid, {columns}) VALUES (new.id, new.title, new.description, new.tags); "
+                f"END"
+            )
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for trigger in self.triggers:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def repair(self, connection):
+        """Recreate the sync triggers if a table rebuild migration dropped them"""
+        if not self.is_installed(connection):
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                list(self.triggers),
+            )
+            if cursor.fetchone()[0] == len(self.triggers):
+                return False
+        self.install(connection)
+        return True
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector generated column with a GIN index"""
+
+    config = 'english'
+    column = 'search_vector'
+    index = 'base_task_search_vector_idx'
+
+    def tsquery(self, query):
+        return ' & '.join(f'{term}:*' for term in parse_terms(query))
+
+    def filter(self, queryset, query):
+        tsquery = self.tsquery(query)
+        if not tsquery:
+            return queryset.none()
+        sql = f'"{Task._meta.db_table}"."{self.column}" @@ to_tsquery(%s::regconfig, %s)'
+        return queryset.alias(
+            search_match=RawSQL(sql, [self.config, tsquery], output_field=BooleanField())
+        ).filter(search_match=True)
+
+    def rank(self, query):
+        sql = f'ts_rank("{Task._meta.db_table}"."{self.column}", to_tsquery(%s::regconfig, %s))'
+        return RawSQL(sql, [self.config, self.tsquery(query)], output_field=FloatField())
+
+    def install(self, connection):
+        table = Task._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {self.column} tsvector GENERATED ALWAYS AS ("
+                f"setweight(to_tsvector('{self.config}'::regconfig, coalesce(title, '')), 'A') || "
+                f"setweight(to_tsvector('{self.config}'::regconfig, coalesce(tags, '')), 'B') || "
+                f"setweight(to_tsvector('{self.config}'::regconfig, coalesce(description, '')), 'C')"
+                f") STORED"
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {self.index} ON {table} USING GIN ({self.column})')
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {self.index}')
+            cursor.execute(f'ALTER TABLE {Task._meta.db_table} DROP COLUMN IF EXISTS {self.column}')
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    path = getattr(settings, 'TASK_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connections[using].vendor, IContainsBackend)()
+
+
+def search_tasks(queryset, query, ranked=False):
+    """
+    Restrict a Task queryset to rows matching ``query``.
+
+    With ``ranked=True`` each row is annotated with ``search_rank`` (higher is
+    a better match) so callers can order or paginate by relevance.
+    """
+    backend = get_backend(queryset.db)
+    queryset = backend.filter(queryset, query)
+    if ranked:
+        queryset = queryset.annotate(search_rank=backend.rank(query))
+    return queryset
+
+
+def repair_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate hook: SQLite drops triggers when a migration rebuilds base_task"""
+    backend = get_backend(using)
+    if hasattr(backend, 'repair'):
+        backend.repair(connections[using])
@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import auth, counters, fragments, sync
+from .models import Task
+from .tags import sync_tags
+
+
+_bulk_operation = ContextVar('task_bulk_operation', default=False)
+
+
+@contextmanager
+def bulk_operation():
+    """Silence the per-row handlers below; the caller syncs counters and caches itself"""
+    token = _bulk_operation.set(True)
+    try:
+        yield
+    finally:
+        _bulk_operation.reset(token)
+
+
+def _deleted_with_owner(origin):
+    """True when a Task delete cascades from deleting its user, whose counters and sync state go too"""
+    return getattr(origin, 'model', type(origin)) is not Task
+
+
+def _stored_values(pk):
+    return Task.objects.filter(pk=pk).values(*Task.COUNTED_FIELDS).first()
+
+
+@receiver(pre_save, sender=Task)
+def remember_counted_values(sender, instance, raw=False, **kwargs):
+    if raw or _bulk_operation.get():
+        return
+    old = getattr(instance, '_counted_values', None)
+    if old is None and instance.pk is not None:
+        old = _stored_values(instance.pk)
+    instance._counted_before_save = old
+
+
+@receiver(post_save, sender=Task)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw or _bulk_operation.get():
+        return
+    new = instance.counted_values() or _stored_values(instance.pk)
+    old = None if created else getattr(instance, '_counted_before_save', None)
+    counters.record_change(old, new)
+    instance._counted_values = new
+
+    if 'tags' not in instance.get_deferred_fields() and instance.tags != getattr(instance, '_synced_tags', None):
+        if created and not instance.tags:
+            instance._synced_tags = instance.tags
+        else:
+            sync_tags(instance)
+
+
+@receiver(post_delete, sender=Task)
+def update_counters_on_delete(sender, instance, origin=None, **kwargs):
+    if _bulk_operation.get() or _deleted_with_owner(origin):
+        return
+    old = getattr(instance, '_counted_values', None) or instance.counted_values()
+    counters.record_change(old, None)
+
+
+@receiver(post_save, sender=Task)
+def record_moved_task(sender, instance, created, raw=False, **kwargs):
+    if raw or created or _bulk_operation.get():
+        return
+    before = getattr(instance, '_counted_before_save', None)
+    if before and before['user_id'] != instance.user_id:
+        # Gone from the old owner's list as far as their sync feed is concerned
+        sync.record_tombstones(before['user_id'], [instance.pk])
+
+
+@receiver(post_delete, sender=Task)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    if _bulk_operation.get() or _deleted_with_owner(origin):
+        return
+    sync.record_tombstones(instance.user_id, [instance.pk])
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_fragments(sender, instance, raw=False, **kwargs):
+    if raw or _bulk_operation.get():
+        return
+    user_ids = {instance.user_id}
+    before = getattr(instance, '_counted_before_save', None)
+    if before:
+        user_ids.add(before['user_id'])
+    for user_id in user_ids:
+        fragments.invalidate(user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Password, is_active and session hash changes must not wait for the cache to expire
+    auth.forget_user(instance.pk)
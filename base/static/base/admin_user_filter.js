@@ -0,0 +1,15 @@
+'use strict';
+// Task changelist: show the tasks of the user picked in the autocomplete filter
+{
+    const $ = django.jQuery;
+
+    $(function() {
+        $('#user-filter').on('change', function() {
+            const url = new URL(this.dataset.filterUrl, window.location.href);
+            if (this.value) {
+                url.searchParams.set(this.name, this.value);
+            }
+            window.location.href = url.href;
+        });
+    });
+}
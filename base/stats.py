@@ -0,0 +1,90 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import counters
+from .counters import counter_field
+from .models import Task, TaskCounter
+
+
+def _overdue_subquery(today):
+    overdue = (
+        # A repeating series is never overdue itself (see Task.is_overdue)
+        Task.objects.filter(user=OuterRef('user'), complete=False, recurrence='', due_date__lt=today)
+        .order_by()
+        .values('user')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(overdue, output_field=IntegerField()), 0)
+
+
+def task_stats(user, today=None):
+    """
+    Collect every counter shown on the userpage and dashboard for one user.
+
+    The counters are read from the user's TaskCounter row, which Task writes
+    keep up to date, so the cost does not grow with the number of tasks. The
+    overdue count depends on today's date and is fetched in the same query
+    from the user's incomplete tasks that are already past due.
+    """
+    counters_qs = _counters_with_overdue(user, today)
+    counter = counters_qs.first()
+    if counter is None:
+        counters.rebuild(user.pk)
+        counter = counters_qs.get()
+    return _counter_stats(counter)
+
+
+async def atask_stats(user, today=None):
+    """Async version of task_stats()"""
+    counters_qs = _counters_with_overdue(user, today)
+    counter = await counters_qs.afirst()
+    if counter is None:
+        await sync_to_async(counters.rebuild)(user.pk)
+        counter = await counters_qs.aget()
+    return _counter_stats(counter)
+
+
+def _counters_with_overdue(user, today):
+    if today is None:
+        today = timezone.localdate()
+    return TaskCounter.objects.filter(user=user).annotate(overdue=_overdue_subquery(today))
+
+
+def _counter_stats(counter):
+    values = {name: getattr(counter, name) for name in counters.COUNTER_FIELDS}
+    values['overdue'] = counter.overdue
+    return build_stats(values)
+
+
+def build_stats(counts):
+    """Shape raw counters into the context both views expect"""
+    total = counts['total']
+    completed = counts['completed']
+
+    by_category = [
+        {'categories': value, 'count': counts[counter_field('category', value)]}
+        for value, _ in Task.Categories
+        if counts[counter_field('category', value)]
+    ]
+    by_category.sort(key=lambda item: -item['count'])
+    by_status = [
+        {'status': value, 'count': counts[counter_field('status', value)]}
+        for value, _ in Task.STATUS_CHOICES
+        if counts[counter_field('status', value)]
+    ]
+
+    return {
+        'total_tasks': total,
+        'completed_tasks': completed,
+        'pending_tasks': total - completed,
+        'overdue_tasks': counts['overdue'],
+        'completion_rate': round(completed / total * 100, 1) if total > 0 else 0,
+        'high_priority': counts['priority_high'],
+        'medium_priority': counts['priority_medium'],
+        'low_priority': counts['priority_low'],
+        'tasks_by_category': by_category,
+        'tasks_by_status': by_status,
+    }
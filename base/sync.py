@@ -0,0 +1,155 @@
+"""
+Delta sync: the tasks created, updated or deleted since a client's cursor.
+
+Every Task write takes the next number from the user's TaskSyncState and
+stores it in Task.sync_seq; deletes leave a TaskTombstone with their own
+number. A cursor is the (sync_seq, id) of the last change a client has seen,
+so a sync costs O(changes) rather than O(tasks). Tombstones are compacted
+after TASK_SYNC_TOMBSTONE_DAYS; clients whose cursor is older than the
+compacted range are told to reset and fetch everything again.
+"""
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import events
+from .models import TaskSyncState, TaskTombstone
+from .pagination import InvalidCursor
+
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+# Position before every change, including tasks written before sync existed
+START = (-1, 0)
+# Larger than any task id, so (seq, LAST_PK) sorts after every row of seq
+LAST_PK = 2 ** 63 - 1
+
+
+def next_sequence(user_id, using=DEFAULT_DB_ALIAS):
+    """
+    Reserve the user's next change number.
+
+    Call inside the transaction that makes the change: the UPDATE locks the
+    user's row until commit, so concurrent writers get numbers in commit order.
+    Live event streams of the user are woken once the change commits.
+    """
+    if user_id is None:
+        return 0
+    transaction.on_commit(lambda: events.publish(user_id), using=using)
+    states = TaskSyncState.objects.using(using).filter(user_id=user_id)
+    if not states.update(change_seq=F('change_seq') + 1):
+        try:
+            with transaction.atomic(using=using):
+                TaskSyncState.objects.using(using).create(user_id=user_id, change_seq=1)
+            return 1
+        except IntegrityError:
+            # Another writer created the row first
+            states.update(change_seq=F('change_seq') + 1)
+    return states.values_list('change_seq', flat=True).get()
+
+
+def record_tombstones(user_id, task_ids, seq=None, using=DEFAULT_DB_ALIAS):
+    """Remember deleted tasks; all of them share one change number"""
+    if not task_ids:
+        return
+    if seq is None:
+        seq = next_sequence(user_id, using=using)
+    TaskTombstone.objects.using(using).bulk_create(
+        [TaskTombstone(user_id=user_id, task_id=pk, sync_seq=seq) for pk in task_ids]
+    )
+
+
+def latest_cursor(user):
+    """Cursor positioned after every change the user has made so far"""
+    seq = TaskSyncState.objects.filter(user=user).values_list('change_seq', flat=True).first() or 0
+    return encode_cursor((seq, LAST_PK))
+
+
+def encode_cursor(position):
+    seq, pk = position
+    payload = json.dumps({'q': seq, 'pk': pk}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(data['q']), int(data['pk'])
+    except Exception as exc:
+        raise InvalidCursor('Malformed sync cursor') from exc
+
+
+class ChangeSet:
+    """One page of the sync feed"""
+
+    def __init__(self, changed, deleted, cursor, has_more, reset):
+        self.changed = changed
+        self.deleted = deleted
+        self.cursor = cursor
+        self.has_more = has_more
+        self.reset = reset
+
+
+def changes_since(user, tasks, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Tasks from ``tasks`` (the user's queryset) and deletions after ``cursor``.
+
+    Both streams are ordered by (sync_seq, id) and merged, so a page can end
+    in the middle of a bulk write whose rows all share one sequence number.
+    Without a cursor, or with one older than the last compaction, the feed
+    starts over (``reset``) and skips tombstones: the client rebuilds from
+    the full list instead.
+    """
+    position = decode_cursor(cursor) if cursor else START
+    floor = TaskSyncState.objects.filter(user=user).values_list('floor_seq', flat=True).first() or 0
+    reset = cursor is None or (floor and position[0] <= floor)
+    if reset:
+        position = START
+
+    seq, pk = position
+    rows = [
+        ((task.sync_seq, task.pk), task)
+        for task in tasks.filter(Q(sync_seq__gt=seq) | Q(sync_seq=seq, pk__gt=pk)).order_by('sync_seq', 'pk')[:limit + 1]
+    ]
+    if not reset:
+        tombstones = (
+            TaskTombstone.objects.filter(user=user)
+            .filter(Q(sync_seq__gt=seq) | Q(sync_seq=seq, task_id__gt=pk))
+            .order_by('sync_seq', 'task_id')
+            .values_list('sync_seq', 'task_id')[:limit + 1]
+        )
+        rows.extend((key, None) for key in tombstones)
+    rows.sort(key=lambda row: row[0])
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        position = rows[-1][0]
+    return ChangeSet(
+        changed=[task for _, task in rows if task is not None],
+        deleted=[key[1] for key, task in rows if task is None],
+        cursor=encode_cursor(position),
+        has_more=has_more,
+        reset=bool(reset),
+    )
+
+
+def compact_tombstones(days=None):
+    """Delete tombstones older than the retention period; return how many went"""
+    if days is None:
+        days = getattr(settings, 'TASK_SYNC_TOMBSTONE_DAYS', 30)
+    stale = TaskTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+    with transaction.atomic():
+        for row in stale.values('user_id').annotate(last_seq=Max('sync_seq')).order_by():
+            TaskSyncState.objects.filter(user_id=row['user_id']).update(
+                floor_seq=Greatest(F('floor_seq'), row['last_seq'])
+            )
+        deleted, _ = stale.delete()
+    return deleted
@@ -0,0 +1,25 @@
+from .models import Tag
+
+
+def parse_tags(text):
+    """Normalize a comma-separated tag string into unique lower-case names, in order"""
+    names = []
+    for part in (text or '').split(','):
+        name = part.strip().lower()[:Tag._meta.get_field('name').max_length]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def get_or_create_tags(names):
+    """Tag rows for ``names`` in two queries, however many are new"""
+    if not names:
+        return []
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    return list(Tag.objects.filter(name__in=names))
+
+
+def sync_tags(task):
+    """Point task.tag_objects at the tags named in task.tags"""
+    task.tag_objects.set(get_or_create_tags(parse_tags(task.tags)))
+    task._synced_tags = task.tags
@@ -1,3 +1,1640 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import logging
+import os
+import tempfile
+import tracemalloc
+import warnings
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.templatetags.static import static
+from django.conf import settings
+from django.test import Client, LiveServerTestCase, TestCase as DjangoTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import auth, benchmark, counters, events, instrumentation, jobs, ratelimit, recurrence, reminders, transfer
+from .asgi import StaticFilesASGI
+from .importer import import_tasks
+from .bulk import apply_bulk_action
+from .events import LocalBroker
+from .forms import TaskForm
+from .models import (
+    Job, NotificationPreference, RateLimitBucket, Tag, Task, TaskCounter, TaskImport, TaskReminder, TaskTombstone,
+)
+from .pagination import KeysetPaginator, InvalidCursor
+from .search import search_tasks
+from .stats import task_stats
+from .tags import parse_tags
+
+
+# Keep the per-request log lines out of the test output
+logging.getLogger('base.requests').setLevel(logging.WARNING)
+
+
+class TestCase(DjangoTestCase):
+    """Clears cached fragments so primary keys reused across tests never hit them"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice', password='secret-pass-123')
+        today = date(2025, 1, 1)
+        for i in range(23):
+            Task.objects.create(
+                user=cls.user,
+                title=f'Task {i % 7}',
+                priority=['high', 'medium', 'low'][i % 3],
+                due_date=None if i % 4 == 0 else today + timedelta(days=i % 5),
+            )
+
+    def walk(self, sort, per_page=5):
+        qs = Task.objects.filter(user=self.user)
+        paginator = KeysetPaginator(qs, sort, per_page=per_page)
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def test_forward_walk_visits_every_task_once_in_order(self):
+        for sort in ['-created_at', 'created_at', 'due_date', '-due_date', 'priority', '-priority', 'title', '-title']:
+            with self.subTest(sort=sort):
+                _, pages = self.walk(sort)
+                ids = [task.pk for page in pages for task in page]
+                self.assertEqual(len(ids), 23)
+                self.assertEqual(len(set(ids)), 23)
+                field = sort.lstrip('-')
+                values = [getattr(task, field) for page in pages for task in page]
+                non_null = [v for v in values if v is not None]
+                self.assertEqual(non_null, sorted(non_null, reverse=sort.startswith('-')))
+                # NULL due dates always trail the dated tasks
+                self.assertEqual(values[len(non_null):], [None] * (len(values) - len(non_null)))
+
+    def test_previous_cursor_returns_the_same_pages(self):
+        for sort in ['due_date', '-due_date', '-created_at']:
+            with self.subTest(sort=sort):
+                paginator, pages = self.walk(sort)
+                for i in range(len(pages) - 1, 0, -1):
+                    previous = paginator.page(pages[i].previous_cursor)
+                    self.assertEqual([t.pk for t in previous], [t.pk for t in pages[i - 1]])
+                self.assertFalse(pages[0].has_previous)
+
+    def test_pages_never_use_offset(self):
+        paginator, pages = self.walk('-created_at')
+        with CaptureQueriesContext(connection) as ctx:
+            paginator.page(pages[-1].previous_cursor)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('OFFSET', ctx.captured_queries[0]['sql'])
+
+    def test_deep_pages_seek_the_sort_index(self):
+        # The seek must bound the sort column, or every page scans all earlier rows
+        for sort, column in [('-created_at', 'created_at'), ('created_at', 'created_at'), ('due_date', 'due_date'),
+                             ('-due_date', 'due_date'), ('title', 'title'), ('-priority', 'priority')]:
+            with self.subTest(sort=sort):
+                paginator, pages = self.walk(sort)
+                page = pages[1] if pages[1].next_cursor else pages[0]
+                value = getattr(page.object_list[-1], column)
+                if value is None:
+                    continue
+                querysets, _ = paginator._page_queries(page.next_cursor)
+                plan = querysets[0][:5].explain()
+                self.assertRegex(plan, rf'user_id=\? AND {column}[<>]')
+
+    def test_cursor_from_another_sort_is_rejected(self):
+        _, pages = self.walk('title')
+        paginator = KeysetPaginator(Task.objects.all(), 'due_date')
+        with self.assertRaises(InvalidCursor):
+            paginator.page(pages[0].next_cursor)
+        with self.assertRaises(InvalidCursor):
+            paginator.page('not-a-cursor')
+
+    def test_userpage_keeps_filters_in_page_links(self):
+        Task.objects.bulk_create(Task(user=self.user, title=f'Extra {i}', priority='high') for i in range(30))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('userpage'), {'priority': 'high', 'sort': 'title'})
+        page = response.context['page']
+        self.assertTrue(all(task.priority == 'high' for task in page))
+        self.assertContains(response, 'priority=high&amp;sort=title&amp;cursor=')
+        response = self.client.get(reverse('userpage'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+
+
+class TaskStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='bob', password='secret-pass-123')
+        other = User.objects.create_user(username='carol', password='secret-pass-123')
+        yesterday = date.today() - timedelta(days=1)
+        Task.objects.create(user=cls.user, title='Done', complete=True, status='completed', priority='high', categories='work')
+        Task.objects.create(user=cls.user, title='Late', due_date=yesterday, priority='high', categories='work')
+        Task.objects.create(user=cls.user, title='Late but done', due_date=yesterday, complete=True, priority='low')
+        Task.objects.create(user=cls.user, title='Started', status='in_progress', categories='health')
+        Task.objects.create(user=other, title='Not mine', priority='high')
+
+    def test_counters_come_from_one_query(self):
+        with self.assertNumQueries(1):
+            stats = task_stats(self.user)
+        self.assertEqual(stats['total_tasks'], 4)
+        self.assertEqual(stats['completed_tasks'], 2)
+        self.assertEqual(stats['pending_tasks'], 2)
+        self.assertEqual(stats['overdue_tasks'], 1)
+        self.assertEqual(stats['completion_rate'], 50.0)
+        self.assertEqual((stats['high_priority'], stats['medium_priority'], stats['low_priority']), (2, 1, 1))
+        self.assertEqual(stats['tasks_by_category'][0], {'categories': 'work', 'count': 2})
+        self.assertIn({'status': 'in_progress', 'count': 1}, stats['tasks_by_status'])
+
+    def test_empty_user(self):
+        stats = task_stats(User.objects.create_user(username='dave'))
+        self.assertEqual(stats['total_tasks'], 0)
+        self.assertEqual(stats['completion_rate'], 0)
+        self.assertEqual(stats['tasks_by_category'], [])
+
+    def test_views_issue_a_single_stats_query(self):
+        self.client.force_login(self.user)
+        for name in ['dashboard', 'userpage']:
+            with self.subTest(view=name), CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse(name))
+            counts = [q['sql'] for q in ctx.captured_queries if 'COUNT(' in q['sql']]
+            self.assertEqual(len(counts), 1)
+
+
+class TaskCounterTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='erin', password='secret-pass-123')
+
+    def assertNoDrift(self, user=None):
+        self.assertEqual(counters.drift((user or self.user).pk), {})
+
+    def test_create_edit_and_delete_keep_counters_exact(self):
+        task = Task.objects.create(user=self.user, title='Write report', due_date=date.today())
+        self.assertNoDrift()
+        task.priority = 'high'
+        task.categories = 'work'
+        task.save()
+        self.assertNoDrift()
+        reloaded = Task.objects.get(pk=task.pk)
+        reloaded.complete = True
+        reloaded.status = 'completed'
+        reloaded.save()
+        self.assertNoDrift()
+        counter = TaskCounter.objects.get(user=self.user)
+        self.assertEqual((counter.total, counter.completed, counter.overdue_eligible, counter.priority_high), (1, 1, 0, 1))
+        reloaded.delete()
+        self.assertNoDrift()
+        self.assertEqual(TaskCounter.objects.get(user=self.user).total, 0)
+
+    def test_toggle_complete_updates_counters(self):
+        task = Task.objects.create(user=self.user, title='Call mom', due_date=date.today())
+        self.client.force_login(self.user)
+        self.client.post(reverse('toggle_complete', args=[task.pk]))
+        self.assertNoDrift()
+        self.assertEqual(TaskCounter.objects.get(user=self.user).completed, 1)
+
+    def test_deferred_instance_and_reassignment(self):
+        other = User.objects.create_user(username='frank')
+        Task.objects.create(user=self.user, title='Move me')
+        task = Task.objects.only('title').get()
+        task.user = other
+        task.save()
+        self.assertNoDrift()
+        self.assertNoDrift(other)
+
+    def test_stats_do_not_scan_tasks(self):
+        Task.objects.create(user=self.user, title='One')
+        with CaptureQueriesContext(connection) as ctx:
+            stats = task_stats(self.user)
+        self.assertEqual(stats['total_tasks'], 1)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('base_taskcounter', ctx.captured_queries[0]['sql'])
+
+    def test_rebuild_command_reports_and_fixes_drift(self):
+        Task.objects.create(user=self.user, title='Counted')
+        TaskCounter.objects.filter(user=self.user).update(total=7)
+        out = StringIO()
+        with self.assertRaises(SystemExit):
+            call_command('rebuild_task_counters', '--check', stdout=out)
+        self.assertIn('total 7->1', out.getvalue())
+        call_command('rebuild_task_counters', stdout=StringIO())
+        self.assertNoDrift()
+
+
+class TaskSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='gina', password='secret-pass-123')
+        cls.report = Task.objects.create(user=cls.user, title='Quarterly report', description='Numbers for finance', tags='work')
+        cls.homework = Task.objects.create(user=cls.user, title='Maths homework', description='Chapter 4 report')
+        cls.groceries = Task.objects.create(user=cls.user, title='Groceries', description=None, tags='shopping, weekly')
+
+    def search(self, query, **kwargs):
+        return search_tasks(Task.objects.filter(user=self.user), query, **kwargs)
+
+    def test_word_and_prefix_matching(self):
+        self.assertEqual(set(self.search('report')), {self.report, self.homework})
+        self.assertEqual(list(self.search('quart')), [self.report])
+        self.assertEqual(list(self.search('weekly groc')), [self.groceries])
+        self.assertEqual(list(self.search('"); DROP')), [])
+
+    def test_ranked_results_prefer_title_hits(self):
+        results = list(self.search('report', ranked=True).order_by('-search_rank'))
+        self.assertEqual(results, [self.report, self.homework])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.groceries.title = 'Pharmacy run'
+        self.groceries.save()
+        self.assertEqual(list(self.search('pharmacy')), [self.groceries])
+        self.assertEqual(list(self.search('groceries')), [])
+        self.groceries.delete()
+        self.assertEqual(list(self.search('pharmacy')), [])
+
+    def test_relevance_pages_cover_all_matches(self):
+        Task.objects.bulk_create(
+            Task(user=self.user, title=f'Report {i}', description='report ' * (i % 4)) for i in range(20)
+        )
+        paginator = KeysetPaginator(self.search('report', ranked=True), 'relevance', per_page=6)
+        self.assertEqual(paginator.sort, 'relevance')
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        ranks = [task.search_rank for page in pages for task in page]
+        self.assertEqual(len(ranks), 22)
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        previous = paginator.page(pages[2].previous_cursor)
+        self.assertEqual([t.pk for t in previous], [t.pk for t in pages[1]])
+
+    def test_userpage_and_admin_use_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('userpage'), {'search': 'report'})
+        self.assertEqual(response.context['sort_by'], 'relevance')
+        self.assertEqual([t.pk for t in response.context['tasks']], [self.report.pk, self.homework.pk])
+
+        admin = User.objects.create_superuser(username='root', password='secret-pass-123')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:base_task_changelist'), {'q': 'homew'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.homework])
+
+
+class TagTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='hank', password='secret-pass-123')
+
+    def test_parse_tags_normalizes(self):
+        self.assertEqual(parse_tags(' Work, urgent,,work , Meeting '), ['work', 'urgent', 'meeting'])
+        self.assertEqual(parse_tags(''), [])
+
+    def test_tags_follow_the_text_field(self):
+        task = Task.objects.create(user=self.user, title='Plan', tags='Work, urgent')
+        self.assertEqual(sorted(task.tag_objects.values_list('name', flat=True)), ['urgent', 'work'])
+        task.tags = 'urgent'
+        task.save()
+        self.assertEqual(list(task.tag_objects.values_list('name', flat=True)), ['urgent'])
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_tag_filter_is_exact(self):
+        work = Task.objects.create(user=self.user, title='Standup', tags='work')
+        Task.objects.create(user=self.user, title='Essay', tags='homework')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('userpage'), {'tag': 'Work'})
+        self.assertEqual([t.pk for t in response.context['tasks']], [work.pk])
+
+    def test_tag_chips_cost_one_query_per_page(self):
+        for i in range(10):
+            Task.objects.create(user=self.user, title=f'Task {i}', tags=f'tag{i}, shared')
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('userpage'))
+        self.assertContains(response, '?tag=shared', count=10)
+        tag_queries = [q for q in ctx.captured_queries if 'base_tag' in q['sql']]
+        self.assertEqual(len(tag_queries), 1)
+
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ivy', password='secret-pass-123')
+        self.task = Task.objects.create(user=self.user, title='Original title')
+        self.client.force_login(self.user)
+
+    def task_queries(self, name, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(name), params or {})
+        # Only the conditional GET validator (a counter row plus an indexed
+        # Max(updated_at)) may touch the tables; nothing else should.
+        return response, [q['sql'] for q in ctx.captured_queries if 'base_task' in q['sql'] and 'base_taskcounter' not in q['sql']]
+
+    def test_unchanged_pages_skip_the_task_table(self):
+        for name in ['userpage', 'dashboard']:
+            with self.subTest(view=name):
+                _, queries = self.task_queries(name)
+                self.assertTrue(queries)
+                response, queries = self.task_queries(name)
+                self.assertEqual(queries, [])
+                self.assertContains(response, 'Original title')
+
+    def test_task_writes_invalidate_fragments(self):
+        self.task_queries('userpage')
+        self.task.title = 'Renamed title'
+        self.task.save()
+        response, queries = self.task_queries('userpage')
+        self.assertTrue(queries)
+        self.assertContains(response, 'Renamed title')
+        self.client.post(reverse('toggle_complete', args=[self.task.pk]))
+        response, _ = self.task_queries('userpage')
+        self.assertContains(response, 'completed-task')
+
+    def test_filters_get_their_own_fragments(self):
+        self.task_queries('userpage')
+        response, queries = self.task_queries('userpage', {'status': 'completed'})
+        self.assertTrue(queries)
+        self.assertNotContains(response, 'Original title')
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='jack', password='secret-pass-123')
+        self.task = Task.objects.create(user=self.user, title='Cached task')
+        self.client.force_login(self.user)
+
+    def revalidate(self, url, response):
+        headers = {'If-None-Match': response['ETag']}
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get(url, headers=headers)
+        return again, ctx.captured_queries
+
+    def test_unchanged_views_return_304_without_rendering(self):
+        for url in [reverse('userpage'), reverse('dashboard'), reverse('task_details', args=[self.task.pk])]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Last-Modified', response)
+                self.assertIn('private', response['Cache-Control'])
+                again, queries = self.revalidate(url, response)
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again.content, b'')
+                self.assertEqual(again.templates, [])
+                task_queries = [q for q in queries if 'base_task' in q['sql']]
+                self.assertEqual(len(task_queries), 1)
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('userpage'))
+        again = self.client.get(reverse('userpage'), headers={'If-Modified-Since': response['Last-Modified']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_edits_and_deletes_change_the_validators(self):
+        url = reverse('userpage')
+        response = self.client.get(url)
+        self.task.title = 'Edited task'
+        self.task.save()
+        again, _ = self.revalidate(url, response)
+        self.assertEqual(again.status_code, 200)
+
+        other = Task.objects.create(user=self.user, title='Second task')
+        Task.objects.filter(pk=other.pk).update(updated_at=self.task.updated_at.replace(year=2000))
+        response = self.client.get(url)
+        Task.objects.get(pk=other.pk).delete()
+        again, _ = self.revalidate(url, response)
+        self.assertEqual(again.status_code, 200)
+
+
+class BulkTaskTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='kate', password='secret-pass-123')
+        self.other = User.objects.create_user(username='liam', password='secret-pass-123')
+        self.tasks = [
+            Task.objects.create(user=self.user, title=f'Task {i}', due_date=date.today(), tags='home' if i % 2 else '')
+            for i in range(6)
+        ]
+        self.foreign = Task.objects.create(user=self.other, title='Not yours')
+        self.client.force_login(self.user)
+
+    def bulk(self, action, ids=None, value=None):
+        ids = [t.pk for t in self.tasks] + [self.foreign.pk] if ids is None else ids
+        return self.client.post(
+            reverse('bulk_tasks'),
+            data=json.dumps({'ids': ids, 'action': action, 'value': value}),
+            content_type='application/json',
+        )
+
+    def assertConsistent(self):
+        self.assertEqual(counters.drift(self.user.pk), {})
+        self.assertEqual(counters.drift(self.other.pk), {})
+
+    def test_updates_are_set_based_and_scoped_to_the_user(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.bulk('complete')
+        self.assertEqual(response.json(), {'success': True, 'affected': 6})
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "base_task"')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(Task.objects.get(pk=self.foreign.pk).complete)
+        self.assertEqual(Task.objects.filter(user=self.user, status='completed').count(), 6)
+        self.assertConsistent()
+
+    def test_set_fields_and_delete(self):
+        self.assertEqual(self.bulk('set_priority', value='high').json()['affected'], 6)
+        self.assertEqual(self.bulk('set_category', value='work').json()['affected'], 6)
+        self.assertEqual(self.bulk('set_status', value='completed').json()['affected'], 6)
+        self.assertEqual(Task.objects.filter(user=self.user, complete=True).count(), 6)
+        self.assertConsistent()
+        self.assertEqual(self.bulk('set_status', value='in_progress').json()['affected'], 6)
+        self.assertFalse(Task.objects.filter(user=self.user, complete=True).exists())
+        self.assertConsistent()
+        response = self.bulk('delete', ids=[t.pk for t in self.tasks[:4]] + [self.foreign.pk])
+        self.assertEqual(response.json()['affected'], 4)
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Task.objects.filter(pk=self.foreign.pk).exists())
+        self.assertConsistent()
+
+    def test_add_and_remove_tag(self):
+        self.assertEqual(self.bulk('add_tag', value='Errand').json()['affected'], 6)
+        self.assertEqual(Task.objects.filter(user=self.user, tag_objects__name='errand').count(), 6)
+        self.assertEqual(Task.objects.get(pk=self.tasks[1].pk).tags, 'home, errand')
+        self.assertEqual(self.bulk('remove_tag', value='home').json()['affected'], 3)
+        self.assertFalse(Task.objects.filter(tag_objects__name='home').exists())
+        self.assertEqual(Task.objects.get(pk=self.tasks[1].pk).tags, 'errand')
+
+    def test_add_tag_that_does_not_fit_is_refused(self):
+        max_length = Task._meta.get_field('tags').max_length
+        Task.objects.filter(pk=self.tasks[0].pk).update(tags='x' * (max_length - 3))
+        response = self.bulk('add_tag', value='errand')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('does not fit on 1 of the selected tasks', response.json()['error'])
+        self.assertFalse(Task.objects.filter(tags__contains='errand').exists())
+
+    def test_bulk_changes_invalidate_cached_pages(self):
+        self.client.get(reverse('userpage'))
+        self.bulk('set_priority', value='low')
+        response = self.client.get(reverse('userpage'))
+        self.assertContains(response, 'badge-low', count=6)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.bulk('explode').status_code, 400)
+        self.assertEqual(self.bulk('set_priority', value='urgent').status_code, 400)
+        self.assertEqual(self.bulk('complete', ids=[]).status_code, 400)
+        self.assertEqual(self.bulk('complete', ids=['x']).status_code, 400)
+        self.assertEqual(self.bulk('add_tag', value='a, b').status_code, 400)
+        self.assertEqual(self.client.get(reverse('bulk_tasks')).status_code, 400)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='mia', password='secret-pass-123')
+        self.client.force_login(self.user)
+
+    def seed(self, count, **fields):
+        Task.objects.bulk_create(
+            Task(user=self.user, title=f'Task {i}', description='x' * 300, **fields) for i in range(count)
+        )
+
+    def test_csv_export_applies_userpage_filters(self):
+        self.seed(3, priority='high')
+        self.seed(2, priority='low')
+        Task.objects.create(user=User.objects.create_user(username='nora'), title='Foreign', priority='high')
+        response = self.client.get(reverse('export_tasks'), {'format': 'csv', 'priority': 'high'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['priority'] for row in rows}, {'high'})
+
+    def test_ndjson_export(self):
+        self.seed(2, due_date=date(2025, 3, 1))
+        response = self.client.get(reverse('export_tasks'), {'format': 'ndjson'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['due_date'] for line in lines], ['2025-03-01'] * 2)
+        self.assertEqual(self.client.get(reverse('export_tasks'), {'format': 'xml'}).status_code, 400)
+
+    async def test_asgi_export_streams_an_async_iterator(self):
+        await sync_to_async(self.seed)(3)
+        await self.async_client.aforce_login(self.user)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            response = await self.async_client.get(reverse('export_tasks'), {'format': 'ndjson'})
+            self.assertTrue(response.is_async)
+            lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def stream_peak(self):
+        response = self.client.get(reverse('export_tasks'), {'format': 'ndjson'})
+        tracemalloc.start()
+        try:
+            total = sum(len(chunk) for chunk in response.streaming_content)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return total, peak
+
+    def test_streaming_keeps_peak_memory_bounded(self):
+        self.seed(4000)
+        small_total, small_peak = self.stream_peak()
+        self.seed(16000)
+        total, peak = self.stream_peak()
+        # Five times the rows, yet peak memory is set by the chunk size
+        self.assertEqual(total // small_total, 5)
+        self.assertLess(peak, small_peak * 1.5)
+        self.assertLess(peak, total / 2)
+
+    def test_management_command(self):
+        self.seed(2, categories='work')
+        self.seed(1, categories='health')
+        out = StringIO()
+        call_command('export_tasks', 'mia', '--format', 'csv', '--category', 'work', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class ImportTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='olga', password='secret-pass-123')
+        self.client.force_login(self.user)
+
+    def csv_text(self, count, start=0):
+        lines = ['title,priority,status,complete,tags']
+        lines += [f'Imported {i},high,completed,true,"home, urgent"' for i in range(start, start + count)]
+        return '\n'.join(lines) + '\n'
+
+    def test_csv_upload_imports_tasks_with_counters_and_tags(self):
+        upload = SimpleUploadedFile('tasks.csv', self.csv_text(5).encode())
+        response = self.client.post(reverse('import_tasks'), {'file': upload})
+        self.assertEqual(response.json()['imported'], 5)
+        self.assertEqual(Task.objects.filter(user=self.user, complete=True, priority='high').count(), 5)
+        self.assertEqual(Tag.objects.get(name='urgent').tasks.count(), 5)
+        self.assertEqual(counters.drift(self.user.pk), {})
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        lines = [
+            json.dumps({'title': 'Valid task', 'due_date': '2025-01-02'}),
+            json.dumps({'title': 'ab'}),
+            'not json',
+            json.dumps({'title': 'Bad priority', 'priority': 'huge'}),
+        ]
+        upload = SimpleUploadedFile('tasks.ndjson', '\n'.join(lines).encode())
+        data = self.client.post(reverse('import_tasks'), {'file': upload}).json()
+        self.assertEqual((data['imported'], data['failed']), (1, 3))
+        self.assertEqual([error['record'] for error in data['errors']], [2, 3, 4])
+        self.assertIn('at least 3 characters', data['errors'][0]['errors']['title'][0])
+        self.assertEqual(Task.objects.get(user=self.user).due_date, date(2025, 1, 2))
+
+    def test_failed_import_resumes_after_last_committed_batch(self):
+        def failing_stream():
+            for number, line in enumerate(StringIO(self.csv_text(10))):
+                if number == 8:
+                    raise OSError('connection lost')
+                yield line
+
+        with self.assertRaises(OSError):
+            import_tasks(self.user, failing_stream(), 'tasks.csv', 'csv', batch_size=3)
+        job = TaskImport.objects.get()
+        self.assertEqual((job.status, job.committed_records, job.imported), ('failed', 6, 6))
+
+        import_tasks(self.user, StringIO(self.csv_text(10)), 'tasks.csv', 'csv', batch_size=3, job=job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.imported), ('completed', 10))
+        titles = Task.objects.filter(user=self.user).values_list('title', flat=True)
+        self.assertEqual(sorted(titles), sorted(f'Imported {i}' for i in range(10)))
+        self.assertEqual(counters.drift(self.user.pk), {})
+
+    def test_resume_of_unknown_import_is_a_bad_request(self):
+        for resume in ('abc', '999'):
+            upload = SimpleUploadedFile('tasks.csv', self.csv_text(1).encode())
+            response = self.client.post(reverse('import_tasks'), {'file': upload, 'resume': resume})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], 'No unfinished import to resume.')
+
+    def test_malformed_csv_is_a_bad_request(self):
+        oversized = 'title,description\nBig,' + 'x' * (csv.field_size_limit() + 1) + '\n'
+        upload = SimpleUploadedFile('tasks.csv', oversized.encode())
+        response = self.client.post(reverse('import_tasks'), {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not valid CSV (line 2)', response.json()['error'])
+        self.assertEqual(TaskImport.objects.get().status, 'failed')
+
+    def test_nul_bytes_fail_their_row(self):
+        upload = SimpleUploadedFile('tasks.csv', b'title,priority\nBad\x00title,low\nGood,low\n')
+        data = self.client.post(reverse('import_tasks'), {'file': upload}).json()
+        self.assertEqual((data['imported'], data['failed']), (1, 1))
+        self.assertEqual(data['errors'][0]['errors'], {'__all__': ['Contains a NUL character.']})
+        self.assertEqual(list(Task.objects.values_list('title', flat=True)), ['Good'])
+
+    def test_management_command_reports_throughput(self):
+        path = self.enterContext(tempfile.TemporaryDirectory()) + '/tasks.csv'
+        with open(path, 'w') as fh:
+            fh.write(self.csv_text(4))
+        out = StringIO()
+        call_command('import_tasks', 'olga', path, stdout=out)
+        self.assertIn('4 imported, 0 failed', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+
+class TaskApiTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='pia', password='secret-pass-123')
+        self.client.force_login(self.user)
+        self.url = reverse('api-task-list')
+
+    def seed(self, count, **fields):
+        Task.objects.bulk_create(
+            Task(user=self.user, title=f'Task {i:03}', description='notes', **fields) for i in range(count)
+        )
+        counters.rebuild(self.user.pk)
+
+    def test_list_pages_with_cursors_and_constant_queries(self):
+        self.seed(5, priority='high')
+        self.seed(30, priority='low')
+        Task.objects.create(user=User.objects.create_user(username='quinn'), title='Foreign')
+        # The page plus loading the user; later requests find the user cached
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url, {'priority': 'low', 'sort': 'title', 'page_size': 20}).json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(data['results'][0]['title'], 'Task 000')
+        with self.assertNumQueries(1):
+            data = self.client.get(data['next']).json()
+        self.assertEqual([row['title'] for row in data['results']], [f'Task {i:03}' for i in range(20, 30)])
+        self.assertIsNone(data['next'])
+        self.assertEqual(self.client.get(self.url, {'cursor': 'junk'}).status_code, 404)
+
+    def test_sparse_fields_load_only_needed_columns(self):
+        self.seed(3, due_date=date(2020, 1, 1))
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(self.url, {'fields': 'title,is_overdue', 'sort': 'due_date'}).json()
+        self.assertEqual(set(data['results'][0]), {'title', 'is_overdue'})
+        self.assertTrue(data['results'][0]['is_overdue'])
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('"due_date"', sql)
+        self.assertNotIn('"description"', sql)
+        self.assertEqual(len(ctx), 2)
+        self.assertEqual(self.client.get(self.url, {'fields': 'title,secret'}).status_code, 400)
+
+    def test_search_filter_and_relevance_sort(self):
+        Task.objects.create(user=self.user, title='Buy milk')
+        Task.objects.create(user=self.user, title='Walk dog', description='then buy treats')
+        data = self.client.get(self.url, {'search': 'buy', 'fields': 'title'}).json()
+        self.assertEqual(data['sort'], 'relevance')
+        self.assertEqual([row['title'] for row in data['results']], ['Buy milk', 'Walk dog'])
+
+    def test_retrieve_update_and_delete(self):
+        task = Task.objects.create(user=self.user, title='Original', tags='a')
+        detail = reverse('api-task-detail', args=[task.pk])
+        with self.assertNumQueries(2):
+            data = self.client.get(detail, {'fields': 'title'}).json()
+        self.assertEqual(data, {'title': 'Original'})
+
+        response = self.client.patch(detail, {'priority': 'high', 'tags': 'a, b'}, content_type='application/json')
+        self.assertEqual(response.json()['priority'], 'high')
+        self.assertEqual(sorted(task.tag_objects.values_list('name', flat=True)), ['a', 'b'])
+        self.assertEqual(self.client.patch(detail, {'title': 'no'}, content_type='application/json').status_code, 400)
+
+        self.assertEqual(self.client.delete(detail).status_code, 204)
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+        self.assertEqual(counters.drift(self.user.pk), {})
+
+    def test_create_and_isolation(self):
+        response = self.client.post(self.url, {'title': 'From the API', 'categories': 'work'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Task.objects.get(pk=response.json()['id']).user, self.user)
+        self.assertEqual(TaskCounter.objects.get(user=self.user).category_work, 1)
+
+        foreign = Task.objects.create(user=User.objects.create_user(username='quinn'), title='Foreign')
+        self.assertEqual(self.client.get(reverse('api-task-detail', args=[foreign.pk])).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class DeltaSyncTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='rosa', password='secret-pass-123')
+        self.client.force_login(self.user)
+        self.url = reverse('api-task-changes')
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(self.url, params).json()
+
+    def test_feed_returns_only_changes_since_cursor(self):
+        first = Task.objects.create(user=self.user, title='First')
+        second = Task.objects.create(user=self.user, title='Second')
+        data = self.sync()
+        self.assertTrue(data['reset'])
+        self.assertEqual([row['id'] for row in data['changed']], [first.pk, second.pk])
+
+        first.title = 'First, edited'
+        first.save()
+        self.client.post(reverse('delete_task', args=[second.pk]))
+        with self.assertNumQueries(3):
+            changes = self.sync(data['cursor'], fields='title')
+        self.assertEqual(changes['changed'], [{'title': 'First, edited'}])
+        self.assertEqual(changes['deleted'], [second.pk])
+        self.assertFalse(changes['reset'])
+        self.assertEqual(self.sync(changes['cursor']), {
+            'changed': [], 'deleted': [], 'cursor': changes['cursor'], 'has_more': False, 'reset': False,
+        })
+
+    def test_bulk_writes_page_through_shared_sequence(self):
+        Task.objects.bulk_create(Task(user=self.user, title=f'Task {i}') for i in range(7))
+        cursor = self.sync()['cursor']
+        ids = list(Task.objects.filter(user=self.user).values_list('pk', flat=True))
+        apply_bulk_action(self.user, ids[:5], 'complete')
+        apply_bulk_action(self.user, ids[5:], 'delete')
+
+        seen, deleted, has_more = [], [], True
+        while has_more:
+            page = self.sync(cursor, limit=3)
+            seen += [row['id'] for row in page['changed']]
+            deleted += page['deleted']
+            cursor, has_more = page['cursor'], page['has_more']
+        self.assertEqual(sorted(seen), sorted(ids[:5]))
+        self.assertEqual(sorted(deleted), sorted(ids[5:]))
+
+    def test_compaction_forces_reset_for_old_cursors(self):
+        task = Task.objects.create(user=self.user, title='Doomed')
+        cursor = self.sync()['cursor']
+        task.delete()
+        TaskTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+        Task.objects.create(user=self.user, title='Survivor')
+
+        out = StringIO()
+        call_command('compact_task_tombstones', stdout=out)
+        self.assertIn('Deleted 1 tombstones', out.getvalue())
+        data = self.sync(cursor)
+        self.assertTrue(data['reset'])
+        self.assertEqual([row['title'] for row in data['changed']], ['Survivor'])
+        self.assertEqual(self.client.get(self.url, {'cursor': '!!'}).status_code, 400)
+
+    def test_deleting_user_leaves_no_tombstones(self):
+        Task.objects.create(user=self.user, title='Owned')
+        self.user.delete()
+        self.assertFalse(TaskTombstone.objects.exists())
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='sara', password='secret-pass-123')
+        self.task = Task.objects.create(user=self.user, title='Async task', due_date=date(2020, 1, 1))
+
+    async def test_read_views_under_async_client(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('userpage'))
+        self.assertContains(response, 'Async task')
+        self.assertContains(response, 'Overdue')
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['body_html'].count('Async task'), 1)
+        response = await self.async_client.get(reverse('task_details', args=[self.task.pk]))
+        self.assertContains(response, 'Async task')
+
+        etag = (await self.async_client.get(reverse('userpage')))['ETag']
+        response = await self.async_client.get(reverse('userpage'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_toggle_complete_under_async_client(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(reverse('toggle_complete', args=[self.task.pk]))
+        self.assertEqual(response.json(), {'success': True, 'complete': True, 'status': 'Completed'})
+        counter = await TaskCounter.objects.aget(user=self.user)
+        self.assertEqual(counter.completed, 1)
+
+    async def test_anonymous_request_redirects(self):
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='uma', password='secret-pass-123')
+        self.client.force_login(self.user)
+        self.files = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(TASK_JOB_FILES_DIR=self.files))
+        self.calls = 0
+
+    def register(self, name, func, **options):
+        jobs.register(name, **options)(func)
+        self.addCleanup(jobs.REGISTRY.pop, name)
+
+    def test_large_export_runs_in_the_worker(self):
+        Task.objects.bulk_create(Task(user=self.user, title=f'Task {i}', priority='high') for i in range(3))
+        counters.rebuild(self.user.pk)
+        with self.settings(TASK_EXPORT_INLINE_LIMIT=2):
+            response = self.client.get(reverse('export_tasks'), {'format': 'csv', 'priority': 'high'})
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job_status', args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).json()['status'], 'queued')
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+        data = self.client.get(reverse('job_status', args=[job.pk])).json()
+        self.assertEqual(data['status'], 'succeeded')
+        response = self.client.get(data['download_url'])
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 4)
+        self.assertIn('attachment', response['Content-Disposition'])
+
+        page = self.client.get(reverse('job_status', args=[job.pk]), headers={'accept': 'text/html'})
+        self.assertContains(page, 'Download')
+        self.client.force_login(User.objects.create_user(username='vic'))
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).status_code, 404)
+
+    def test_large_import_is_queued(self):
+        lines = ['title,priority'] + [f'Queued {i},low' for i in range(5)]
+        upload = SimpleUploadedFile('tasks.csv', '\n'.join(lines).encode())
+        with self.settings(TASK_IMPORT_INLINE_BYTES=10):
+            response = self.client.post(reverse('import_tasks'), {'file': upload})
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Task.objects.exists())
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+        data = self.client.get(response.json()['status_url']).json()
+        self.assertEqual((data['status'], data['result']['imported']), ('succeeded', 5))
+        self.assertEqual(counters.drift(self.user.pk), {})
+
+    def test_unreadable_import_fails_without_retrying(self):
+        oversized = 'title,description\nBig,' + 'x' * (csv.field_size_limit() + 1) + '\n'
+        upload = SimpleUploadedFile('tasks.csv', oversized.encode())
+        with self.settings(TASK_IMPORT_INLINE_BYTES=10):
+            response = self.client.post(reverse('import_tasks'), {'file': upload})
+        self.assertEqual(response.status_code, 202)
+
+        call_command('run_jobs', '--once', stdout=StringIO())
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.assertIn('not valid CSV', job.error)
+        self.assertEqual(TaskImport.objects.get().status, 'failed')
+        self.assertFalse((jobs.files_dir() / job.payload['file']).exists())
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        def flaky(job):
+            self.calls += 1
+            raise RuntimeError('boom')
+
+        self.register('test_flaky', flaky, max_attempts=2, backoff=10)
+        job = jobs.enqueue('test_flaky', self.user)
+        job = jobs.run(jobs.claim('w1'))
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: boom', job.error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=8))
+        self.assertIsNone(jobs.claim('w1'))
+
+        Job.objects.update(run_at=timezone.now())
+        job = jobs.run(jobs.claim('w1'))
+        self.assertEqual((job.status, job.attempts, self.calls), ('failed', 2, 2))
+
+    def test_concurrency_limit_and_stale_locks(self):
+        self.register('test_single', lambda job: {'ok': True}, concurrency=1)
+        first, second = jobs.enqueue('test_single'), jobs.enqueue('test_single')
+        self.assertEqual(jobs.claim('w1').pk, first.pk)
+        self.assertIsNone(jobs.claim('w2'))
+
+        Job.objects.filter(pk=first.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(600), 1)
+        claimed = jobs.claim('w2')
+        self.assertEqual((claimed.pk, claimed.attempts), (first.pk, 2))
+        self.assertEqual(jobs.run(claimed).result, {'ok': True})
+        self.assertEqual(jobs.claim('w2').pk, second.pk)
+
+    def test_heartbeat_keeps_long_jobs_from_being_requeued(self):
+        def slow(job):
+            # Simulate a run longer than the stale timeout that beats as it goes
+            Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+            job.locked_at -= timedelta(hours=1)
+            jobs.heartbeat(job)
+            self.assertEqual(jobs.requeue_stale(600), 0)
+            return {'ok': True}
+
+        self.register('test_slow', slow)
+        jobs.enqueue('test_slow')
+        self.assertEqual(jobs.run(jobs.claim('w1')).status, 'succeeded')
+
+    def test_job_taken_from_its_worker_keeps_the_new_state(self):
+        def hung(job):
+            Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+            job.locked_at -= timedelta(hours=1)
+            jobs.requeue_stale(600)
+            jobs.heartbeat(job)
+
+        self.register('test_hung', hung)
+        jobs.enqueue('test_hung')
+        job = jobs.run(jobs.claim('w1'))
+        self.assertEqual((job.status, job.locked_by, job.result), ('queued', '', None))
+
+    def test_stale_job_out_of_attempts_fails(self):
+        self.register('test_once', lambda job: None, max_attempts=1)
+        job = jobs.enqueue('test_once')
+        jobs.claim('w1')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(600), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', 'The worker stopped responding.'))
+        self.assertIsNone(jobs.claim('w2'))
+
+
+class ListBackend:
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, notifications):
+        self.sent.extend(notifications)
+
+
+class ReminderTests(TestCase):
+    # 00:30 on June 11 in Nairobi, still June 10 in New York
+    now = datetime(2025, 6, 10, 21, 30, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='wes', email='wes@example.com')
+        self.backend = ListBackend()
+
+    def send(self, **options):
+        return reminders.send_reminders(now=self.now, backend=self.backend, **options)
+
+    def sent(self):
+        return sorted((n['title'], n['kind']) for n in self.backend.sent)
+
+    def test_windows_and_dedupe(self):
+        for title, due in [('Today', '2025-06-11'), ('Tomorrow', '2025-06-12'), ('Later', '2025-06-13'),
+                           ('Late', '2025-06-08'), ('Ancient', '2025-05-01'), ('None', None)]:
+            Task.objects.create(user=self.user, title=title, due_date=due)
+        Task.objects.create(user=self.user, title='Done', due_date='2025-06-11', complete=True)
+
+        self.assertEqual(self.send(), {'due_soon': 2, 'overdue': 1})
+        self.assertEqual(self.sent(), [('Late', 'overdue'), ('Today', 'due_soon'), ('Tomorrow', 'due_soon')])
+        self.assertEqual(self.send(), {'due_soon': 0, 'overdue': 0})
+        self.assertEqual(TaskReminder.objects.count(), 3)
+
+        # Moving the due date is a new deadline, so it is reminded again
+        Task.objects.filter(title='Late').update(due_date='2025-06-12')
+        self.assertEqual(self.send(), {'due_soon': 1, 'overdue': 0})
+
+    def test_dry_run_records_nothing(self):
+        Task.objects.create(user=self.user, title='Today', due_date='2025-06-11')
+        self.assertEqual(self.send(dry_run=True), {'due_soon': 1, 'overdue': 0})
+        self.assertEqual((self.backend.sent, TaskReminder.objects.count()), ([], 0))
+
+    def test_user_time_zone_and_opt_out(self):
+        other = User.objects.create_user(username='xia')
+        NotificationPreference.objects.create(user=other, timezone='America/New_York')
+        quiet = User.objects.create_user(username='yan')
+        NotificationPreference.objects.create(user=quiet, reminders_enabled=False)
+        for user in (self.user, other, quiet):
+            Task.objects.create(user=user, title=user.username, due_date='2025-06-10')
+
+        self.send()
+        self.assertEqual(self.sent(), [('wes', 'overdue'), ('xia', 'due_soon')])
+
+    def test_unknown_time_zone_falls_back_to_the_default(self):
+        other = User.objects.create_user(username='xia')
+        preference = NotificationPreference.objects.create(user=other, timezone='Mars/Olympus_Mons')
+        Task.objects.create(user=other, title='xia', due_date='2025-06-10')
+        with self.assertLogs('base.reminders', 'WARNING'):
+            self.send()
+        self.assertEqual(self.sent(), [('xia', 'overdue')])
+
+        with self.assertRaises(ValidationError):
+            preference.full_clean()
+        preference.timezone = 'America/New_York'
+        preference.full_clean()
+
+    def test_batches_are_keyset_queries_on_the_open_task_index(self):
+        Task.objects.bulk_create(Task(user=self.user, title=f'T{i}', due_date='2025-06-11') for i in range(5))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.send(batch_size=2)['due_soon'], 5)
+        selects = [q['sql'] for q in queries if 'FROM "base_task"' in q['sql']]
+        self.assertTrue(all('LIMIT 2' in sql for sql in selects))
+        plan = reminders.pending('due_soon', date(2025, 6, 11), date(2025, 6, 12), Q()).explain()
+        self.assertIn('task_open_due_date_idx', plan)
+
+    def test_file_backend_and_command(self):
+        Task.objects.create(user=self.user, title='Today', due_date=timezone.localdate())
+        path = self.enterContext(tempfile.TemporaryDirectory()) + '/reminders.ndjson'
+        with self.settings(TASK_NOTIFICATION_BACKEND='base.notifications.FileBackend', TASK_NOTIFICATION_FILE=path):
+            out = StringIO()
+            call_command('send_reminders', stdout=out)
+        self.assertIn('Sent reminders: 1 due_soon, 0 overdue', out.getvalue())
+        with open(path) as fh:
+            line = json.loads(fh.read())
+        self.assertEqual((line['username'], line['kind']), ('wes', 'due_soon'))
+        self.assertIn('"Today" is due on', line['message'])
+
+
+class RecurrenceTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='zed', password='secret-pass-123')
+        self.client.force_login(self.user)
+        self.today = timezone.localdate()
+
+    def series(self, rule, start, **fields):
+        return Task.objects.create(user=self.user, title='Water plants', recurrence=rule, due_date=start, **fields)
+
+    def between(self, rule, start, first, last):
+        return list(recurrence.Rule.parse(rule).between(start, first, last))
+
+    def test_rule_expansion(self):
+        # Mon Jan 6 2025; every other week on Monday and Thursday
+        self.assertEqual(
+            self.between('FREQ=WEEKLY;INTERVAL=2;BYDAY=TH,MO', date(2025, 1, 6), date(2025, 1, 8), date(2025, 1, 24)),
+            [date(2025, 1, 9), date(2025, 1, 20), date(2025, 1, 23)],
+        )
+        # Months without a 31st are skipped
+        self.assertEqual(
+            self.between('monthly', date(2025, 1, 31), date(2025, 1, 1), date(2025, 5, 31)),
+            [date(2025, 1, 31), date(2025, 3, 31), date(2025, 5, 31)],
+        )
+        # A series started years ago jumps straight to the window
+        self.assertEqual(
+            self.between('FREQ=DAILY;INTERVAL=3', date(2015, 1, 1), date(2025, 1, 1), date(2025, 1, 7)),
+            [date(2025, 1, 2), date(2025, 1, 5)],
+        )
+        self.assertEqual(self.between('FREQ=DAILY;COUNT=3', date(2025, 1, 1), date(2025, 1, 1), date(2025, 2, 1))[-1], date(2025, 1, 3))
+        self.assertEqual(recurrence.normalize('weekdays'), 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR')
+        for bad in ['FREQ=YEARLY', 'FREQ=DAILY;BYDAY=MO', 'FREQ=WEEKLY;BYDAY=XX', 'FREQ=DAILY;COUNT=2;UNTIL=20250101']:
+            with self.assertRaises(recurrence.InvalidRule):
+                recurrence.Rule.parse(bad)
+
+    def test_form_needs_a_due_date(self):
+        form = TaskForm(data={'title': 'Gym', 'status': 'todo', 'priority': 'low', 'categories': 'health', 'recurrence': 'daily'})
+        self.assertIn('due_date', form.errors)
+        form = TaskForm(data={'title': 'Gym', 'status': 'todo', 'priority': 'low', 'categories': 'health', 'recurrence': 'FREQ=MONTHLY;BYDAY=MO', 'due_date': '2025-01-01'})
+        self.assertIn('recurrence', form.errors)
+
+    def test_upcoming_expands_series_without_storing_occurrences(self):
+        self.series('daily', self.today - timedelta(days=3650))
+        self.series('FREQ=DAILY;COUNT=2', self.today - timedelta(days=30))
+        Task.objects.create(user=self.user, title='One-off', due_date=self.today + timedelta(days=2))
+        with self.assertNumQueries(3):
+            tasks = recurrence.upcoming(self.user, self.today, self.today + timedelta(days=7))
+        self.assertEqual(len(tasks), 9)
+        self.assertEqual([task.due_date for task in tasks], sorted(task.due_date for task in tasks))
+        self.assertEqual(Task.objects.count(), 3)
+        self.assertEqual(len(recurrence.upcoming(self.user, self.today, self.today + timedelta(days=7), limit=4)), 4)
+
+    def test_completing_an_occurrence_stores_only_that_one(self):
+        series = self.series('daily', self.today)
+        day = (self.today + timedelta(days=1)).isoformat()
+        url = reverse('complete_occurrence', args=[series.pk, day])
+        task_id = self.client.post(url).json()['task_id']
+        self.assertEqual(self.client.post(url).json()['task_id'], task_id)
+        occurrence = Task.objects.get(pk=task_id)
+        self.assertEqual((occurrence.series_id, occurrence.occurrence_date.isoformat(), occurrence.complete), (series.pk, day, True))
+
+        days = [task.due_date for task in recurrence.upcoming(self.user, self.today, self.today + timedelta(days=2))]
+        self.assertEqual(days, [self.today, self.today + timedelta(days=2)])
+        self.assertContains(self.client.get(reverse('dashboard')), 'class="occurrence-done"', count=5)
+        self.assertEqual(self.client.post(reverse('complete_occurrence', args=[series.pk, '2000-01-01'])).status_code, 404)
+
+    def test_editing_an_occurrence(self):
+        series = self.series('weekly', self.today, priority='low')
+        day = self.today + timedelta(weeks=1)
+        url = reverse('edit_occurrence', args=[series.pk, day.isoformat()])
+        response = self.client.get(url)
+        self.assertContains(response, 'Water plants')
+        self.assertNotContains(response, 'name="recurrence"')
+        self.assertEqual(Task.objects.count(), 1)
+
+        self.client.post(url, {'title': 'Water the fern', 'status': 'todo', 'priority': 'high', 'categories': 'other', 'due_date': day.isoformat()})
+        occurrence = Task.objects.get(series=series)
+        self.assertEqual((occurrence.title, occurrence.priority, occurrence.recurrence), ('Water the fern', 'high', ''))
+        self.assertRedirects(self.client.get(url), reverse('edit_task', args=[occurrence.pk]), fetch_redirect_response=False)
+        # The series itself is not overdue once its first day has passed
+        Task.objects.filter(pk=series.pk).update(due_date=self.today - timedelta(days=7))
+        self.assertEqual(task_stats(self.user)['overdue_tasks'], 0)
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset()
+        self.user = User.objects.create_user(username='abe', password='secret-pass-123')
+        self.client.force_login(self.user)
+        Task.objects.create(user=self.user, title='Measured')
+
+    def test_request_gets_server_timing_and_a_log_line(self):
+        with self.assertLogs('base.requests', 'INFO') as logs:
+            response = self.client.get(reverse('userpage'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        entry = json.loads(logs.records[-1].getMessage())
+        # The view is async, its queries run in sync_to_async threads
+        self.assertEqual((entry['endpoint'], entry['status']), ('GET userpage', 200))
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreater(entry['render_ms'], 0)
+
+    def test_repeated_and_duplicate_statements(self):
+        with instrumentation.collect() as metrics:
+            for pk in range(6):
+                Task.objects.filter(pk=pk).exists()
+            Task.objects.filter(pk=1).exists()
+        self.assertEqual(metrics.queries, 7)
+        self.assertEqual(list(metrics.repeated().values()), [7])
+        self.assertEqual(metrics.duplicates(), 1)
+
+    async def test_async_requests_flush_to_the_db_cache(self):
+        db_cache = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'metrics_cache'}}
+        # Without the sync-only WhiteNoise middleware the whole chain runs async, as under ASGI
+        middleware = [path for path in settings.MIDDLEWARE if not path.startswith('whitenoise.')]
+        with self.settings(CACHES=db_cache, MIDDLEWARE=middleware, TASK_METRICS_FLUSH_INTERVAL=0):
+            await sync_to_async(call_command)('createcachetable', verbosity=0)
+            await sync_to_async(self.async_client.force_login)(self.user)
+            task = await Task.objects.aget()
+            # The flush runs on the event loop, where the db cache's sync API raises SynchronousOnlyOperation
+            response = await self.async_client.get(reverse('task_details', args=[task.pk]))
+            self.assertEqual(response.status_code, 200)
+            snapshot = await instrumentation.get_cache().aget(f'metrics:samples:{os.getpid()}')
+        self.assertEqual(len(snapshot['GET task_details']), 1)
+
+    def test_staff_summary(self):
+        self.assertEqual([instrumentation.percentile(list(range(1, 101)), pct) for pct in (50, 95, 99)], [50, 95, 99])
+        for _ in range(3):
+            self.client.get(reverse('task_details', args=[Task.objects.get().pk]))
+        self.assertEqual(self.client.get(reverse('request_metrics')).status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        rows = self.client.get(reverse('request_metrics'), {'format': 'json'}).json()['endpoints']
+        row = next(row for row in rows if row['endpoint'] == 'GET task_details')
+        self.assertEqual(row['count'], 3)
+        self.assertLessEqual(row['p50'], row['p95'])
+        self.assertContains(self.client.get(reverse('request_metrics')), 'GET task_details')
+
+
+class BenchmarkTests(TestCase):
+
+    def snapshot(self):
+        return list(Task.objects.order_by('pk').values_list('title', 'status', 'priority', 'categories', 'due_date', 'tags'))
+
+    def test_generator_is_reproducible(self):
+        users = benchmark.generate(2, 150, seed=7)
+        first = self.snapshot()
+        self.assertEqual(len(first), 300)
+        self.assertEqual([counters.drift(user.pk) for user in users], [{}, {}])
+        self.assertEqual(Task.tag_objects.through.objects.count(), sum(len(parse_tags(row[5])) for row in first))
+        self.assertGreater(len({row[1] for row in first}), 2)
+
+        benchmark.delete_users(2, 7)
+        benchmark.generate(2, 150, seed=7)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_client_run_and_compare(self):
+        users = benchmark.generate(1, 40)
+        report = benchmark.run(benchmark.ClientDriver(), users, list(benchmark.SCENARIOS), requests=3, warmup=1)
+        json.dumps(report)
+        for name, result in report['scenarios'].items():
+            self.assertEqual((name, result['errors']), (name, 0))
+            self.assertGreater(result['queries']['mean'], 0)
+        self.assertEqual(Task.objects.count(), 40 + 4)
+
+        slower = json.loads(json.dumps(report))
+        slower['scenarios']['toggle']['queries']['mean'] *= 2
+        rows = benchmark.regressions(benchmark.compare(report, slower), 50)
+        self.assertEqual([row[:2] for row in rows], [('toggle', 'queries.mean')])
+
+
+class BenchmarkHTTPTests(LiveServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Cached users and sessions from other tests may share primary keys
+        cache.clear()
+
+    def test_http_driver(self):
+        users = benchmark.generate(1, 20)
+        # The live server shares one in-memory SQLite connection between its
+        # threads, so requests are not sent in parallel here
+        driver = benchmark.HTTPDriver(self.live_server_url, concurrency=1)
+        report = benchmark.run(driver, users, ['list', 'toggle', 'create'], requests=4, warmup=1)
+        self.assertEqual([result['errors'] for result in report['scenarios'].values()], [0, 0, 0])
+        self.assertEqual(Task.objects.filter(user=users[0]).count(), 20 + 5)
+
+
+class StaticAssetTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('static')
+        Task.objects.create(user=self.user, title='Task')
+
+    def load(self):
+        client = Client()
+        client.force_login(self.user)
+        return transfer.page_transfer(client, reverse('userpage'))
+
+    def test_collected_assets_are_fingerprinted_compressed_and_immutable(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            STATIC_ROOT=root,
+            # Only the app's own files, so collectstatic does not compress the admin's
+            STATICFILES_DIRS=[str(settings.BASE_DIR / 'base' / 'static')],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+            }},
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            report = self.load()
+
+        assets = report['cold']['resources'][1:]
+        self.assertEqual([row['url'].rsplit('/', 1)[1].split('.')[0] for row in assets], ['index', 'logo'])
+        for row in assets:
+            self.assertRegex(row['url'], r'\.[0-9a-f]{12}\.')
+            self.assertIn(row['encoding'], ('br', 'gzip'))
+            self.assertIn('immutable', row['cache_control'])
+        self.assertEqual(report['problems'], [])
+        self.assertEqual((report['warm']['requests'], report['warm']['from_cache']), (1, 2))
+        self.assertEqual(report['warm']['resources'][0]['status'], 304)
+        self.assertLess(report['warm']['bytes'], 1000)
+
+    @override_settings(DEBUG=True)
+    def test_unfingerprinted_assets_are_revalidated_and_reported(self):
+        # As served in development: from the app directories, with max-age=0
+        report = self.load()
+        self.assertEqual(report['warm']['requests'], 3)
+        self.assertEqual({row['status'] for row in report['warm']['resources']}, {304})
+        self.assertIn(('/static/base/index.css', 'not fingerprinted (no immutable caching)'), report['problems'])
+
+    async def test_asgi_serves_collected_files_ahead_of_django(self):
+        passed = []
+
+        async def django_app(scope, receive, send):
+            passed.append(scope['path'])
+
+        async def get(path):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': [(b'accept-encoding', b'gzip')]}
+            await application(scope, None, send)
+            return sent
+
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            STATIC_ROOT=root,
+            STATICFILES_DIRS=[str(settings.BASE_DIR / 'base' / 'static')],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+            }},
+        ):
+            await sync_to_async(call_command)('collectstatic', interactive=False, verbosity=0)
+            application = StaticFilesASGI(django_app)
+            url = await sync_to_async(static)('base/index.css')
+            sent = await get(url)
+            self.assertEqual(await get('/userpage/'), [])
+
+        headers = dict(sent[0]['headers'])
+        self.assertEqual((sent[0]['status'], headers[b'content-encoding']), (200, b'gzip'))
+        self.assertIn(b'immutable', headers[b'cache-control'])
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertEqual(len(body), int(headers[b'content-length']))
+        self.assertEqual(passed, ['/userpage/'])
+
+    def test_background_images_only_for_rules_matching_the_page(self):
+        css = '.hero, .other .x { background: url("img/a.png") } body { background: url(b.png) } .gone { background: url(c.png) }'
+        urls = transfer.stylesheet_urls(css, '/static/base/index.css', transfer.page_classes('<div class="hero">'))
+        self.assertEqual(urls, ['/static/base/img/a.png', '/static/base/b.png'])
+
+
+class AuthPathTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='rae', password='secret-pass-123')
+
+    def auth_queries(self, ctx):
+        return [query['sql'] for query in ctx.captured_queries if 'auth_user' in query['sql'] or 'django_session' in query['sql']]
+
+    def test_login_looks_the_user_up_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('loginpage'), {'username': 'RAE', 'password': 'secret-pass-123'})
+        self.assertRedirects(response, reverse('userpage'), fetch_redirect_response=False)
+        selects = [sql for sql in self.auth_queries(ctx) if sql.startswith('SELECT') and 'FROM "auth_user"' in sql]
+        self.assertEqual(len(selects), 1)
+
+        self.client.logout()
+        response = self.client.post(reverse('loginpage'), {'username': 'nobody', 'password': 'x'})
+        self.assertEqual([str(m) for m in response.context['messages']], ['username or password is not correct'])
+
+    def test_cached_session_and_user_cost_no_queries(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('userpage'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse('userpage')).status_code, 200)
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        self.assertEqual(self.auth_queries(ctx), [])
+
+        # Saving the user drops the cached copy, so a new password ends the session at once
+        self.user.set_password('another-pass-456')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('userpage')).status_code, 302)
+
+    def test_expired_sessions_are_deleted_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(session_key=f'session{i:025}', session_data='', expire_date=now + timedelta(days=1 if i >= 5 else -1))
+            for i in range(8)
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(auth.clear_expired_sessions(batch_size=2), 5)
+        self.assertEqual(sum(1 for query in ctx.captured_queries if query['sql'].startswith('DELETE')), 3)
+        self.assertEqual(Session.objects.count(), 3)
+
+
+class TaskAdminTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'secret-pass-123')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:base_task_changelist')
+        self.users = [self.add_user(f'owner{i}') for i in range(3)]
+
+    def add_user(self, username, tasks=3):
+        user = User.objects.create_user(username)
+        for i in range(tasks):
+            Task.objects.create(user=user, title=f'{username} task {i}')
+        return user
+
+    def test_changelist_queries_do_not_grow_with_rows_or_users(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['cl'].result_count, 9)
+        for i in range(3, 8):
+            self.add_user(f'owner{i}')
+        with CaptureQueriesContext(connection) as more:
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['cl'].result_count, 24)
+        self.assertEqual(len(more), len(ctx))
+        self.assertFalse([query for query in more.captured_queries if 'FROM "auth_user"' in query['sql']])
+
+        # The user filter is an autocomplete box, not a list of every user
+        self.assertContains(response, 'id="user-filter"')
+        self.assertContains(response, 'data-field-name="user"')
+        self.assertNotContains(response, '?user=')
+        response = self.client.get(self.url, {'user': self.users[1].pk})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertContains(response, f'<option value="{self.users[1].pk}" selected>owner1</option>', html=True)
+
+    @override_settings(TASK_ADMIN_EXACT_COUNT_LIMIT=4)
+    def test_counts_past_the_limit_are_estimated(self):
+        TaskCounter.objects.filter(user=self.users[0]).update(total=1000)
+        cl = self.client.get(self.url).context['cl']
+        self.assertEqual(cl.result_count, 1006)
+        self.assertIsNone(cl.full_result_count)
+
+        # A filtered list has no estimate on SQLite; the count stops at the limit
+        self.assertEqual(self.client.get(self.url, {'status__exact': 'todo'}).context['cl'].result_count, 5)
+        self.assertEqual(self.client.get(self.url, {'user': self.users[0].pk}).context['cl'].result_count, 3)
+
+    def test_created_drill_down(self):
+        moments = [datetime(2023, 12, 31, 22), datetime(2024, 3, 15, 9), datetime(2024, 3, 16, 9)]
+        for task, moment in zip(Task.objects.filter(user=self.users[0]).order_by('pk'), moments):
+            Task.objects.filter(pk=task.pk).update(created_at=timezone.make_aware(moment))
+        Task.objects.exclude(user=self.users[0]).update(created_at=timezone.make_aware(datetime(2025, 1, 1)))
+
+        response = self.client.get(self.url)
+        years = [choice['display'] for choice in self.created_choices(response)]
+        self.assertEqual(years, ['All', '2025', '2024', '2023'])
+
+        response = self.client.get(self.url, {'created': '2024'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertEqual(len(self.created_choices(response)), 14)
+
+        response = self.client.get(self.url, {'created': '2024-03-15'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        selected = [choice['display'] for choice in self.created_choices(response) if choice['selected']]
+        self.assertEqual(selected, ['March 15'])
+
+        # Days are local: 22:00 on 31 December is still 2023 in Nairobi
+        self.assertEqual(self.client.get(self.url, {'created': '2023-12'}).context['cl'].result_count, 1)
+        self.assertEqual(self.client.get(self.url, {'created': '2024-02-30'}).status_code, 302)
+
+    def created_choices(self, response):
+        spec = next(spec for spec in response.context['cl'].filter_specs if getattr(spec, 'parameter_name', None) == 'created')
+        return list(spec.choices(response.context['cl']))
+
+    def test_bulk_actions_update_counters_of_every_owner(self):
+        ids = list(Task.objects.filter(user__in=self.users[:2]).values_list('pk', flat=True))
+        response = self.client.post(self.url, {'action': 'complete', '_selected_action': ids}, follow=True)
+        self.assertContains(response, '6 tasks updated.')
+        self.assertEqual(Task.objects.filter(complete=True).count(), 6)
+        for user, completed in zip(self.users, (3, 3, 0)):
+            self.assertEqual(TaskCounter.objects.get(user=user).completed, completed)
+            self.assertEqual(counters.drift(user.pk), {})
+
+        self.client.post(self.url, {'action': 'set_priority_high', '_selected_action': ids[:1]})
+        self.assertEqual(Task.objects.get(pk=ids[0]).priority, 'high')
+
+
+class RateLimitTests(TestCase):
+
+    def test_buckets_refill_over_time(self):
+        for store in (ratelimit.DatabaseStore(), ratelimit.CacheStore()):
+            def take(now):
+                return store.take('test:ip:1.2.3.4', 2, 0.5, now)
+
+            self.assertEqual([take(1000), take(1000)], [0, 0])
+            self.assertAlmostEqual(take(1000), 2.0)
+            self.assertAlmostEqual(take(1001), 1.0)
+            self.assertEqual(take(1002), 0)
+            self.assertAlmostEqual(take(1002), 2.0)
+
+    @override_settings(TASK_RATE_LIMITS={'login': {'ip': '3/m', 'username': '5/m'}})
+    def test_login_bursts_get_429_without_hashing(self):
+        User.objects.create_user(username='sam', password='secret-pass-123')
+        url = reverse('loginpage')
+        for _ in range(3):
+            self.assertEqual(self.client.post(url, {'username': 'sam', 'password': 'wrong'}).status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, {'username': 'sam', 'password': 'secret-pass-123'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertTrue(all('base_ratelimitbucket' in query['sql'] for query in ctx.captured_queries))
+        # A browser gets the login form back with the reason; scripts get JSON
+        self.assertTemplateUsed(response, 'base/create_account.html')
+        self.assertContains(response, 'Too many requests', status_code=429)
+        response = self.client.post(url, {'username': 'sam', 'password': 'x'}, headers={'accept': 'application/json'})
+        self.assertEqual(response.json()['success'], False)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        # The username bucket still counts attempts from other addresses
+        for i in range(2):
+            response = self.client.post(url, {'username': 'sam', 'password': 'wrong'}, REMOTE_ADDR=f'10.0.0.{i}')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, {'username': 'sam', 'password': 'wrong'}, REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(TASK_RATE_LIMITS={'create_task': {'user': '1/m'}})
+    def test_refused_form_keeps_the_input(self):
+        self.client.force_login(User.objects.create_user(username='kim'))
+        url = reverse('create_task')
+        self.assertEqual(self.client.post(url, {'title': 'First task', 'status': 'todo', 'priority': 'medium',
+                                                 'categories': 'other'}).status_code, 302)
+        response = self.client.post(url, {'title': 'Second task'})
+        self.assertContains(response, 'value="Second task"', status_code=429)
+        self.assertContains(response, 'Too many requests', status_code=429)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(TASK_RATE_LIMITS={'toggle_complete': {'user': '2/m'}})
+    def test_per_user_limit_on_async_view(self):
+        user = User.objects.create_user(username='kim')
+        task = Task.objects.create(user=user, title='Task')
+        self.client.force_login(user)
+        statuses = [self.client.post(reverse('toggle_complete', args=[task.pk])).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        task.refresh_from_db()
+        self.assertFalse(task.complete)
+
+        with override_settings(TASK_RATE_LIMIT_ENABLED=False):
+            self.assertEqual(self.client.post(reverse('toggle_complete', args=[task.pk])).status_code, 200)
+
+    @override_settings(TASK_RATE_LIMITS={'api_auth': {'ip': '3/m', 'username': '10/m'}})
+    def test_api_basic_auth_only_spends_tokens_on_wrong_passwords(self):
+        User.objects.create_user(username='sam', password='secret-pass-123')
+        url = reverse('api-task-list')
+
+        def get(password):
+            token = base64.b64encode(f'sam:{password}'.encode()).decode()
+            return self.client.get(url, HTTP_AUTHORIZATION=f'Basic {token}')
+
+        self.assertEqual([get('secret-pass-123').status_code for _ in range(5)], [200] * 5)
+        self.assertEqual([get('wrong').status_code for _ in range(3)], [403] * 3)
+        with CaptureQueriesContext(connection) as ctx:
+            response = get('secret-pass-123')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertFalse([query for query in ctx.captured_queries if 'FROM "auth_user"' in query['sql']])
+
+    @override_settings(TASK_RATE_LIMITS={'api_write': {'user': '2/m'}})
+    def test_api_writes_are_limited_per_user(self):
+        self.client.force_login(User.objects.create_user(username='kim'))
+        url = reverse('api-task-list')
+        statuses = [self.client.post(url, {'title': f'Task {i}'}).status_code for i in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_prune_drops_idle_buckets(self):
+        RateLimitBucket.objects.create(key='login:ip:old', tokens=0, stamp=0)
+        RateLimitBucket.objects.create(key='login:ip:new', tokens=0, stamp=2 ** 40)
+        self.assertEqual(ratelimit.prune(), 1)
+        self.assertEqual(list(RateLimitBucket.objects.values_list('key', flat=True)), ['login:ip:new'])
+
+
+class DatabaseProfileTests(TestCase):
+
+    def test_sqlite_connections_get_the_configured_pragmas(self):
+        # The test database lives in memory, where WAL and mmap do not apply
+        with tempfile.TemporaryDirectory() as directory:
+            other = connection.copy()
+            other.settings_dict['NAME'] = f'{directory}/db.sqlite3'
+            try:
+                with other.cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'mmap_size', 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                other.close()
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal',
+            'synchronous': 1,  # NORMAL
+            'mmap_size': settings.SQLITE_PRAGMAS['mmap_size'],
+            'busy_timeout': settings.DATABASES['default']['OPTIONS']['timeout'] * 1000,
+        })
+        self.assertEqual(other.transaction_mode, 'IMMEDIATE')
+
+
+class TaskEventTests(TransactionTestCase):
+    # Writes really commit here, so on_commit publishing runs as in production
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tara', password='secret-pass-123')
+        self.task = Task.objects.create(user=self.user, title='Watched task')
+
+    async def next_event(self, stream):
+        while True:
+            chunk = await anext(stream)
+            if chunk.startswith(b'id:'):
+                return json.loads(chunk.decode().split('data: ', 1)[1])
+
+    async def test_stream_pushes_changed_cards_deletes_and_stats(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('task_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+
+        await self.async_client.post(reverse('toggle_complete', args=[self.task.pk]))
+        data = await self.next_event(stream)
+        self.assertIn('checked', data['changed'][str(self.task.pk)])
+        self.assertEqual(data['deleted'], [])
+        self.assertIn('Completed', data['stats'])
+
+        pk = self.task.pk
+        await self.task.adelete()
+        data = await self.next_event(stream)
+        self.assertEqual((data['changed'], data['deleted']), ({}, [pk]))
+        await stream.aclose()
+
+    def test_wsgi_request_gets_no_content_instead_of_a_held_worker(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('task_events'))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+    async def test_database_broker_sees_writes_without_publish(self):
+        with self.settings(TASK_EVENTS_BROKER='base.events.DatabaseBroker', TASK_EVENTS_POLL_INTERVAL=0.01):
+            subscription = events.get_broker().subscribe(self.user.pk)
+            await subscription.start()
+            self.assertFalse(await subscription.wait(0.05))
+            await Task.objects.acreate(user=self.user, title='Written elsewhere')
+            self.assertTrue(await subscription.wait(1))
+
+    async def test_local_broker_wakes_subscribers_of_that_user_only(self):
+        broker = LocalBroker()
+        mine, other = broker.subscribe(self.user.pk), broker.subscribe(self.user.pk + 1)
+        broker.publish(self.user.pk)
+        self.assertTrue(await mine.wait(1))
+        self.assertFalse(await other.wait(0.01))
+        mine.close()
+        other.close()
+        self.assertEqual(broker.subscriptions, {})
@@ -0,0 +1,207 @@
+"""
+Bytes a browser transfers to load a page (python manage.py page_weight).
+
+page_transfer() loads a page through the test client, so it passes through
+the same middleware as a real request, WhiteNoise included. It then fetches
+every stylesheet, script and image the page references, and the url()s of
+the stylesheet rules whose class names appear in the page, asking for
+compressed responses the way a browser does. That is the cold load.
+
+The warm load replays the same page against a browser cache filled by the
+cold load. Responses that are still fresh (Cache-Control max-age or
+immutable) are not requested again. Everything else is revalidated with
+If-None-Match / If-Modified-Since, which costs a request and, on a 304, only
+the headers.
+"""
+import re
+from urllib.parse import urljoin, urlsplit
+
+from django.conf import settings
+
+
+TAG_URL_RE = re.compile(r'<(?:link|script|img)\b[^>]*?\s(?:href|src)\s*=\s*["\']([^"\']+)["\']', re.I)
+CSS_URL_RE = re.compile(r'url\(\s*["\']?([^"\')]+?)["\']?\s*\)')
+CSS_RULE_RE = re.compile(r'([^{}]*)\{([^{}]*)\}')
+CLASS_ATTR_RE = re.compile(r'\sclass\s*=\s*["\']([^"\']*)["\']', re.I)
+SELECTOR_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][-_a-zA-Z0-9]*)')
+ACCEPT_ENCODING = 'br, gzip'
+# Text responses larger than this should arrive compressed
+COMPRESS_MIN_BYTES = 1024
+TEXT_TYPES = ('text/', 'application/javascript', 'image/svg+xml', 'application/json')
+
+
+def _header_bytes(response):
+    # Status line plus one "Name: value" line per header; close to what the
+    # wire carries without counting framing
+    lines = [f'HTTP/1.1 {response.status_code} {response.reason_phrase}']
+    lines += [f'{name}: {value}' for name, value in response.items()]
+    return sum(len(line) + 2 for line in lines) + 2
+
+
+def _body(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def _cache_directives(value):
+    directives = {}
+    for part in filter(None, (part.strip() for part in (value or '').lower().split(','))):
+        name, _, argument = part.partition('=')
+        directives[name] = argument
+    return directives
+
+
+def is_fresh(response):
+    """Whether a browser may reuse ``response`` without asking the server"""
+    directives = _cache_directives(response.get('Cache-Control'))
+    if 'no-cache' in directives or 'no-store' in directives:
+        return False
+    if 'immutable' in directives:
+        return True
+    try:
+        return int(directives.get('max-age') or 0) > 0
+    except ValueError:
+        return False
+
+
+def asset_urls(html, base):
+    """Same-site stylesheet, script and image URLs in a page, in document order"""
+    urls = []
+    for url in TAG_URL_RE.findall(html):
+        url = urljoin(base, url)
+        if not urlsplit(url).netloc and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def page_classes(html):
+    return {name for value in CLASS_ATTR_RE.findall(html) for name in value.split()}
+
+
+def _may_match(selectors, classes):
+    # A browser only downloads a background image when its rule matches an
+    # element. Checking the class names of each selector against the page is
+    # enough to leave out the rules written for other pages.
+    return any(set(SELECTOR_CLASS_RE.findall(selector)) <= classes for selector in selectors.split(','))
+
+
+def stylesheet_urls(css, base, classes=None):
+    """Same-site url()s in a stylesheet; with ``classes``, only from rules that may match the page"""
+    urls = []
+    for selectors, declarations in CSS_RULE_RE.findall(css):
+        if classes is not None and not _may_match(selectors, classes):
+            continue
+        for url in CSS_URL_RE.findall(declarations):
+            if url.startswith(('data:', '#')):
+                continue
+            url = urljoin(base, url)
+            if not urlsplit(url).netloc and url not in urls:
+                urls.append(url)
+    return urls
+
+
+class Load:
+    """Requests made for one page load and the bytes they transferred"""
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, url, response, body, source):
+        self.rows.append({
+            'url': url,
+            'status': response.status_code,
+            'source': source,
+            'content_type': response.get('Content-Type', '').split(';')[0],
+            'encoding': response.get('Content-Encoding', ''),
+            'cache_control': response.get('Cache-Control', ''),
+            'body_bytes': len(body),
+            'bytes': len(body) + _header_bytes(response),
+        })
+
+    def cached(self, url):
+        self.rows.append({
+            'url': url, 'status': None, 'source': 'cache', 'content_type': '', 'encoding': '',
+            'cache_control': '', 'body_bytes': 0, 'bytes': 0,
+        })
+
+    def summary(self):
+        return {
+            'requests': sum(1 for row in self.rows if row['source'] != 'cache'),
+            'from_cache': sum(1 for row in self.rows if row['source'] == 'cache'),
+            'bytes': sum(row['bytes'] for row in self.rows),
+            'body_bytes': sum(row['body_bytes'] for row in self.rows),
+            'resources': self.rows,
+        }
+
+
+def _load(client, path, cache):
+    """One page load through ``cache`` ({url: (response, body)}), which it fills in"""
+    load = Load()
+    pending = [path]
+    seen = set()
+    classes = set()
+    while pending:
+        url = pending.pop(0)
+        if url in seen:
+            continue
+        seen.add(url)
+        stored, body = cache.get(url, (None, b''))
+        if stored is not None and is_fresh(stored):
+            load.cached(url)
+            response = stored
+        else:
+            headers = {'HTTP_ACCEPT_ENCODING': ACCEPT_ENCODING}
+            if stored is not None:
+                if stored.has_header('ETag'):
+                    headers['HTTP_IF_NONE_MATCH'] = stored['ETag']
+                if stored.has_header('Last-Modified'):
+                    headers['HTTP_IF_MODIFIED_SINCE'] = stored['Last-Modified']
+            response = client.get(url, **headers)
+            received = _body(response)
+            if response.status_code == 304:
+                load.add(url, response, received, 'revalidated')
+                response = stored
+            elif response.status_code == 200:
+                load.add(url, response, received, 'network')
+                body = received
+                if response.get('Content-Encoding'):
+                    # A compressed static file; read the plain copy to find its links
+                    body = _body(client.get(url))
+                cache[url] = (response, body)
+            else:
+                load.add(url, response, received, 'network')
+                continue
+
+        # Links are followed from cached copies too: a cached stylesheet
+        # still asks for its images
+        content_type = response.get('Content-Type', '')
+        if content_type.startswith('text/html'):
+            html = body.decode()
+            classes |= page_classes(html)
+            pending += asset_urls(html, url)
+        elif content_type.startswith('text/css'):
+            pending += stylesheet_urls(body.decode(), url, classes)
+    return load
+
+
+def problems(load):
+    """Static assets that a production setup should serve smaller or cache longer"""
+    found = []
+    for row in load['resources']:
+        if row['source'] == 'cache' or not row['url'].startswith(settings.STATIC_URL):
+            continue
+        is_text = row['content_type'].startswith(TEXT_TYPES)
+        if is_text and row['status'] == 200 and not row['encoding'] and row['body_bytes'] > COMPRESS_MIN_BYTES:
+            found.append((row['url'], 'served uncompressed'))
+        if 'immutable' not in row['cache_control']:
+            found.append((row['url'], 'not fingerprinted (no immutable caching)'))
+    return found
+
+
+def page_transfer(client, path):
+    """{'cold': ..., 'warm': ...} summaries for two loads of ``path`` by a logged-in ``client``"""
+    cache = {}
+    cold = _load(client, path, cache).summary()
+    warm = _load(client, path, cache).summary()
+    return {'path': path, 'cold': cold, 'warm': warm, 'problems': problems(cold)}
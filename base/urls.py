@@ -1,5 +1,6 @@
-from django.urls import path
+from django.urls import include, path
 from . import views
+from .api import router as api_router
 
 
 urlpatterns = [
@@ -14,4 +15,14 @@ urlpatterns = [
     path('delete/<str:pk>', views.delete_task, name='delete_task'),
     path('edit_task/<str:pk>', views.edit_task, name='edit_task'),
     path('toggle_complete/<str:pk>', views.toggle_complete, name='toggle_complete'),
+    path('occurrences/<int:pk>/<str:day>/complete/', views.complete_occurrence, name='complete_occurrence'),
+    path('occurrences/<int:pk>/<str:day>/edit/', views.edit_occurrence, name='edit_occurrence'),
+    path('bulk_tasks/', views.bulk_tasks, name='bulk_tasks'),
+    path('export/', views.export_tasks, name='export_tasks'),
+    path('import/', views.import_tasks, name='import_tasks'),
+    path('jobs/<int:pk>/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', views.job_download, name='job_download'),
+    path('events/', views.task_events, name='task_events'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
+    path('api/v1/', include(api_router.urls)),
 ]
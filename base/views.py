@@ -1,16 +1,38 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
-from .models import Task
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from . import counters, events, fragments, instrumentation, jobs, recurrence, sync
+from .bulk import BulkActionError, apply_bulk_action
+from .export import EXPORT_FORMATS, aiter_export, export_queryset, iter_export
+from .importer import IMPORT_FORMATS, ImportFileError, guess_format, import_tasks as run_import
+from .conditional import (
+    atask_list_state, atask_updated_at, preload,
+    task_etag, task_last_modified, task_list_etag, task_list_last_modified,
+)
+from .models import Job, Task, TaskImport
 from .forms import TaskForm, customizedUserCreationForm
+from .pagination import KeysetPaginator, InvalidCursor
+from .ratelimit import rate_limit
+from .filters import filter_tasks
+from .stats import atask_stats, task_stats
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password
-from django.db.models import Q, Count
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import asyncio
+import io
+import json
 
 
 
@@ -18,67 +40,65 @@ def home(request):
     return render(request, 'base/home.html')
 
 @login_required(login_url='/')
-def userpage(request):
-    tasks = Task.objects.filter(user=request.user)
+@cache_control(private=True, no_cache=True)
+@preload(atask_list_state)
+@condition(etag_func=task_list_etag, last_modified_func=task_list_last_modified)
+async def userpage(request):
+    # Search and filter functionality
+    tasks, filters = filter_tasks(Task.objects.filter(user=request.user), request.GET, ranked=True)
     
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        tasks = tasks.filter(
-            Q(title__icontains=search_query) | 
-            Q(description__icontains=search_query) |
-            Q(tags__icontains=search_query)
-        )
+    # One extra query renders the tag chips for the whole page
+    tasks = tasks.prefetch_related('tag_objects')
     
-    # Filter functionality
-    status_filter = request.GET.get('status', '')
-    if status_filter:
-        tasks = tasks.filter(status=status_filter)
+    # Sorting and keyset pagination
+    sort_by = request.GET.get('sort', 'relevance' if filters['search_query'] else '-created_at')
+    paginator = KeysetPaginator(tasks, sort_by)
+    sort_by = paginator.sort
     
-    priority_filter = request.GET.get('priority', '')
-    if priority_filter:
-        tasks = tasks.filter(priority=priority_filter)
+    async def render_list():
+        try:
+            page = await paginator.apage(request.GET.get('cursor'))
+        except InvalidCursor:
+            page = await paginator.apage()
+        return render_to_string('base/partials/task_list.html', {'tasks': page.object_list, 'page': page}, request)
     
-    category_filter = request.GET.get('category', '')
-    if category_filter:
-        tasks = tasks.filter(categories=category_filter)
+    async def render_stats():
+        return render_to_string('base/partials/task_stats.html', await atask_stats(request.user))
     
-    # Sorting functionality
-    sort_by = request.GET.get('sort', '-created_at')
-    valid_sorts = ['due_date', '-due_date', 'priority', '-priority', 'created_at', '-created_at', 'title', '-title']
-    if sort_by in valid_sorts:
-        tasks = tasks.order_by(sort_by)
+    async def render_upcoming():
+        upcoming_tasks = await _aupcoming(request.user, UPCOMING_LIMIT)
+        return render_to_string('base/partials/upcoming_tasks.html', {'upcoming_tasks': upcoming_tasks}, request)
     
-    # Statistics
-    total_tasks = Task.objects.filter(user=request.user).count()
-    completed_tasks = Task.objects.filter(user=request.user, complete=True).count()
-    pending_tasks = total_tasks - completed_tasks
-    overdue_tasks = Task.objects.filter(
-        user=request.user,
-        complete=False,
-        due_date__lt=timezone.now().date()
-    ).count()
+    # Rendered fragments are reused until one of the user's tasks changes
+    version = await fragments.aget_version(request.user.pk)
+    list_key = fragments.fragment_key('userpage-list', request.user.pk, version, request.GET)
+    stats_key = fragments.fragment_key('task-stats', request.user.pk, version)
+    upcoming_key = fragments.fragment_key('upcoming', request.user.pk, version)
+    cached = await fragments.get_cache().aget_many([list_key, stats_key, upcoming_key])
     
+    # One after another: Django runs every async ORM call and thread-sensitive
+    # sync_to_async on the same thread, so gathering them gains nothing
+    list_html = await fragments.aget_or_render(cached, list_key, render_list)
+    stats_html = await fragments.aget_or_render(cached, stats_key, render_stats)
+    upcoming_html = await fragments.aget_or_render(cached, upcoming_key, render_upcoming)
     context = {
-        'tasks': tasks,
-        'search_query': search_query,
-        'status_filter': status_filter,
-        'priority_filter': priority_filter,
-        'category_filter': category_filter,
+        'list_html': list_html,
+        'stats_html': stats_html,
+        'upcoming_html': upcoming_html,
         'sort_by': sort_by,
-        'total_tasks': total_tasks,
-        'completed_tasks': completed_tasks,
-        'pending_tasks': pending_tasks,
-        'overdue_tasks': overdue_tasks,
         'status_choices': Task.STATUS_CHOICES,
         'priority_choices': Task.PRIORITY_CHOICES,
         'category_choices': Task.Categories,
     }
+    context.update(filters)
     return render(request, 'base/userpage.html', context)
 
 @login_required(login_url='/')
-def task_details(request, pk):
-    tasks = get_object_or_404(Task, id=pk)
+@cache_control(private=True, no_cache=True)
+@preload(atask_updated_at)
+@condition(etag_func=task_etag, last_modified_func=task_last_modified)
+async def task_details(request, pk):
+    tasks = await aget_object_or_404(Task, id=pk)
     context = {'tasks': tasks}
     return render(request, 'base/task_details.html', context) 
 
@@ -96,6 +116,7 @@ def delete_task(request, pk):
     return render(request, 'base/delete.html', context)
 
 @login_required(login_url='/')
+@rate_limit('create_task', template='base/create_task.html', context=lambda request: {'form': TaskForm(request.POST)})
 def create_task(request):
     if request.method == 'POST':
         form = TaskForm(request.POST)
@@ -133,6 +154,7 @@ def edit_task(request, pk):
     return render(request, 'base/edit_task.html', context)
 
 
+@rate_limit('create_account', template='base/create_account.html')
 def create_account(request):
     
     if request.method == 'POST': 
@@ -159,6 +181,7 @@ def create_account(request):
     return render(request, 'base/create_account.html')
 
 
+@rate_limit('login', template='base/create_account.html', context=lambda request: {'page': 'login'})
 def loginAccount(request):
     page = 'login'
     if request.user.is_authenticated:
@@ -167,10 +190,8 @@ def loginAccount(request):
         username = request.POST.get('username').lower()
         password = request.POST.get('password')
 
-        try:
-            user = User.objects.get(username=username)
-        except:
-            messages.error(request, 'User does not exist')
+        # authenticate() is the only user lookup; an unknown username gets the
+        # same message as a wrong password
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
@@ -188,16 +209,17 @@ def logoutpage(request):
 
 
 @login_required(login_url='/')
-def toggle_complete(request, pk):
+@rate_limit('toggle_complete')
+async def toggle_complete(request, pk):
     """Toggle task completion status via AJAX"""
     if request.method == 'POST':
-        task = get_object_or_404(Task, id=pk, user=request.user)
+        task = await aget_object_or_404(Task, id=pk, user=await request.auser())
         task.complete = not task.complete
         if task.complete:
             task.status = 'completed'
         else:
             task.status = 'todo'
-        task.save()
+        await task.asave()
         return JsonResponse({
             'success': True,
             'complete': task.complete,
@@ -207,59 +229,297 @@ def toggle_complete(request, pk):
 
 
 @login_required(login_url='/')
-def dashboard(request):
-    """Dashboard with task statistics and analytics"""
-    user_tasks = Task.objects.filter(user=request.user)
-    
-    # Basic statistics
-    total_tasks = user_tasks.count()
-    completed_tasks = user_tasks.filter(complete=True).count()
-    pending_tasks = total_tasks - completed_tasks
-    overdue_tasks = user_tasks.filter(
-        complete=False,
-        due_date__lt=timezone.now().date()
-    ).count()
-    
-    # Completion rate
-    completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-    
-    # Tasks by priority
-    high_priority = user_tasks.filter(priority='high').count()
-    medium_priority = user_tasks.filter(priority='medium').count()
-    low_priority = user_tasks.filter(priority='low').count()
-    
-    # Tasks by category
-    tasks_by_category = user_tasks.values('categories').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Tasks by status
-    tasks_by_status = user_tasks.values('status').annotate(
-        count=Count('id')
+def export_tasks(request):
+    """Stream the user's tasks, with the current userpage filters, as CSV or NDJSON"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'success': False, 'error': 'Unknown export format.'}, status=400)
+    if counters.get_counter(request.user.pk).total > getattr(settings, 'TASK_EXPORT_INLINE_LIMIT', 10000):
+        # Too big to hold a worker for; the job queue writes the file instead
+        params = {name: request.GET.get(name, '') for name in ['search', 'status', 'priority', 'category', 'tag']}
+        job = jobs.enqueue('export_tasks', request.user, {'format': export_format, 'params': params})
+        return redirect('job_status', job.pk)
+    rows = export_queryset(request.user, request.GET)
+    # Each server gets the kind of iterator it can stream without buffering
+    chunks = aiter_export if isinstance(request, ASGIRequest) else iter_export
+    response = StreamingHttpResponse(chunks(rows, export_format), content_type=EXPORT_FORMATS[export_format])
+    filename = f'tasks-{request.user.username}-{timezone.localdate().isoformat()}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required(login_url='/')
+def bulk_tasks(request):
+    """Apply one action to many selected tasks via AJAX"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False}, status=400)
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON.'}, status=400)
+    else:
+        payload = {
+            'ids': request.POST.getlist('ids'),
+            'action': request.POST.get('action'),
+            'value': request.POST.get('value'),
+        }
+    try:
+        affected = apply_bulk_action(request.user, payload.get('ids') or [], payload.get('action'), payload.get('value'))
+    except BulkActionError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, 'affected': affected})
+
+
+@login_required(login_url='/')
+def import_tasks(request):
+    """Import tasks from an uploaded CSV or NDJSON file and report per-row errors"""
+    upload = request.FILES.get('file')
+    if request.method != 'POST' or upload is None:
+        return JsonResponse({'success': False, 'error': 'Upload a file.'}, status=400)
+    import_format = request.POST.get('format') or guess_format(upload.name)
+    if import_format not in IMPORT_FORMATS:
+        return JsonResponse({'success': False, 'error': 'Unsupported format.'}, status=400)
+
+    task_import = None
+    resume = request.POST.get('resume', '')
+    if resume:
+        if resume.isdigit():
+            task_import = TaskImport.objects.filter(
+                user=request.user, pk=resume, format=import_format
+            ).exclude(status='completed').first()
+        if task_import is None:
+            return JsonResponse({'success': False, 'error': 'No unfinished import to resume.'}, status=400)
+
+    if upload.size > getattr(settings, 'TASK_IMPORT_INLINE_BYTES', 1024 * 1024):
+        # Large files are imported by the job worker, not in this request
+        if task_import is None:
+            task_import = TaskImport.objects.create(user=request.user, source_name=upload.name, format=import_format)
+        name = f'import-{task_import.pk}.{import_format}'
+        with open(jobs.files_dir() / name, 'wb') as fh:
+            for chunk in upload.chunks():
+                fh.write(chunk)
+        job = jobs.enqueue('import_tasks', request.user, {'import_id': task_import.pk, 'file': name})
+        return JsonResponse({
+            'success': True,
+            'job_id': job.pk,
+            'import_id': task_import.pk,
+            'status_url': reverse('job_status', args=[job.pk]),
+        }, status=202)
+
+    stream = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    try:
+        task_import = run_import(request.user, stream, upload.name, import_format, job=task_import)
+    except ImportFileError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({
+        'success': True,
+        'import_id': task_import.pk,
+        'imported': task_import.imported,
+        'failed': task_import.failed,
+        'errors': task_import.errors[:100],
+        'rows_per_second': task_import.rows_per_second,
+    })
+
+
+@login_required(login_url='/')
+def job_status(request, pk):
+    """Progress of a background job: JSON for polling, or a page that polls itself"""
+    job = get_object_or_404(Job, pk=pk, user=request.user)
+    data = {
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': reverse('job_download', args=[job.pk]) if jobs.result_path(job) else None,
+    }
+    if 'text/html' in request.headers.get('Accept', ''):
+        return render(request, 'base/job_status.html', {'job': job, 'data': data})
+    return JsonResponse(data)
+
+
+@login_required(login_url='/')
+def job_download(request, pk):
+    """Download the file a finished job produced"""
+    job = get_object_or_404(Job, pk=pk, user=request.user, status='succeeded')
+    path = jobs.result_path(job)
+    if path is None or not path.exists():
+        raise Http404('This job has no file.')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.result.get('filename', path.name))
+
+
+@staff_member_required
+def request_metrics(request):
+    """Per-endpoint latency percentiles and query costs for staff; ?format=json for scripts"""
+    rows = instrumentation.endpoint_summary()
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'endpoints': rows})
+    context = {
+        'rows': rows,
+        'sample_size': getattr(settings, 'TASK_METRICS_SAMPLE_SIZE', 500),
+        'repeat_threshold': getattr(settings, 'TASK_METRICS_REPEAT_THRESHOLD', 5),
+    }
+    return render(request, 'base/request_metrics.html', context)
+
+
+@login_required(login_url='/')
+async def task_events(request):
+    """Server-Sent Events stream of the user's task changes and counters"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held for the whole stream while Django buffers
+        # it. 204 tells EventSource not to reconnect; the page reloads instead.
+        return HttpResponse(status=204)
+    user = await request.auser()
+    return StreamingHttpResponse(
+        _task_event_stream(user, request.headers.get('Last-Event-ID')),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
     )
+
+
+async def _task_event_stream(user, cursor):
+    # Subscribe before reading the feed so no change can slip in between
+    subscription = events.get_broker().subscribe(user.pk)
+    try:
+        await subscription.start()
+        try:
+            if cursor:
+                sync.decode_cursor(cursor)
+            else:
+                cursor = await sync_to_async(sync.latest_cursor)(user)
+        except InvalidCursor:
+            cursor = await sync_to_async(sync.latest_cursor)(user)
+        yield 'retry: 3000\n\n'
+
+        # Close after a while; EventSource reconnects with Last-Event-ID
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + getattr(settings, 'TASK_EVENTS_MAX_AGE', 300)
+        while loop.time() < deadline:
+            cursor, payload = await sync_to_async(_task_changes_payload)(user, cursor)
+            if payload is not None:
+                event = 'reset' if payload.get('reset') else 'tasks'
+                yield f'id: {cursor}\nevent: {event}\ndata: {json.dumps(payload)}\n\n'
+            if not await subscription.wait(min(15, max(deadline - loop.time(), 0))):
+                yield ': keepalive\n\n'
+    finally:
+        subscription.close()
+
+
+def _task_changes_payload(user, cursor):
+    """Rendered cards and ids for every change after ``cursor``, plus fresh stats; None if nothing changed"""
+    changed, deleted = {}, []
+    while True:
+        page = sync.changes_since(user, Task.objects.filter(user=user), cursor)
+        if page.reset:
+            return page.cursor, {'reset': True}
+        for task in page.changed:
+            changed[task.pk] = render_to_string('base/partials/task_card.html', {'task': task})
+        deleted.extend(page.deleted)
+        cursor = page.cursor
+        if not page.has_more:
+            break
+    if not changed and not deleted:
+        return cursor, None
+    stats = render_to_string('base/partials/task_stats.html', task_stats(user))
+    return cursor, {'changed': changed, 'deleted': deleted, 'stats': stats}
+
+
+@login_required(login_url='/')
+@cache_control(private=True, no_cache=True)
+@preload(atask_list_state)
+@condition(etag_func=task_list_etag, last_modified_func=task_list_last_modified)
+async def dashboard(request):
+    """Dashboard with task statistics and analytics"""
     
-    # Recent tasks
-    recent_tasks = user_tasks.order_by('-created_at')[:5]
-    
-    # Upcoming tasks (next 7 days)
-    upcoming_tasks = user_tasks.filter(
-        complete=False,
-        due_date__gte=timezone.now().date(),
-        due_date__lte=timezone.now().date() + timedelta(days=7)
-    ).order_by('due_date')[:5]
+    async def render_body():
+        user_tasks = Task.objects.filter(user=request.user)
+        
+        # Recent tasks
+        recent_tasks = user_tasks.order_by('-created_at')[:5]
+        
+        # Upcoming (next 7 days) includes occurrences of repeating tasks
+        recent_tasks = await _alist(recent_tasks)
+        upcoming_tasks = await _aupcoming(request.user, 5)
+        stats = await atask_stats(request.user)
+        context = {
+            'recent_tasks': recent_tasks,
+            'upcoming_tasks': upcoming_tasks,
+        }
+        # Statistics, priority/category/status breakdowns and completion rate
+        context.update(stats)
+        return render_to_string('base/partials/dashboard_body.html', context, request)
     
-    context = {
-        'total_tasks': total_tasks,
-        'completed_tasks': completed_tasks,
-        'pending_tasks': pending_tasks,
-        'overdue_tasks': overdue_tasks,
-        'completion_rate': round(completion_rate, 1),
-        'high_priority': high_priority,
-        'medium_priority': medium_priority,
-        'low_priority': low_priority,
-        'tasks_by_category': tasks_by_category,
-        'tasks_by_status': tasks_by_status,
-        'recent_tasks': recent_tasks,
-        'upcoming_tasks': upcoming_tasks,
-    }
-    return render(request, 'base/dashboard.html', context)
\ No newline at end of file
+    version = await fragments.aget_version(request.user.pk)
+    body_key = fragments.fragment_key('dashboard', request.user.pk, version)
+    cached = await fragments.get_cache().aget_many([body_key])
+    context = {'body_html': await fragments.aget_or_render(cached, body_key, render_body)}
+    return render(request, 'base/dashboard.html', context)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+UPCOMING_DAYS = 7
+UPCOMING_LIMIT = 10
+
+
+@sync_to_async
+def _aupcoming(user, limit):
+    today = timezone.localdate()
+    return recurrence.upcoming(user, today, today + timedelta(days=UPCOMING_DAYS), limit)
+
+
+def _occurrence_or_404(request, pk, day):
+    series = get_object_or_404(Task, id=pk, user=request.user)
+    try:
+        day = date.fromisoformat(day)
+    except ValueError:
+        raise Http404('Invalid date.')
+    if not recurrence.is_occurrence(series, day):
+        raise Http404('The task does not repeat on that day.')
+    return series, day
+
+
+@login_required(login_url='/')
+def complete_occurrence(request, pk, day):
+    """Mark one occurrence of a repeating task complete via AJAX, storing it"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False}, status=400)
+    series, day = _occurrence_or_404(request, pk, day)
+    task, created = recurrence.materialize(series, day, complete=True, status='completed')
+    if not task.complete:
+        task.complete = True
+        task.status = 'completed'
+        task.save()
+    return JsonResponse({'success': True, 'task_id': task.pk})
+
+
+@login_required(login_url='/')
+def edit_occurrence(request, pk, day):
+    """Edit one occurrence of a repeating task; it is stored on the first save"""
+    series, day = _occurrence_or_404(request, pk, day)
+    stored = Task.objects.filter(series=series, occurrence_date=day).first()
+    if stored is not None:
+        return redirect('edit_task', pk=stored.pk)
+
+    if request.method == 'POST':
+        form = TaskForm(request.POST, instance=series.occurrence(day))
+        if form.is_valid():
+            task, created = recurrence.materialize(series, day, **{
+                name: form.cleaned_data[name] for name in form.fields
+            })
+            messages.success(request, 'Task updated successfully!')
+            return redirect('task_details', pk=task.id)
+        messages.error(request, 'Please correct the errors below.')
+    else:
+        form = TaskForm(instance=series.occurrence(day))
+
+    # Cancel goes back to the series
+    context = {'form': form, 'task': series}
+    return render(request, 'base/edit_task.html', context)
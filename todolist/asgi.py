@@ -11,6 +11,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from base.asgi import StaticFilesASGI
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'todolist.settings')
+# Leaves the sync-only WhiteNoise middleware out of MIDDLEWARE (see settings)
+os.environ.setdefault('DJANGO_SERVER_INTERFACE', 'asgi')
 
-application = get_asgi_application()
+application = StaticFilesASGI(get_asgi_application())
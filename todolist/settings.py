@@ -28,7 +28,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 SECRET_KEY = 'django-insecure-tuop@(_el&nd&xr@b(e4lj7oqe3g+3f*jnbag^!7gs-)(1dau='
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True  # Changed to True for development
+# Set DJANGO_DEBUG=0 in production; static files are only fingerprinted then
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
+
+# 'wsgi' or 'asgi'. todolist/asgi.py sets DJANGO_SERVER_INTERFACE=asgi before
+# the settings load, so the middleware and database connection defaults
+# below fit the server they run under.
+SERVER_INTERFACE = os.environ.get('DJANGO_SERVER_INTERFACE', 'wsgi')
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '[::1]', 'testserver', '*']  # Allow all hosts for development
 
@@ -42,19 +48,26 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # Before staticfiles, so runserver serves static files through WhiteNoise too
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
+    'rest_framework',
     'base',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'base.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # WhiteNoise is sync-only. Under ASGI it would switch every middleware
+    # above it to sync mode, so asgi.py serves static files ahead of Django
+    *(['whitenoise.middleware.WhiteNoiseMiddleware'] if SERVER_INTERFACE == 'wsgi' else []),
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    # 'whitenoise.middleware.WhiteNoiseMiddleware',  # Commented out for development
 ]
 
 ROOT_URLCONF = 'todolist.urls'
@@ -63,7 +76,8 @@ ROOT_URLCONF = 'todolist.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also times renders for RequestMetricsMiddleware
+        'BACKEND': 'base.instrumentation.TimedDjangoTemplates',
         'DIRS': [
             (BASE_DIR/ 'templates')
         ],
@@ -85,11 +99,179 @@ WSGI_APPLICATION = 'todolist.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DJANGO_DB_BACKEND picks the profile: 'sqlite' (default) or 'postgres'.
+# Under WSGI both keep connections open for DJANGO_DB_CONN_MAX_AGE seconds
+# (default 60) and check them before reuse, instead of connecting on every
+# request. Under ASGI the default is 0: async requests run their queries on
+# threads that persistent connections are not reliably reused or closed from.
+
+DB_BACKEND = os.environ.get('DJANGO_DB_BACKEND', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60 if SERVER_INTERFACE == 'wsgi' else 0))
+
+# Run on every new SQLite connection. WAL lets pages be read while another
+# worker writes. synchronous=NORMAL only syncs at WAL checkpoints: an
+# application crash loses nothing, a power cut can lose the last commits.
+# mmap reads pages without copying them into the process.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('DJANGO_SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.environ.get('DJANGO_SQLITE_SYNCHRONOUS', 'normal'),
+    'mmap_size': int(os.environ.get('DJANGO_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+}
+
+# psycopg 3 connection pool per process (needs `pip install "psycopg[pool]"`);
+# 0 keeps one persistent connection per worker thread instead
+DB_POOL_SIZE = int(os.environ.get('DJANGO_DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'sqlite': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Seconds a writer waits for another worker's write lock
+                'timeout': float(os.environ.get('DJANGO_SQLITE_BUSY_TIMEOUT', 20)),
+                # Take the write lock at BEGIN. Deferred transactions that read
+                # and then write fail at once with "database is locked" when
+                # another one holds the lock, whatever the timeout.
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            },
+        },
+        'postgres': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'todolist'),
+            'USER': os.environ.get('DJANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', ''),
+            'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+            # The pool owns reuse when it is on; Django refuses both at once
+            'CONN_MAX_AGE': 0 if DB_POOL_SIZE else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': {'min_size': 1, 'max_size': DB_POOL_SIZE}} if DB_POOL_SIZE else {},
+        },
+    }[DB_BACKEND]
+}
+
+
+# Cache
+# locmem is private to each process. With several gunicorn workers use 'file'
+# or 'db' (run `python manage.py createcachetable` first) so they share
+# cached fragments and version counters.
+
+CACHE_BACKEND = os.environ.get('DJANGO_CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'todolist',
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+        },
+        'db': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        },
+    }[CACHE_BACKEND]
+}
+
+# Sessions are read on every request. cached_db serves them from the cache and
+# writes through to the database, so they survive restarts. 'cache' needs a
+# shared cache backend. 'signed_cookies' stores nothing server-side, but a
+# session cannot be revoked before it expires.
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('DJANGO_SESSION_ENGINE', 'cached_db')
+
+# Users are cached for a short time too (see base/auth.py)
+AUTHENTICATION_BACKENDS = ['base.auth.CachedModelBackend']
+TASK_AUTH_USER_CACHE_TIMEOUT = 60
+
+# Token buckets per view (base/ratelimit.py): 'N/s|m|h|d' allows bursts of N
+# and refills N per period. Scopes are 'ip', 'user' and 'username' (the login
+# form's). TASK_RATE_LIMIT=0 turns limiting off, e.g. to benchmark a server.
+TASK_RATE_LIMIT_ENABLED = os.environ.get('TASK_RATE_LIMIT', '1') == '1'
+TASK_RATE_LIMITS = {
+    'login': {'ip': '20/m', 'username': '5/m'},
+    'create_account': {'ip': '10/h'},
+    'toggle_complete': {'user': '120/m'},
+    'create_task': {'user': '30/m'},
+    # Only wrong Basic auth passwords use these up (see base.api)
+    'api_auth': {'ip': '20/m', 'username': '10/m'},
+    'api_write': {'user': '120/m'},
+}
+# base.ratelimit.CacheStore avoids the database writes, but needs a shared
+# cache (DJANGO_CACHE_BACKEND=file or db) to limit across workers
+TASK_RATE_LIMIT_STORE = os.environ.get('TASK_RATE_LIMIT_STORE', 'base.ratelimit.DatabaseStore')
+TASK_RATE_LIMIT_CACHE = 'default'
+# Set to 'HTTP_X_FORWARDED_FOR' behind a reverse proxy that appends it
+TASK_RATE_LIMIT_IP_HEADER = os.environ.get('TASK_RATE_LIMIT_IP_HEADER') or None
+
+# The Task admin counts rows exactly up to this many, and estimates past it
+# (see base/admin.py)
+TASK_ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('TASK_ADMIN_EXACT_COUNT_LIMIT', 10000))
+
+# Rendered userpage/dashboard fragments (see base/fragments.py)
+TASK_FRAGMENT_CACHE = 'default'
+TASK_FRAGMENT_TIMEOUT = 300
+
+# Days a deleted task stays visible to the delta sync feed
+TASK_SYNC_TOMBSTONE_DAYS = int(os.environ.get('TASK_SYNC_TOMBSTONE_DAYS', 30))
+
+# Live task updates (/events/): LocalBroker only wakes streams in the same
+# process; use base.events.DatabaseBroker when running several workers.
+TASK_EVENTS_BROKER = os.environ.get('TASK_EVENTS_BROKER', 'base.events.LocalBroker')
+TASK_EVENTS_POLL_INTERVAL = 1.0
+TASK_EVENTS_MAX_AGE = 300
+
+# Background jobs (python manage.py run_jobs). Exports of more tasks and
+# uploads larger than these limits go through the queue instead of the view.
+TASK_EXPORT_INLINE_LIMIT = 10000
+TASK_IMPORT_INLINE_BYTES = 1024 * 1024
+TASK_JOB_FILES_DIR = os.environ.get('TASK_JOB_FILES_DIR', os.path.join(BASE_DIR, 'job_files'))
+# Running jobs refresh their lock every 30 s; one silent for this long is taken back
+TASK_JOB_STALE_AFTER = 600
+TASK_JOB_RETENTION_DAYS = 7
+
+# Due-date reminders (python manage.py send_reminders). Users pick their own
+# zone in NotificationPreference; everyone else is reminded on TIME_ZONE days.
+TASK_NOTIFICATION_BACKEND = os.environ.get('TASK_NOTIFICATION_BACKEND', 'base.notifications.ConsoleBackend')
+TASK_NOTIFICATION_FILE = os.environ.get('TASK_NOTIFICATION_FILE', os.path.join(BASE_DIR, 'notifications.ndjson'))
+TASK_REMINDER_LEAD_DAYS = 1
+TASK_REMINDER_OVERDUE_DAYS = 7
+
+# Request instrumentation (base/instrumentation.py): samples kept per
+# endpoint for /metrics/, how often they are copied to the cache, and how
+# many runs of one statement in a request count as an N+1.
+TASK_METRICS_SAMPLE_SIZE = 500
+TASK_METRICS_FLUSH_INTERVAL = 10
+TASK_METRICS_REPEAT_THRESHOLD = 5
+TASK_METRICS_SERVER_TIMING = True
+
+# One JSON line per request on the base.requests logger
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'base.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('TASK_REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'base.auth.RateLimitedBasicAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
 }
 
 
@@ -131,6 +313,23 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]  # Commented out as not needed
 
+# Outside DEBUG, collectstatic writes content-hashed copies (index.3f2a9c1b7d4e.css)
+# with .gz and .br variants next to them. WhiteNoise serves the smallest variant
+# the browser accepts and marks hashed files Cache-Control: immutable (ten years),
+# so a changed file gets a new URL instead of needing revalidation. In DEBUG the
+# files are served unhashed from the app directories and revalidated every time.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 